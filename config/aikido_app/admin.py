@@ -198,6 +198,7 @@ class BankTransactionAdmin(admin.ModelAdmin):
     def get_allocated_amount(self, obj):
         return f"{obj.get_allocated_amount()}₮"
     get_allocated_amount.short_description = 'Хуваарилагдсан дүн'
+    get_allocated_amount.admin_order_field = 'allocated_amount'
     
     def get_remaining_amount(self, obj):
         return f"{obj.get_remaining_amount()}₮"
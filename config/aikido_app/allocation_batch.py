@@ -0,0 +1,356 @@
+"""
+Банкны гүйлгээний хуваарилалтыг багцаар хадгалах - model бүрт нэг in_bulk, нэг bulk_create
+- бүх мөрийг бичихээс өмнө шалгаж, нийт дүнг үлдэгдэлтэй харьцуулна
+- гүйлгээний төлвийг төгсгөлд нэг удаа шинэчилнэ
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import caching, ledger
+from .allocations import adjust_allocated_amount
+from .models import (
+    BankTransaction, ExpenseAllocation, ExpenseCategory, IncomeAllocation, IncomeCategory, InstructorPaymentAllocation,
+    MembershipPaymentAllocation, MonthlyFederationPayment, MonthlyInstructorPayment, PaymentAllocation,
+    Seminar, SeminarPaymentAllocation, Student
+)
+from .payroll import mark_payroll_dirty
+from .pivot import invalidate_payment_pivot, invalidate_payment_years
+
+
+STUDENT_PAYMENT = 'student_payment'
+OTHER_INCOME = 'other_income'
+SEMINAR_PAYMENT = 'seminar_payment'
+MEMBERSHIP_PAYMENT = 'membership_payment'
+INCOME_KINDS = (STUDENT_PAYMENT, OTHER_INCOME, SEMINAR_PAYMENT, MEMBERSHIP_PAYMENT)
+
+INSTRUCTOR_PAYMENT = 'instructor_payment'
+FEDERATION_PAYMENT = 'federation_payment'
+REGULAR_EXPENSE = 'regular'
+EXPENSE_KINDS = (INSTRUCTOR_PAYMENT, FEDERATION_PAYMENT, REGULAR_EXPENSE)
+
+# Төрөл бүр аль талын гүйлгээнд хуваарилагдах (allocation_direction-тэй ижил)
+KIND_DIRECTIONS = {**{kind: 'credit' for kind in INCOME_KINDS}, **{kind: 'debit' for kind in EXPENSE_KINDS}}
+
+# Төрөл бүрийн POST талбарууд: мөрийн түлхүүр -> input нэр
+FORM_FIELDS = {
+    STUDENT_PAYMENT: {'student': 'student_id[]', 'month': 'payment_month[]', 'amount': 'amount[]', 'notes': 'notes[]'},
+    OTHER_INCOME: {
+        'category': 'income_category[]', 'new_category': 'new_income_category[]', 'date': 'income_date[]',
+        'amount': 'amount[]', 'notes': 'notes[]',
+    },
+    SEMINAR_PAYMENT: {'student': 'seminar_student_id[]', 'seminar': 'seminar_id[]', 'amount': 'amount[]', 'notes': 'notes[]'},
+    MEMBERSHIP_PAYMENT: {
+        'student': 'membership_student_id[]', 'month': 'membership_month[]', 'amount': 'amount[]', 'notes': 'notes[]',
+    },
+    INSTRUCTOR_PAYMENT: {
+        'payment': 'instructor_payment_id[]', 'amount': 'instructor_payment_amount[]', 'notes': 'instructor_payment_notes[]',
+    },
+    FEDERATION_PAYMENT: {'payment': 'federation_payment_id[]'},
+    REGULAR_EXPENSE: {
+        'category': 'expense_category[]', 'new_category': 'new_category[]', 'date': 'expense_date[]',
+        'amount': 'amount[]', 'notes': 'notes[]',
+    },
+}
+
+# Мөр хадгалагдахын тулд заавал бөглөх талбарууд (бусад мөр хоосон гэж үзэн алгасагдана)
+REQUIRED_FIELDS = {
+    STUDENT_PAYMENT: ('student', 'month', 'amount'),
+    OTHER_INCOME: ('amount', 'date'),
+    SEMINAR_PAYMENT: ('student', 'seminar', 'amount'),
+    MEMBERSHIP_PAYMENT: ('student', 'month', 'amount'),
+    INSTRUCTOR_PAYMENT: ('payment', 'amount'),
+    FEDERATION_PAYMENT: ('payment',),
+    REGULAR_EXPENSE: ('amount',),
+}
+
+SUCCESS_MESSAGES = {
+    STUDENT_PAYMENT: '{count} хуваарилалт амжилттай үүслээ!',
+    OTHER_INCOME: 'Орлогын хуваарилалт амжилттай үүслээ!',
+    SEMINAR_PAYMENT: 'Семинарын төлбөр амжилттай холбогдлоо!',
+    MEMBERSHIP_PAYMENT: 'Гишүүнчлэлийн төлбөр амжилттай холбогдлоо!',
+    INSTRUCTOR_PAYMENT: 'Багшийн төлбөр амжилттай холбогдлоо!',
+    FEDERATION_PAYMENT: 'Холбооны төлбөр амжилттай холбогдлоо!',
+    REGULAR_EXPENSE: 'Зардлын хуваарилалт амжилттай үүслээ!',
+}
+
+
+def allocations_written(model, allocations):
+    """bulk_create нь signal илгээдэггүй тул signals.py-ийн cache/цалин/ledger-ийн ажлыг шууд хийнэ"""
+    caching.invalidate(caching.MONTHLY_REPORT)
+    ledger.sync(model, [allocation.pk for allocation in allocations])
+    if model is not PaymentAllocation or not allocations:
+        return
+    caching.invalidate(caching.STUDENT_INDEX)
+    invalidate_payment_pivot(*{allocation.payment_month.year for allocation in allocations})
+    invalidate_payment_years()
+    student_months = defaultdict(set)
+    for allocation in allocations:
+        student_months[allocation.student_id].add(allocation.payment_month)
+    mark_payroll_dirty(
+        (class_type_id, month)
+        for student_id, class_type_id in Student.class_types.through.objects.filter(
+            student_id__in=student_months
+        ).values_list('student_id', 'classtype_id')
+        for month in student_months[student_id]
+    )
+
+
+def transaction_direction(bank_transaction):
+    """'credit' (орлого), 'debit' (зардал) эсвэл дүн тодорхойгүй бол None - bank_transaction_match-тай ижил дүрэм"""
+    if bank_transaction.credit_amount and bank_transaction.credit_amount > 0:
+        return 'credit'
+    if bank_transaction.debit_amount and bank_transaction.debit_amount != 0:
+        return 'debit'
+    return None
+
+
+class BankAllocationBatch:
+    """
+    Нэг гүйлгээний хуваарилалтын багц
+    1. parse - POST жагсаалтуудыг мөр болгоно
+    2. build - ID-уудыг model бүрт нэг in_bulk-аар шийдэж, allocation instance үүсгэнэ (алдааг цуглуулна)
+    3. save  - үлдэгдлийг шалгаад bulk_create, allocated_amount/төлвийг нэг удаа шинэчилнэ
+    """
+
+    def __init__(self, bank_transaction, kind, created_by=None):
+        if kind not in FORM_FIELDS:
+            raise ValidationError(f'Хуваарилалтын төрөл буруу: {kind}')
+        if KIND_DIRECTIONS[kind] != transaction_direction(bank_transaction):
+            raise ValidationError(f'{kind} хуваарилалт энэ гүйлгээний төрөлд (орлого/зардал) тохирохгүй')
+        self.bank_transaction = bank_transaction
+        self.kind = kind
+        self.created_by = created_by
+        self.errors = []
+
+    def parse(self, post):
+        """POST-ийн зэрэгцээ жагсаалтуудаас мөрүүд - шаардлагатай талбаргүй мөрийг алгасна"""
+        columns = {key: post.getlist(name) for key, name in FORM_FIELDS[self.kind].items()}
+        rows = []
+        for index in range(max(len(values) for values in columns.values())):
+            row = {key: (values[index].strip() if index < len(values) else '') for key, values in columns.items()}
+            row['index'] = index + 1
+            if not all(row[key] for key in REQUIRED_FIELDS[self.kind]):
+                continue
+            if 'category' in row and not (row['category'] or row['new_category']):
+                continue
+            rows.append(row)
+        return rows
+
+    # Талбар задлагчид - алдааг self.errors-д нэмээд None буцаана
+
+    def _error(self, row, message):
+        self.errors.append(f'{row["index"]}-р мөр: {message}')
+
+    def _amount(self, row):
+        try:
+            amount = Decimal(row['amount'])
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite() or amount <= 0:
+            self._error(row, f'дүн буруу ({row["amount"]})')
+            return None
+        return amount
+
+    def _date(self, row, key, date_format):
+        try:
+            return datetime.strptime(row[key], date_format).date()
+        except ValueError:
+            self._error(row, f'огноо буруу ({row[key]})')
+            return None
+
+    def _id(self, row, key):
+        try:
+            return int(row[key])
+        except ValueError:
+            self._error(row, f'ID буруу ({row[key]})')
+            return None
+
+    def _lookup(self, model, rows, key):
+        """Мөрүүдийн ID-уудыг нэг in_bulk-аар"""
+        ids = {row[key] for row in rows if row[key] is not None}
+        return model.objects.in_bulk(ids) if ids else {}
+
+    def _categories(self, model, rows):
+        """Сонгосон болон шинээр бичсэн ангиллууд - байхгүй нэрийг bulk үүсгэнэ"""
+        for row in rows:
+            row['category'] = self._id(row, 'category') if row['category'] and not row['new_category'] else None
+        by_id = self._lookup(model, rows, 'category')
+        names = {row['new_category'] for row in rows if row['new_category']}
+        by_name = {category.name: category for category in model.objects.filter(name__in=names)}
+        missing = names - set(by_name)
+        if missing and not self.errors:
+            by_name.update((category.name, category) for category in model.objects.bulk_create(
+                [model(name=name) for name in sorted(missing)]
+            ))
+
+        categories = {}
+        for row in rows:
+            category = by_name.get(row['new_category']) if row['new_category'] else by_id.get(row['category'])
+            if category is None and row['category'] is not None:
+                self._error(row, 'ангилал олдсонгүй')
+            categories[row['index']] = category
+        return categories
+
+    def _students(self, rows):
+        for row in rows:
+            row['student'] = self._id(row, 'student')
+        students = self._lookup(Student, rows, 'student')
+        for row in rows:
+            if row['student'] is not None and row['student'] not in students:
+                self._error(row, 'сурагч олдсонгүй')
+        return students
+
+    def build(self, rows):
+        """
+        Allocation instance-ууд үүсгэх
+        Returns: (model, allocations)
+        """
+        common = {'bank_transaction': self.bank_transaction, 'created_by': self.created_by}
+
+        if self.kind in (STUDENT_PAYMENT, MEMBERSHIP_PAYMENT):
+            model = PaymentAllocation if self.kind == STUDENT_PAYMENT else MembershipPaymentAllocation
+            students = self._students(rows)
+            allocations = []
+            for row in rows:
+                amount, month = self._amount(row), self._date(row, 'month', '%Y-%m')
+                if amount and month and row['student'] in students:
+                    allocations.append(model(
+                        student=students[row['student']], payment_month=month, amount=amount, notes=row['notes'], **common
+                    ))
+            return model, allocations
+
+        if self.kind == SEMINAR_PAYMENT:
+            students = self._students(rows)
+            for row in rows:
+                row['seminar'] = self._id(row, 'seminar')
+            seminars = self._lookup(Seminar, rows, 'seminar')
+            already_paid = set(SeminarPaymentAllocation.objects.filter(
+                student_id__in=students, seminar_id__in=seminars
+            ).values_list('student_id', 'seminar_id'))
+            allocations = []
+            for row in rows:
+                amount = self._amount(row)
+                key = (row['student'], row['seminar'])
+                if row['seminar'] is not None and row['seminar'] not in seminars:
+                    self._error(row, 'семинар олдсонгүй')
+                elif key in already_paid:
+                    self._error(row, 'сурагч энэ семинарын төлбөрийг аль хэдийн төлсөн')
+                elif amount and row['student'] in students:
+                    already_paid.add(key)
+                    allocations.append(SeminarPaymentAllocation(
+                        student=students[row['student']], seminar=seminars[row['seminar']],
+                        amount=amount, notes=row['notes'], **common
+                    ))
+            return SeminarPaymentAllocation, allocations
+
+        if self.kind in (OTHER_INCOME, REGULAR_EXPENSE):
+            if self.kind == OTHER_INCOME:
+                model, category_model, category_field, date_field = (
+                    IncomeAllocation, IncomeCategory, 'income_category', 'income_date'
+                )
+            else:
+                model, category_model, category_field, date_field = (
+                    ExpenseAllocation, ExpenseCategory, 'expense_category', 'expense_date'
+                )
+            parsed = [(row, self._amount(row), self._date(row, 'date', '%Y-%m-%d')) for row in rows]
+            categories = self._categories(category_model, rows)
+            allocations = [
+                model(**{
+                    category_field: categories[row['index']], date_field: row_date,
+                    'amount': amount, 'notes': row['notes'], **common
+                })
+                for row, amount, row_date in parsed
+                if amount and row_date and categories[row['index']]
+            ]
+            return model, allocations
+
+        if self.kind == INSTRUCTOR_PAYMENT:
+            for row in rows:
+                row['payment'] = self._id(row, 'payment')
+            payments = self._lookup(MonthlyInstructorPayment, rows, 'payment')
+            allocated = defaultdict(lambda: Decimal('0.00'), InstructorPaymentAllocation.objects.filter(
+                instructor_payment__in=payments
+            ).values('instructor_payment_id').annotate(total=Sum('amount')).order_by().values_list(
+                'instructor_payment_id', 'total'
+            ))
+            allocations = []
+            for row in rows:
+                amount = self._amount(row)
+                payment = payments.get(row['payment'])
+                if row['payment'] is not None and payment is None:
+                    self._error(row, f'төлбөр #{row["payment"]} олдсонгүй')
+                elif amount and payment:
+                    remaining = payment.instructor_share_amount - allocated[payment.pk]
+                    if amount > remaining:
+                        self._error(row, f'{payment.instructor}-ийн төлбөр: {amount}₮ нь үлдэгдэл {remaining}₮-с их байна')
+                        continue
+                    allocated[payment.pk] += amount
+                    allocations.append(InstructorPaymentAllocation(
+                        instructor_payment=payment, amount=amount, notes=row['notes'], **common
+                    ))
+            self._instructor_payments = (payments, allocated)
+            return InstructorPaymentAllocation, allocations
+
+        # FEDERATION_PAYMENT - гүйлгээнд холбоно, allocation үүсэхгүй
+        for row in rows:
+            row['payment'] = self._id(row, 'payment')
+        payments = self._lookup(MonthlyFederationPayment, rows, 'payment')
+        for row in rows:
+            if row['payment'] is not None and row['payment'] not in payments:
+                self._error(row, f'төлбөр #{row["payment"]} олдсонгүй')
+        self._federation_payment_ids = list(payments)
+        return MonthlyFederationPayment, []
+
+    def save(self, post):
+        """
+        Багцыг хадгалах - алдаа гарвал юу ч бичигдэхгүй
+        Returns: үүссэн (холбогдсон) мөрийн тоо; алдаатай бол ValidationError
+        """
+        rows = self.parse(post)
+        with db_transaction.atomic():
+            model, allocations = self.build(rows)
+            if self.errors:
+                raise ValidationError(self.errors)
+
+            total = sum((allocation.amount for allocation in allocations), Decimal('0.00'))
+            # Lock the row so concurrent submissions cannot over-allocate
+            allocated_amount = BankTransaction.objects.select_for_update().values_list(
+                'allocated_amount', flat=True
+            ).get(pk=self.bank_transaction.pk)
+            remaining = self.bank_transaction.amount - allocated_amount
+            if total > remaining:
+                raise ValidationError(f'Нийт дүн {total:,.0f}₮ нь үлдэгдэл {remaining:,.0f}₮-с их байна')
+
+            model.objects.bulk_create(allocations)
+            if allocations:
+                adjust_allocated_amount(model.allocation_direction, self.bank_transaction.pk, total)
+
+            if self.kind == INSTRUCTOR_PAYMENT:
+                payments, allocated = self._instructor_payments
+                updated = []
+                for payment in {allocation.instructor_payment for allocation in allocations}:
+                    payment.paid_amount = allocated[payment.pk]
+                    payment.is_paid = payment.paid_amount >= payment.instructor_share_amount
+                    payment.updated_at = timezone.now()
+                    updated.append(payment)
+                MonthlyInstructorPayment.objects.bulk_update(updated, ['paid_amount', 'is_paid', 'updated_at'])
+            elif self.kind == FEDERATION_PAYMENT:
+                MonthlyFederationPayment.objects.filter(pk__in=self._federation_payment_ids).update(
+                    bank_transaction=self.bank_transaction, is_paid=True,
+                    paid_date=timezone.localdate(), updated_at=timezone.now(),
+                )
+
+            self.bank_transaction.update_status()
+
+        allocations_written(model, allocations)
+        if self.kind == FEDERATION_PAYMENT:
+            # .update() нь signal илгээдэггүй
+            ledger.sync(MonthlyFederationPayment, self._federation_payment_ids)
+            return len(self._federation_payment_ids)
+        return len(allocations)
@@ -0,0 +1,48 @@
+"""
+Банкны гүйлгээний хуваарилалтын (allocation) нийлбэр тооцоолол
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+
+from .models import BankTransaction, CREDIT_ALLOCATION_MODELS, DEBIT_ALLOCATION_MODELS
+
+
+CREDIT_FILTER = Q(credit_amount__gt=0)
+DEBIT_FILTER = ~Q(credit_amount__gt=0) & ~Q(debit_amount=0) & Q(debit_amount__isnull=False)
+
+
+def direction_filter(direction):
+    """Allocation-ийн төрөлд тохирох BankTransaction шүүлтүүр"""
+    return CREDIT_FILTER if direction == 'credit' else DEBIT_FILTER
+
+
+def adjust_allocated_amount(direction, transaction_id, delta):
+    """
+    BankTransaction.allocated_amount-ийг F() ашиглан нэг UPDATE-ээр нэмэх/хасах
+    Allocation-ийн төрөл гүйлгээний төрөлтэй таарахгүй бол тоологдохгүй (get_allocated_amount-тай адил)
+    """
+    if not transaction_id or not delta:
+        return 0
+    return BankTransaction.objects.filter(
+        direction_filter(direction), pk=transaction_id
+    ).update(allocated_amount=F('allocated_amount') + delta)
+
+
+def compute_allocated_totals(transaction_ids=None):
+    """
+    Allocation хүснэгт бүрээс GROUP BY bank_transaction нэг query-ээр нийлбэр авах
+    Returns: {transaction_id: Decimal}
+    """
+    totals = defaultdict(lambda: Decimal('0.00'))
+    for model in CREDIT_ALLOCATION_MODELS + DEBIT_ALLOCATION_MODELS:
+        matching = BankTransaction.objects.filter(direction_filter(model.allocation_direction))
+        if transaction_ids is not None:
+            matching = matching.filter(pk__in=transaction_ids)
+        rows = model.objects.filter(
+            bank_transaction__in=matching
+        ).order_by().values('bank_transaction_id').annotate(total=Sum('amount'))
+        for row in rows:
+            totals[row['bank_transaction_id']] += row['total'] or Decimal('0.00')
+    return totals
@@ -0,0 +1,235 @@
+"""
+Ирцийг багцаар хадгалах - хичээл, сурагчдыг нэг дор ачаалж, нэг transaction дотор bulk бичнэ
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Attendance, ClassSession, ClassType, InstructorAssignment, Student
+from .dashboard import invalidate_dashboard
+from .logs import RowSampler, log_timings
+from .pivot import invalidate_payment_pivot
+
+
+# Ангийн төрөл бүрийн хичээллэх гарагууд (Даваа=0)
+CLASS_WEEKDAYS = {
+    ClassType.MORNING: [0, 2, 4],
+    ClassType.EVENING: [0, 2, 4],
+    ClassType.CHILDREN: [5, 6],
+}
+
+STATUS_CREATED = 'created'
+STATUS_UPDATED = 'updated'
+STATUS_DELETED = 'deleted'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_SKIPPED = 'skipped'
+STATUS_ERROR = 'error'
+
+logger = logging.getLogger(__name__)
+
+
+def _pairs_filter(pairs):
+    """(session_id, student_id) хосуудыг хичээл тус бүрээр нэг Q болгох"""
+    students_by_session = defaultdict(set)
+    for session_id, student_id in pairs:
+        students_by_session[session_id].add(student_id)
+    return reduce(or_, (
+        Q(session_id=session_id, student_id__in=student_ids)
+        for session_id, student_ids in students_by_session.items()
+    ))
+
+
+class AttendanceBatchSaver:
+    """
+    Ирцийн багц хадгалалт
+    1. parse    - мөр бүрийг шалгаж, сурагчдыг нэг query-ээр ачаална
+    2. sessions - илгээсэн огноонуудын хичээлийг нэг дор олж, байхгүйг bulk үүсгэнэ
+    3. write    - шинэ ирцийг bulk_create, байгааг update, хасагдсаныг нэг delete-ээр
+    """
+
+    def __init__(self, class_type_name='', recorded_by=None):
+        self.class_type_name = class_type_name
+        self.recorded_by = recorded_by
+
+    def parse(self, items, results):
+        """Мөр бүрийг задлах - алдаатай мөрийн үр дүнг results-д бичнэ"""
+        entries = []
+        allowed_weekdays = CLASS_WEEKDAYS.get(self.class_type_name)
+        for index, item in enumerate(items):
+            try:
+                student_id = int(item.get('student_id'))
+                date_obj = datetime.strptime(item.get('date'), '%Y-%m-%d').date()
+            except (TypeError, ValueError) as e:
+                results[index].update(status=STATUS_ERROR, message=str(e))
+                continue
+
+            if allowed_weekdays is not None and date_obj.weekday() not in allowed_weekdays:
+                results[index].update(
+                    status=STATUS_SKIPPED,
+                    message=f'{self.class_type_name} хичээл {date_obj.weekday()} гарагт ордоггүй',
+                )
+                continue
+
+            entries.append({
+                'index': index,
+                'student_id': student_id,
+                'date': date_obj,
+                # Get is_present from request data (defaults to True if not specified)
+                'is_present': bool(item.get('is_present', True)),
+            })
+
+        students = Student.objects.prefetch_related('class_types').in_bulk(
+            {entry['student_id'] for entry in entries}
+        )
+        found = []
+        for entry in entries:
+            if entry['student_id'] in students:
+                found.append(entry)
+            else:
+                results[entry['index']].update(status=STATUS_SKIPPED, message='Сурагч олдсонгүй')
+        return found, students
+
+    def resolve_sessions(self, entries, students):
+        """
+        Огноо бүрийн хичээлийг олох
+        - ганц хичээл байвал түүнийг, олон байвал багш томилогдсоныг нь сонгоно
+        - хичээл байхгүй огноонд шинээр үүсгэнэ
+        """
+        dates = {entry['date'] for entry in entries}
+        if not dates:
+            return {}
+
+        sessions = ClassSession.objects.filter(date__in=dates).annotate(
+            has_assignments=Exists(InstructorAssignment.objects.filter(session=OuterRef('pk')))
+        )
+        if self.class_type_name:
+            sessions = sessions.filter(class_type__name=self.class_type_name)
+
+        candidates = defaultdict(list)
+        for session in sessions:
+            candidates[session.date].append(session)
+
+        sessions_by_date = {}
+        for session_date, date_sessions in candidates.items():
+            sessions_by_date[session_date] = next(
+                (session for session in date_sessions if session.has_assignments), date_sessions[0]
+            )
+
+        # First student on a date without a session decides its class type
+        missing = {}
+        for entry in entries:
+            if entry['date'] not in sessions_by_date:
+                missing.setdefault(entry['date'], students[entry['student_id']])
+        if missing:
+            class_type = ClassType.objects.filter(name=self.class_type_name).first()
+            created = ClassSession.objects.bulk_create([
+                ClassSession(
+                    date=session_date,
+                    class_type=class_type or self.student_class_type(student),
+                    weekday=session_date.weekday(),
+                    start_time='09:00',
+                    end_time='11:00',
+                )
+                for session_date, student in missing.items()
+            ])
+            sessions_by_date.update((session.date, session) for session in created)
+        return sessions_by_date
+
+    def student_class_type(self, student):
+        """Анги сонгоогүй үед сурагчийн анги, эсвэл эхний анги"""
+        student_class_types = sorted(student.class_types.all(), key=lambda class_type: class_type.pk)
+        if student_class_types:
+            return student_class_types[0]
+        return ClassType.objects.first()
+
+    def write(self, entries, sessions_by_date, results):
+        """Ирцийг bulk бичих - нэг хос олон удаа ирвэл сүүлийнх нь хүчинтэй"""
+        final = {}
+        indexes = defaultdict(list)
+        for entry in entries:
+            pair = (sessions_by_date[entry['date']].pk, entry['student_id'])
+            final[pair] = entry['is_present']
+            indexes[pair].append(entry['index'])
+        if not final:
+            return
+
+        existing = set(
+            Attendance.objects.filter(_pairs_filter(final)).values_list('session_id', 'student_id')
+        )
+        present = {pair for pair, is_present in final.items() if is_present}
+        to_update = present & existing
+        to_create = present - existing
+        to_delete = {pair for pair, is_present in final.items() if not is_present} & existing
+
+        if to_update:
+            Attendance.objects.filter(_pairs_filter(to_update)).update(
+                is_present=True, recorded_by=self.recorded_by
+            )
+        if to_create:
+            Attendance.objects.bulk_create([
+                Attendance(session_id=session_id, student_id=student_id, is_present=True, recorded_by=self.recorded_by)
+                for session_id, student_id in to_create
+            ], ignore_conflicts=True)
+        if to_delete:
+            # Attendance-д post_delete receiver байгаа тул .delete() мөр бүрийг ачаалж signal илгээнэ;
+            # FK-ээр хамаарах model байхгүй - нэг DELETE, cache-ийг run() нэг удаа цэвэрлэнэ
+            Attendance.objects.filter(_pairs_filter(to_delete))._raw_delete(Attendance.objects.db)
+
+        for pair, is_present in final.items():
+            if pair in to_create:
+                status = STATUS_CREATED
+            elif pair in to_update:
+                status = STATUS_UPDATED
+            elif pair in to_delete:
+                status = STATUS_DELETED
+            else:
+                status = STATUS_UNCHANGED
+            for index in indexes[pair]:
+                results[index].update(status=status, session_id=pair[0])
+
+    def run(self, items):
+        """
+        Бүх шатыг ажиллуулах
+        Returns: (results, timings_ms) - results нь илгээсэн мөр бүрт нэг dict
+        """
+        results = [
+            {'student_id': item.get('student_id'), 'date': item.get('date'), 'status': None}
+            for item in items
+        ]
+        timings = {}
+
+        started = time.perf_counter()
+        entries, students = self.parse(items, results)
+        timings['parse'] = time.perf_counter() - started
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            sessions_by_date = self.resolve_sessions(entries, students)
+            timings['sessions'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            self.write(entries, sessions_by_date, results)
+            timings['write'] = time.perf_counter() - started
+
+        # bulk_create/update/_raw_delete нь signal илгээдэггүй тул cache-ийг шууд цэвэрлэнэ
+        invalidate_payment_pivot(*{session_date.year for session_date in sessions_by_date})
+        invalidate_dashboard()
+
+        log_skipped = RowSampler(logger, 'attendance_batch.item_skipped')
+        for result in results:
+            if result['status'] in (STATUS_SKIPPED, STATUS_ERROR):
+                log_skipped(
+                    'Ирц алгасав (%s %s): %s', result['student_id'], result['date'], result.get('message'),
+                    student_id=result['student_id'], date=result['date'], status=result['status'],
+                )
+        log_skipped.summary(class_type=self.class_type_name)
+        log_timings(logger, 'attendance_batch', timings, items=len(items), class_type=self.class_type_name)
+
+        timings = {phase: round(seconds * 1000, 2) for phase, seconds in timings.items()}
+        return results, timings
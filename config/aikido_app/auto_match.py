@@ -0,0 +1,299 @@
+"""
+Банкны гүйлгээг сурагчтай автоматаар холбох
+- сурагчийн нэр, утас, өмнө нь холбогдсон харьцсан дансыг санах ойн index-д нэг удаа ачаална
+- гүйлгээ бүрийг index-ээр оноо өгч, итгэлтэй таарсныг monthly_fee-гээр сар сараар хувааж bulk үүсгэнэ
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Max
+
+from . import caching
+from .allocation_batch import allocations_written
+from .allocations import CREDIT_FILTER
+from .models import BankTransaction, PaymentAllocation, Student
+from .periods import next_month
+
+
+# Өмнө нь ганц сурагчид холбогдсон данс дангаараа автомат холболтод хүрнэ
+SCORE_ACCOUNT = 70
+SCORE_PHONE = 50
+SCORE_FIRST_NAME = 25
+SCORE_LAST_NAME = 15
+
+# Автоматаар үүсгэх доод оноо, хоёрдугаар нэр дэвшигчээс давах зөрүү
+AUTO_MATCH_SCORE = 70
+MIN_MARGIN = 20
+MIN_PROPOSAL_SCORE = SCORE_LAST_NAME
+
+# Гүйлгээ холбох хуудасны index-ийн cache - сурагч, төлбөр өөрчлөгдөхөд signals.py хүчингүй болгоно
+INDEX_TIMEOUT = 60 * 10
+
+MAX_SPLIT_MONTHS = 12
+MIN_NAME_LENGTH = 3
+
+# Монгол кирилл -> латин (банкны утгад латинаар бичих нь элбэг)
+TRANSLITERATION = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j', 'з': 'z',
+    'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'ө': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ү': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch',
+    'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+WORD_RE = re.compile(r'[^\W_]+(?:-[^\W_]+)*')
+PHONE_RE = re.compile(r'(?<!\d)\d{8}(?!\d)')
+ACCOUNT_RE = re.compile(r'\d{6,}')
+
+
+def name_key(text):
+    """Нэрийг харьцуулах түлхүүр - латин, жижиг үсэг, зураасгүй ('Бат-Эрдэнэ', 'Bat-Erdene' -> 'baterdene')"""
+    text = ''.join(TRANSLITERATION.get(char, char) for char in (text or '').lower())
+    return re.sub(r'[^a-z0-9]', '', text.replace('kh', 'h'))
+
+
+def text_keys(text):
+    """Гүйлгээний утгын үг бүр болон зэргэлдээ хоёр үгийн нийлбэрийн түлхүүрүүд"""
+    words = [name_key(word) for word in WORD_RE.findall(text or '')]
+    words = [word for word in words if word]
+    return set(words) | {first + second for first, second in zip(words, words[1:])}
+
+
+def phone_key(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-8:] if len(digits) >= 8 else ''
+
+
+def account_key(counterparty):
+    """Харьцсан дансны дугаар (байхгүй бол нэрийн түлхүүр)"""
+    numbers = ACCOUNT_RE.findall(counterparty or '')
+    if numbers:
+        return max(numbers, key=len)
+    return name_key(counterparty)
+
+
+def invalidate_student_index():
+    caching.invalidate(caching.STUDENT_INDEX)
+
+
+def split_months(amount, monthly_fee, start_month):
+    """
+    Дүнг сарын төлбөрөөр хуваах - үлдэгдэл нь сүүлийн сард
+    Returns: [(month, amount), ...]
+    """
+    if not monthly_fee or amount <= monthly_fee:
+        return [(start_month, amount)]
+    full_months = int(amount // monthly_fee)
+    remainder = amount - monthly_fee * full_months
+    if full_months + (1 if remainder else 0) > MAX_SPLIT_MONTHS:
+        return [(start_month, amount)]
+
+    parts = [monthly_fee] * full_months + ([remainder] if remainder else [])
+    months = []
+    month = start_month
+    for part in parts:
+        months.append((month, part))
+        month = next_month(month)
+    return months
+
+
+class StudentIndex:
+    """Идэвхтэй сурагчдын нэр, утас, дансны index (цөөн query-ээр нэг удаа бүтээнэ)"""
+
+    def __init__(self):
+        self.students = {
+            student['id']: student
+            for student in Student.objects.filter(is_active=True).values(
+                'id', 'first_name', 'last_name', 'phone', 'monthly_fee'
+            )
+        }
+        self.first_names = defaultdict(set)
+        self.last_names = defaultdict(set)
+        self.phones = defaultdict(set)
+        for student_id, student in self.students.items():
+            first, last = name_key(student['first_name']), name_key(student['last_name'])
+            if len(first) >= MIN_NAME_LENGTH:
+                self.first_names[first].add(student_id)
+            if len(last) >= MIN_NAME_LENGTH:
+                self.last_names[last].add(student_id)
+            if phone_key(student['phone']):
+                self.phones[phone_key(student['phone'])].add(student_id)
+
+        # Past counterparty account -> student mappings
+        self.accounts = defaultdict(Counter)
+        for counterparty, student_id, count in PaymentAllocation.objects.exclude(
+            bank_transaction__counterparty_account=''
+        ).values_list('bank_transaction__counterparty_account', 'student_id').annotate(
+            count=Count('id')
+        ).order_by():
+            if student_id in self.students:
+                self.accounts[account_key(counterparty)][student_id] += count
+
+        self.last_paid = dict(
+            PaymentAllocation.objects.filter(student_id__in=self.students).values('student_id').annotate(
+                last=Max('payment_month')
+            ).order_by().values_list('student_id', 'last')
+        )
+
+    @classmethod
+    def cached(cls):
+        """Cache-лэгдсэн index - cache-ээс авах бүрт шинэ хуулбар тул propose_all өөрчилж болно"""
+        return caching.get_or_build(caching.STUDENT_INDEX, ('index',), cls, INDEX_TIMEOUT)
+
+    def score(self, bank_transaction):
+        """
+        Гүйлгээнд тохирох сурагчдыг оноогоор
+        Returns: [(student_id, score, reasons), ...] - оноо буурахаар
+        """
+        scores = defaultdict(int)
+        reasons = defaultdict(list)
+
+        history = self.accounts.get(account_key(bank_transaction.counterparty_account))
+        if bank_transaction.counterparty_account and history:
+            total = sum(history.values())
+            for student_id, count in history.items():
+                scores[student_id] += round(SCORE_ACCOUNT * count / total)
+                reasons[student_id].append('данс')
+
+        text = f'{bank_transaction.description} {bank_transaction.counterparty_account}'
+        for phone in set(PHONE_RE.findall(text)):
+            for student_id in self.phones.get(phone, ()):
+                scores[student_id] += SCORE_PHONE
+                reasons[student_id].append('утас')
+
+        keys = text_keys(text)
+        for key in keys:
+            for student_id in self.first_names.get(key, ()):
+                scores[student_id] += SCORE_FIRST_NAME
+                reasons[student_id].append('нэр')
+            for student_id in self.last_names.get(key, ()):
+                scores[student_id] += SCORE_LAST_NAME
+                reasons[student_id].append('овог')
+
+        ranked = [(student_id, min(score, 100), reasons[student_id]) for student_id, score in scores.items()]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+
+class MatchProposal:
+    """Нэг гүйлгээний санал - сурагч, оноо, сар сараар хуваасан дүн"""
+
+    def __init__(self, bank_transaction, student, score, reasons, runner_up_score, months, auto_score=AUTO_MATCH_SCORE):
+        self.bank_transaction = bank_transaction
+        self.student = student
+        self.score = score
+        self.reasons = reasons
+        self.runner_up_score = runner_up_score
+        self.months = months
+        self.auto_score = auto_score
+
+    @property
+    def is_confident(self):
+        return self.score >= self.auto_score and self.score - self.runner_up_score >= MIN_MARGIN
+
+    @property
+    def student_name(self):
+        return f"{self.student['first_name']} {self.student['last_name']}"
+
+
+class TransactionMatcher:
+    """
+    Хүлээгдэж буй кредит гүйлгээнүүдийг сурагчтай холбох
+    1. propose - index-ээр оноо өгч, хамгийн сайн сурагчийг сонгоно
+    2. apply   - итгэлтэй саналуудыг нэг transaction дотор bulk_create хийнэ
+    """
+
+    def __init__(self, auto_score=AUTO_MATCH_SCORE, created_by=None, index=None):
+        self.auto_score = auto_score
+        self.created_by = created_by
+        self._index = index
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = StudentIndex()
+        return self._index
+
+    @staticmethod
+    def pending_transactions(date_from=None, date_to=None):
+        transactions = BankTransaction.objects.filter(
+            CREDIT_FILTER, status=BankTransaction.STATUS_PENDING, allocated_amount=0
+        ).order_by('transaction_date', 'pk')
+        if date_from:
+            transactions = transactions.filter(transaction_date__gte=date_from)
+        if date_to:
+            transactions = transactions.filter(transaction_date__lte=date_to)
+        return transactions
+
+    def start_month(self, student_id, transaction_date):
+        """Гүйлгээний сар, аль хэдийн төлсөн бол сүүлд төлсөн сарын дараах сар"""
+        start = date(transaction_date.year, transaction_date.month, 1)
+        last_paid = self.index.last_paid.get(student_id)
+        if last_paid and last_paid >= start:
+            start = next_month(last_paid)
+        return start
+
+    def propose(self, bank_transaction):
+        ranked = self.index.score(bank_transaction)
+        if not ranked or ranked[0][1] < MIN_PROPOSAL_SCORE:
+            return None
+        student_id, score, reasons = ranked[0]
+        student = self.index.students[student_id]
+        remaining = bank_transaction.amount - bank_transaction.allocated_amount
+        months = split_months(
+            remaining, student['monthly_fee'], self.start_month(student_id, bank_transaction.transaction_date)
+        )
+        return MatchProposal(
+            bank_transaction, student, score, reasons,
+            ranked[1][1] if len(ranked) > 1 else 0, months, self.auto_score,
+        )
+
+    def propose_all(self, transactions):
+        """Гүйлгээнүүдийг огнооны дарааллаар - нэг сурагчийн дараагийн гүйлгээ өмнөхийнхөө дараах сараас эхэлнэ"""
+        proposals = []
+        for bank_transaction in transactions:
+            proposal = self.propose(bank_transaction)
+            if not proposal:
+                continue
+            proposals.append(proposal)
+            if proposal.is_confident:
+                self.index.last_paid[proposal.student['id']] = proposal.months[-1][0]
+        return proposals
+
+    def apply(self, proposals):
+        """
+        Итгэлтэй саналуудаас allocation үүсгэх
+        Returns: үүссэн allocation-уудын тоо
+        """
+        proposals = [proposal for proposal in proposals if proposal.is_confident]
+        if not proposals:
+            return 0
+
+        with db_transaction.atomic():
+            # Skip transactions allocated by someone else since they were loaded
+            still_pending = set(BankTransaction.objects.select_for_update().filter(
+                pk__in=[proposal.bank_transaction.pk for proposal in proposals], allocated_amount=0
+            ).values_list('pk', flat=True))
+            proposals = [proposal for proposal in proposals if proposal.bank_transaction.pk in still_pending]
+
+            allocations = [
+                PaymentAllocation(
+                    bank_transaction=proposal.bank_transaction,
+                    student_id=proposal.student['id'],
+                    payment_month=month,
+                    amount=amount,
+                    notes=f'Автомат холболт ({proposal.score} оноо: {", ".join(proposal.reasons)})',
+                    created_by=self.created_by,
+                )
+                for proposal in proposals
+                for month, amount in proposal.months
+            ]
+            PaymentAllocation.objects.bulk_create(allocations)
+            # Splits always cover the whole amount -> fully matched
+            BankTransaction.objects.filter(pk__in=[proposal.bank_transaction.pk for proposal in proposals]).update(
+                allocated_amount=F('amount'), status=BankTransaction.STATUS_MATCHED
+            )
+
+        allocations_written(PaymentAllocation, allocations)
+        return len(allocations)
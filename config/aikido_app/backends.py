@@ -49,7 +49,7 @@ class EmailBackend(ModelBackend):
         try:
             instructor = Instructor.objects.get(email=user.email, user__isnull=True)
             instructor.user = user
-            instructor.save()
+            instructor.save(update_fields=['user'])
             return
         except Instructor.DoesNotExist:
             pass
@@ -58,14 +58,14 @@ class EmailBackend(ModelBackend):
             instructor = Instructor.objects.filter(email=user.email, user__isnull=True).first()
             if instructor:
                 instructor.user = user
-                instructor.save()
+                instructor.save(update_fields=['user'])
                 return
         
         # Try to find student by email
         try:
             student = Student.objects.get(email=user.email, user__isnull=True)
             student.user = user
-            student.save()
+            student.save(update_fields=['user'])
         except Student.DoesNotExist:
             pass
         except Student.MultipleObjectsReturned:
@@ -73,5 +73,5 @@ class EmailBackend(ModelBackend):
             student = Student.objects.filter(email=user.email, user__isnull=True).first()
             if student:
                 student.user = user
-                student.save()
+                student.save(update_fields=['user'])
 
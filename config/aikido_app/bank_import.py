@@ -0,0 +1,437 @@
+"""
+Банкны хуулга импортлох - read-only Excel уншилт, нэг удаагийн давхардлын шалгалт, bulk бичилт
+"""
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import repeat
+
+import django
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+from .logs import RowSampler, log_timings
+from .models import BankTransaction
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',  # 2025-11-13 15:57:11
+    '%Y/%m/%d %H:%M:%S',  # 2025/11/13 15:57:11
+    '%Y/%m/%d %H:%M',     # 2025/07/30 12:15
+    '%Y/%m/%d  %H:%M',    # 2025/07/30  12:15 (double space)
+    '%Y-%m-%d %H:%M',     # 2025-11-13 15:57
+    '%Y/%m/%d',
+    '%Y-%m-%d',
+    '%d.%m.%Y',
+    '%d/%m/%Y'
+]
+
+DEFAULT_BATCH_SIZE = 500
+# SQLite-ийн параметрийн хязгаараас хэтрэхгүй IN (...) хэмжээ
+FINGERPRINT_CHUNK_SIZE = 500
+
+COLUMN_KEYS = ['date', 'opening', 'debit', 'credit', 'closing', 'description', 'counterparty']
+
+
+def detect_columns(header_values):
+    """Толгой мөрөөс баганын байрлалыг (0-ээс эхэлсэн индекс) олох"""
+    columns = dict.fromkeys(COLUMN_KEYS)
+    for idx, value in enumerate(header_values):
+        if not value:
+            continue
+        cell_value = str(value).strip().lower()
+        if 'огноо' in cell_value:
+            columns['date'] = idx
+        elif 'эхний' in cell_value and 'үлдэгдэл' in cell_value:
+            columns['opening'] = idx
+        elif 'дебит' in cell_value:
+            columns['debit'] = idx
+        elif 'кредит' in cell_value:
+            columns['credit'] = idx
+        elif 'эцсийн' in cell_value and 'үлдэгдэл' in cell_value:
+            columns['closing'] = idx
+        elif 'утга' in cell_value:
+            columns['description'] = idx
+        elif 'харьцсан' in cell_value or 'данс' in cell_value:
+            columns['counterparty'] = idx
+    return columns
+
+
+def columns_from_letters(date_col, credit_col, desc_col, counterparty_col=''):
+    """Гараар оруулсан баганын үсгүүдийг индекс болгох (custom формат)"""
+    columns = dict.fromkeys(COLUMN_KEYS)
+    columns['date'] = column_index_from_string(date_col) - 1
+    columns['credit'] = column_index_from_string(credit_col) - 1
+    columns['description'] = column_index_from_string(desc_col) - 1
+    if counterparty_col:
+        columns['counterparty'] = column_index_from_string(counterparty_col) - 1
+    return columns
+
+
+def missing_required_columns(columns):
+    """Заавал байх ёстой багануудаас олдоогүйг буцаах"""
+    return [key for key in ('date', 'credit', 'description') if columns.get(key) is None]
+
+
+def parse_amount(value):
+    """Дүнг Decimal болгох - таслал, зай арилгана"""
+    if not value:
+        return None
+    try:
+        return Decimal(str(value).replace(',', '').replace(' ', ''))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def parse_date(value):
+    """Огноог date болгох - datetime эсвэл олон төрлийн текст формат"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(value.strip(), date_format).date()
+            except ValueError:
+                continue
+    return None
+
+
+def process_peak_rss_bytes():
+    """
+    Процесс эхэлснээс хойшх RSS-ийн оргил (ru_maxrss) - тооцоолох боломжгүй бол None
+    Зөвхөн энэ импортын хэрэглээ биш: өмнөх хүсэлт, импортууд ч орно
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux дээр KB, macOS дээр byte-аар буцаадаг
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _cell(values, index):
+    if index is None or index >= len(values):
+        return None
+    return values[index]
+
+
+def parse_row(values, columns):
+    """
+    Нэг мөрийг задлах
+    Returns: (transaction_dict, None) / (None, error_message) / (None, None) хоосон мөр
+    """
+    date_val = _cell(values, columns['date'])
+    if not date_val:
+        return None, None
+
+    transaction_date = parse_date(date_val)
+    if not transaction_date:
+        if isinstance(date_val, str):
+            return None, f'Огнооны формат буруу - {date_val}'
+        return None, 'Огнооны формат буруу'
+
+    debit_amount = parse_amount(_cell(values, columns['debit']))
+    credit_amount = parse_amount(_cell(values, columns['credit']))
+
+    # Determine main amount (use credit if available, otherwise debit)
+    main_amount = Decimal('0.00')
+    if credit_amount and credit_amount > 0:
+        main_amount = credit_amount
+    elif debit_amount and debit_amount != 0:
+        main_amount = abs(debit_amount)  # Use absolute value since debit is negative
+
+    desc_val = _cell(values, columns['description'])
+    counterparty_val = _cell(values, columns['counterparty'])
+    description = str(desc_val)[:500] if desc_val else ''
+    counterparty_account = str(counterparty_val)[:500] if counterparty_val else ''
+    closing_balance = parse_amount(_cell(values, columns['closing']))
+
+    return {
+        'transaction_date': transaction_date,
+        'opening_balance': parse_amount(_cell(values, columns['opening'])),
+        'debit_amount': debit_amount,
+        'credit_amount': credit_amount,
+        'closing_balance': closing_balance,
+        'amount': main_amount,
+        'description': description,
+        'counterparty_account': counterparty_account,
+        'fingerprint': BankTransaction.make_fingerprint(
+            transaction_date, credit_amount, debit_amount, description, counterparty_account, closing_balance
+        ),
+    }, None
+
+
+def read_workbook(excel_file, start_row, columns=None):
+    """
+    Excel-ийг уншиж задалсан мөрүүдийг буцаах
+    columns=None бол толгой мөрөөс автоматаар олно
+    Returns: (columns, rows, errors, skipped)
+    """
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        if columns is None:
+            header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            columns = detect_columns(header)
+            if missing_required_columns(columns):
+                return columns, [], [], 0
+
+        rows = []
+        errors = []
+        skipped = 0
+        log_error = RowSampler(logger, 'bank_import.row_error')
+        log_skipped = RowSampler(logger, 'bank_import.row_skipped')
+        for row_num, values in enumerate(
+            sheet.iter_rows(min_row=start_row, values_only=True), start=start_row
+        ):
+            try:
+                parsed, error = parse_row(values, columns)
+            except Exception as e:
+                parsed, error = None, str(e)
+            if error:
+                errors.append(f'Мөр {row_num}: {error}')
+                log_error('Мөр %d: %s', row_num, error, row=row_num)
+            elif parsed is None:
+                skipped += 1
+                log_skipped('Мөр %d: хоосон/гүйлгээгүй мөр алгасав', row_num, row=row_num)
+            else:
+                rows.append(parsed)
+        log_error.summary()
+        log_skipped.summary()
+        return columns, rows, errors, skipped
+    finally:
+        workbook.close()
+
+
+def read_statement(path, start_row=2, columns=None):
+    """
+    Нэг хуулгын файлыг уншиж задлах - process pool дотор ажиллах тул DB ашиглахгүй
+    Returns: dict (path, columns, rows, errors, skipped, total_rows, parse секунд)
+    """
+    started = time.perf_counter()
+    try:
+        columns, rows, errors, skipped = read_workbook(path, start_row, columns)
+        total_rows = len(rows) + len(errors) + skipped
+        missing = missing_required_columns(columns)
+        if missing:
+            errors = [f'Шаардлагатай баганууд олдсонгүй: {", ".join(missing)}']
+    except Exception as e:
+        rows, errors, skipped, total_rows = [], [f'Файл уншихад алдаа гарлаа: {e}'], 0, 0
+    return {
+        'path': str(path),
+        'columns': columns,
+        'rows': rows,
+        'errors': errors,
+        'skipped': skipped,
+        'total_rows': total_rows,
+        'parse': time.perf_counter() - started,
+    }
+
+
+class ImportStats:
+    """Импортын үр дүн ба хурдны хэмжилт"""
+
+    def __init__(self, source=''):
+        self.source = source
+        self.total_rows = 0
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.columns = {}
+        self.timings = {}
+        self.process_peak_rss = None
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+    @property
+    def rows_per_second(self):
+        return self.total_rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        text = (
+            f'{self.total_rows} мөр {self.elapsed:.2f} сек '
+            f'({self.rows_per_second:,.0f} мөр/сек)'
+        )
+        if self.process_peak_rss is not None:
+            text += f', процессын RSS оргил {self.process_peak_rss / (1024 * 1024):.1f} MB'
+        return text
+
+    def log(self, **fields):
+        """Шат бүрийн хугацааг бүтэцтэй бичлэгээр (parse, dedupe, write, нийт)"""
+        log_timings(
+            logger, 'bank_import', self.timings,
+            source=self.source, rows=self.total_rows, imported=self.imported,
+            skipped=self.skipped, errors=len(self.errors), process_peak_rss=self.process_peak_rss, **fields,
+        )
+
+
+class BankStatementImporter:
+    """
+    Банкны хуулгын импорт
+    1. parse  - read-only горимоор мөр бүрийг values_only уншина (олон файлыг process pool-оор)
+    2. dedupe - мөр бүрийн fingerprint-ийг баазын unique index-ээс хайна
+    3. write  - bulk_create-ээр batch-аар, нэг transaction дотор бичнэ
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def existing_fingerprints(fingerprints):
+        """Өгсөн fingerprint-уудаас баазад байгаа нь (FINGERPRINT_CHUNK_SIZE-аар хувааж хайна)"""
+        fingerprints = list(fingerprints)
+        keys = set()
+        for start in range(0, len(fingerprints), FINGERPRINT_CHUNK_SIZE):
+            keys.update(BankTransaction.objects.filter(
+                fingerprint__in=fingerprints[start:start + FINGERPRINT_CHUNK_SIZE]
+            ).values_list('fingerprint', flat=True))
+        return keys
+
+    def load_existing_keys(self, rows):
+        """
+        Файлын мөрүүдтэй таарах баазын fingerprint-ууд (unique index-ээр хайна)
+        backfill хийгдээгүй хуучин гүйлгээнүүдийн fingerprint-ийг огнооны хүрээнд тооцно
+        """
+        if not rows:
+            return set()
+        keys = self.existing_fingerprints({row['fingerprint'] for row in rows})
+
+        dates = [row['transaction_date'] for row in rows]
+        legacy = BankTransaction.objects.filter(
+            fingerprint__isnull=True,
+            transaction_date__gte=min(dates),
+            transaction_date__lte=max(dates),
+        ).values_list(
+            'transaction_date', 'credit_amount', 'debit_amount',
+            'description', 'counterparty_account', 'closing_balance'
+        )
+        keys.update(BankTransaction.make_fingerprint(*values) for values in legacy.iterator())
+        return keys
+
+    def deduplicate(self, rows, existing_keys):
+        """Баазад болон файлд давхардсан мөрүүдийг хасах"""
+        new_rows = []
+        skipped = 0
+        for row in rows:
+            if row['fingerprint'] in existing_keys:
+                skipped += 1
+                continue
+            existing_keys.add(row['fingerprint'])
+            new_rows.append(row)
+        return new_rows, skipped
+
+    def write(self, rows):
+        """
+        bulk_create-ээр batch-аар нэг transaction дотор бичих
+        Зэрэг ажилласан импорт ижил гүйлгээ бичсэн бол unique fingerprint дээр ON CONFLICT DO NOTHING
+        Returns: бодитоор бичигдсэн мөрүүдийн fingerprint - алгасагдсан мөр тоологдохгүй
+        """
+        fingerprints = [row['fingerprint'] for row in rows]
+        with transaction.atomic():
+            before = self.existing_fingerprints(fingerprints)
+            for start in range(0, len(rows), self.batch_size):
+                BankTransaction.objects.bulk_create([
+                    BankTransaction(status=BankTransaction.STATUS_PENDING, payer_name='', **row)
+                    for row in rows[start:start + self.batch_size]
+                ], ignore_conflicts=True)
+            # ignore_conflicts үед bulk_create бичигдсэн мөрийг мэдээлдэггүй
+            return self.existing_fingerprints(fingerprints) - before
+
+    def run(self, excel_file, start_row=2, columns=None):
+        """Бүх шатыг ажиллуулж ImportStats буцаах"""
+        stats = ImportStats()
+
+        started = time.perf_counter()
+        columns, rows, errors, skipped = read_workbook(excel_file, start_row, columns)
+        stats.timings['parse'] = time.perf_counter() - started
+        stats.columns = columns
+        stats.errors = errors
+        stats.skipped = skipped
+        stats.total_rows = len(rows) + len(errors) + skipped
+
+        started = time.perf_counter()
+        existing_keys = self.load_existing_keys(rows)
+        new_rows, duplicates = self.deduplicate(rows, existing_keys)
+        stats.skipped += duplicates
+        stats.timings['dedupe'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stats.imported = len(self.write(new_rows))
+        stats.skipped += len(new_rows) - stats.imported
+        stats.timings['write'] = time.perf_counter() - started
+
+        stats.process_peak_rss = process_peak_rss_bytes()
+        stats.log()
+        return stats
+
+    def parse_files(self, paths, start_row=2, columns=None, workers=None):
+        """Файлуудыг process pool-оор зэрэг уншиж, өгсөн дарааллаар нь буцаах"""
+        workers = min(workers or os.cpu_count() or 1, len(paths))
+        if workers <= 1:
+            return [read_statement(path, start_row, columns) for path in paths]
+        # Worker process-ууд models-ийг import хийхийн тулд Django-г тохируулна (spawn горимд ч ажиллана)
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            return list(pool.map(read_statement, paths, repeat(start_row), repeat(columns)))
+
+    def run_many(self, paths, start_row=2, columns=None, workers=None, dry_run=False):
+        """
+        Олон файлыг зэрэг задлаад, нэг dedupe болон нэг bulk бичилтээр нэгтгэх
+        Файлуудын хооронд давхардсан гүйлгээ (давхцсан хугацааны хуулга) нэг л удаа бичигдэнэ
+        Returns: (file_stats, total) - файл бүрийн болон нийт ImportStats
+        """
+        total = ImportStats('Нийт')
+
+        started = time.perf_counter()
+        results = self.parse_files(paths, start_row, columns, workers)
+        total.timings['parse'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        existing_keys = self.load_existing_keys([row for result in results for row in result['rows']])
+        file_stats = []
+        new_rows = []
+        for result in results:
+            stats = ImportStats(result['path'])
+            stats.columns = result['columns']
+            stats.errors = result['errors']
+            stats.skipped = result['skipped']
+            stats.total_rows = result['total_rows']
+            stats.timings['parse'] = result['parse']
+
+            file_rows, duplicates = self.deduplicate(result['rows'], existing_keys)
+            stats.skipped += duplicates
+            stats.imported = len(file_rows)
+            new_rows.append(file_rows)
+            file_stats.append(stats)
+
+            total.total_rows += stats.total_rows
+            total.errors.extend(f'{result["path"]}: {error}' for error in stats.errors)
+        total.timings['dedupe'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if not dry_run:
+            written = self.write([row for file_rows in new_rows for row in file_rows])
+            # Зэрэг импортод бичигдээгүй мөрүүд давхардсанд тооцогдоно
+            for stats, file_rows in zip(file_stats, new_rows):
+                stats.imported = sum(row['fingerprint'] in written for row in file_rows)
+                stats.skipped += len(file_rows) - stats.imported
+        total.imported = sum(stats.imported for stats in file_stats)
+        total.skipped = sum(stats.skipped for stats in file_stats)
+        total.timings['write'] = time.perf_counter() - started
+
+        total.process_peak_rss = process_peak_rss_bytes()
+        for stats in file_stats:
+            stats.log()
+        total.log(files=len(paths), dry_run=dry_run)
+        return file_stats, total
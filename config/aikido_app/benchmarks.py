@@ -0,0 +1,417 @@
+"""
+Хурдны benchmark - хиймэл өгөгдөл үүсгэж гол хуудас, командуудын хугацаа, query тоог хэмжинэ
+- generate(): N сурагч, M багш, K жилийн хичээл, ирц, банкны гүйлгээ, хуваарилалтыг bulk-аар үүсгэнэ (seed-ээр тогтмол)
+- SCENARIOS: хэмжих хуудас/команд бүр (prepare нь хэмжихгүй бэлтгэл, буцаасан функцийг хэмжинэ)
+- run_scenarios(): давталт бүрийн өмнө cache цэвэрлэнэ (хүйтэн cache) - median/min/max ms, query тоо
+- compare(): baseline JSON-той харьцуулж query тоо өссөн эсвэл хугацаа tolerance-аас хэтэрсэн сценарийг буцаана
+"""
+import calendar
+import json
+import platform
+import random
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from openpyxl import Workbook
+
+from .allocation_batch import allocations_written
+from .attendance_batch import CLASS_WEEKDAYS
+from .forms import BankTransactionUploadForm
+from .models import (
+    Attendance, BankTransaction, ClassSession, ClassType, ExpenseAllocation, ExpenseCategory,
+    Instructor, InstructorAssignment, PaymentAllocation, Student
+)
+from .profiling import QueryRecorder
+
+
+DEFAULT_PARAMS = {
+    'students': 200,
+    'instructors': 6,
+    'years': 1,
+    'end_year': date.today().year - 1,
+    'pending': 20,
+    'upload_rows': 500,
+    'seed': 1,
+}
+
+FIRST_NAMES = ['Бат', 'Болд', 'Сараа', 'Номин', 'Тэмүүлэн', 'Анар', 'Ганбаатар', 'Оюун', 'Мөнх', 'Энх']
+LAST_NAMES = ['Дорж', 'Пүрэв', 'Баяр', 'Очир', 'Цэрэн', 'Гантулга', 'Лхагва', 'Нямаа']
+SESSION_TIMES = {
+    ClassType.MORNING: (dt_time(7, 0), dt_time(8, 30)),
+    ClassType.EVENING: (dt_time(19, 0), dt_time(20, 30)),
+    ClassType.CHILDREN: (dt_time(10, 0), dt_time(11, 30)),
+}
+MONTHLY_FEES = [Decimal('40000'), Decimal('50000'), Decimal('60000')]
+# Сурагч сар бүр төлөх, хичээл бүрт ирэх магадлал
+PAYMENT_RATE = 0.85
+ATTENDANCE_RATE = 0.6
+BANK_HEADER = ['Гүйлгээний огноо', 'Эхний үлдэгдэл', 'Дебит гүйлгээ', 'Кредит гүйлгээ',
+               'Эцсийн үлдэгдэл', 'Гүйлгээний утга', 'Харьцсан данс']
+
+
+def baseline_path():
+    return Path(getattr(settings, 'BENCHMARK_BASELINE_FILE', Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+
+
+def month_starts(first_year, last_year):
+    return [date(year, month, 1) for year in range(first_year, last_year + 1) for month in range(1, 13)]
+
+
+def month_days(month):
+    return [month.replace(day=day) for day in range(1, calendar.monthrange(month.year, month.month)[1] + 1)]
+
+
+class SyntheticData:
+    """generate()-ийн үр дүн - сценариудад хэрэгтэй объектууд"""
+
+    def __init__(self, params):
+        self.params = params
+        self.months = month_starts(params['end_year'] - params['years'] + 1, params['end_year'])
+        self.last_month = self.months[-1]
+        self.user = None
+        self.class_types = {}
+        self.students = []
+        self.enrolled = {}
+        self.instructors = []
+        self.pending_transactions = []
+        self.counts = {}
+
+
+def generate(**params):
+    """
+    Хиймэл өгөгдөл - одоогийн (хоосон, тест) баазад bulk_create-ээр бичнэ
+    Returns: SyntheticData
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    rng = random.Random(params['seed'])
+    data = SyntheticData(params)
+
+    data.user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    data.class_types = {
+        name: ClassType.objects.get_or_create(name=name)[0] for name, _ in ClassType.CLASS_TYPE_CHOICES
+    }
+    class_type_names = list(data.class_types)
+
+    data.instructors = Instructor.objects.bulk_create([
+        Instructor(
+            first_name=rng.choice(FIRST_NAMES), last_name=f'{rng.choice(LAST_NAMES)}{index}',
+            phone=f'9900{index:04d}', hire_date=date(params['end_year'] - params['years'], 1, 1),
+            dan_rank=rng.randint(1, 4), current_rank_date=date(params['end_year'] - params['years'], 1, 1),
+        )
+        for index in range(params['instructors'])
+    ])
+    data.students = Student.objects.bulk_create([
+        Student(
+            first_name=rng.choice(FIRST_NAMES), last_name=f'{rng.choice(LAST_NAMES)}{index}',
+            phone=f'8800{index:04d}', kyu_rank=rng.randint(1, 8), monthly_fee=rng.choice(MONTHLY_FEES),
+        )
+        for index in range(params['students'])
+    ])
+    # Сурагч бүр нэг ангид
+    enrolled = data.enrolled = {name: [] for name in class_type_names}
+    for index, student in enumerate(data.students):
+        enrolled[class_type_names[index % len(class_type_names)]].append(student)
+    Student.class_types.through.objects.bulk_create([
+        Student.class_types.through(student_id=student.pk, classtype_id=data.class_types[name].pk)
+        for name, students in enrolled.items() for student in students
+    ])
+
+    sessions = ClassSession.objects.bulk_create([
+        ClassSession(
+            class_type=data.class_types[name], date=day, weekday=day.weekday(),
+            start_time=SESSION_TIMES[name][0], end_time=SESSION_TIMES[name][1],
+        )
+        for month in data.months for day in month_days(month)
+        for name in class_type_names if day.weekday() in CLASS_WEEKDAYS[name]
+    ])
+    leads = {name: data.instructors[index % len(data.instructors)] for index, name in enumerate(class_type_names)}
+    assignments = []
+    attendances = []
+    for session in sessions:
+        name = session.class_type.name
+        assignments.append(InstructorAssignment(session=session, instructor=leads[name], role=InstructorAssignment.LEAD))
+        if rng.random() < 0.3:
+            assistant = rng.choice(data.instructors)
+            if assistant != leads[name]:
+                assignments.append(InstructorAssignment(
+                    session=session, instructor=assistant, role=InstructorAssignment.ASSISTANT
+                ))
+        attendances.extend(
+            Attendance(session=session, student=student, recorded_by=leads[name])
+            for student in enrolled[name] if rng.random() < ATTENDANCE_RATE
+        )
+    InstructorAssignment.objects.bulk_create(assignments)
+    Attendance.objects.bulk_create(attendances, batch_size=2000)
+
+    # Сар бүрийн төлбөр - нэг гүйлгээ, нэг хуваарилалт
+    paid = []
+    for month in data.months:
+        for student in data.students:
+            if rng.random() < PAYMENT_RATE:
+                day = month.replace(day=rng.randint(1, 28))
+                paid.append((student, month, _transaction(
+                    day, credit=student.monthly_fee, description=f'{student.last_name} {month:%Y-%m} сарын төлбөр',
+                    account=f'5000{student.pk:06d}', status=BankTransaction.STATUS_MATCHED,
+                )))
+    BankTransaction.objects.bulk_create([transaction for _, _, transaction in paid], batch_size=1000)
+    payment_allocations = PaymentAllocation.objects.bulk_create([
+        PaymentAllocation(
+            bank_transaction=transaction, student=student, payment_month=month,
+            amount=transaction.amount, attendance_count=0,
+        )
+        for student, month, transaction in paid
+    ], batch_size=1000)
+
+    # Сар бүрийн түрээсийн зардал
+    rent = ExpenseCategory.objects.create(name='Заалны түрээс')
+    expenses = [
+        _transaction(month.replace(day=25), debit=Decimal('-800000'), description=f'Түрээс {month:%Y-%m}',
+                     account='4000000001', status=BankTransaction.STATUS_MATCHED)
+        for month in data.months
+    ]
+    BankTransaction.objects.bulk_create(expenses)
+    expense_allocations = ExpenseAllocation.objects.bulk_create([
+        ExpenseAllocation(bank_transaction=transaction, expense_category=rent,
+                          amount=transaction.amount, expense_date=transaction.transaction_date)
+        for transaction in expenses
+    ])
+
+    # bank_transaction_match-д холбох хүлээгдэж буй гүйлгээнүүд
+    data.pending_transactions = BankTransaction.objects.bulk_create([
+        _transaction(data.last_month.replace(day=1 + index % 28), credit=Decimal('50000'),
+                     description=f'Хүлээгдэж буй төлбөр {index}', account=f'7000{index:06d}',
+                     status=BankTransaction.STATUS_PENDING)
+        for index in range(params['pending'])
+    ])
+
+    allocations_written(PaymentAllocation, payment_allocations)
+    allocations_written(ExpenseAllocation, expense_allocations)
+    cache.clear()
+
+    data.counts = {
+        'students': len(data.students),
+        'instructors': len(data.instructors),
+        'sessions': len(sessions),
+        'assignments': len(assignments),
+        'attendances': len(attendances),
+        'bank_transactions': len(paid) + len(expenses) + len(data.pending_transactions),
+        'allocations': len(payment_allocations) + len(expense_allocations),
+    }
+    return data
+
+
+def _transaction(day, description, account, status, credit=None, debit=None):
+    """Хуваарилалттай бол allocated_amount-ийг шууд бөглөнө (bulk_create signal илгээдэггүй)"""
+    amount = credit if credit is not None else abs(debit)
+    return BankTransaction(
+        transaction_date=day, credit_amount=credit, debit_amount=debit, amount=amount,
+        description=description, counterparty_account=account, status=status,
+        allocated_amount=amount if status == BankTransaction.STATUS_MATCHED else Decimal('0.00'),
+        fingerprint=BankTransaction.make_fingerprint(day, credit, debit, description, account, None),
+    )
+
+
+def statement_file(data, run, rows):
+    """bank_transaction_upload-д илгээх Excel - давталт бүрт шинэ гүйлгээнүүд"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(BANK_HEADER)
+    month = data.last_month
+    for index in range(rows):
+        sheet.append([
+            datetime(month.year, month.month, 1 + index % 28, 9, index % 60), None, None, 50000 + index,
+            None, f'Хуулга {run}-{index}', f'6000{index:06d}',
+        ])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(
+        'statement.xlsx', buffer.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def _get(client, url, **params):
+    return lambda: client.get(url, params)
+
+
+def prepare_payment_list(client, data, run):
+    return _get(client, reverse('payment_list'), year=data.last_month.year)
+
+
+def prepare_attendance_get(client, data, run):
+    return _get(client, reverse('attendance_record'), class_type=ClassType.MORNING, month=f'{data.last_month:%Y-%m}')
+
+
+def prepare_attendance_post(client, data, run):
+    """Сүүлийн сарын өглөөний ангийн бүх сурагч x хичээлийн өдөр - давталт бүрт ирсэн/тасалсныг сэлгэнэ"""
+    student_ids = [student.pk for student in data.enrolled[ClassType.MORNING]]
+    days = [day for day in month_days(data.last_month) if day.weekday() in CLASS_WEEKDAYS[ClassType.MORNING]]
+    body = json.dumps({
+        'class_type': ClassType.MORNING,
+        'instructor_assignments': [],
+        'attendance': [
+            {'student_id': student_id, 'date': day.isoformat(), 'is_present': (run + student_id) % 2 == 0}
+            for student_id in student_ids for day in days
+        ],
+    })
+    return lambda: client.post(reverse('attendance_record'), body, content_type='application/json')
+
+
+def prepare_upload(client, data, run):
+    """Маягтын анхны утгууд (standard формат) - хөтөч илгээдэгтэй ижил"""
+    post = {
+        name: field.initial for name, field in BankTransactionUploadForm.base_fields.items()
+        if field.initial is not None
+    }
+    post['excel_file'] = statement_file(data, run, data.params['upload_rows'])
+    return lambda: client.post(reverse('bank_transaction_upload'), post)
+
+
+def prepare_match_get(client, data, run):
+    transaction = data.pending_transactions[run % len(data.pending_transactions)]
+    return _get(client, reverse('bank_transaction_match', args=[transaction.pk]))
+
+
+def prepare_match_post(client, data, run):
+    """Хүлээгдэж буй гүйлгээг нэг сурагчийн хоёр сард хуваарилна"""
+    transaction = data.pending_transactions[run]
+    student = data.students[run % len(data.students)]
+    months = data.months[-2:] if len(data.months) > 1 else data.months * 2
+    return lambda: client.post(reverse('bank_transaction_match', args=[transaction.pk]), {
+        'income_type': 'student_payment',
+        'student_id[]': [student.pk] * 2,
+        'payment_month[]': [f'{month:%Y-%m}' for month in months],
+        'amount[]': ['25000', '25000'],
+        'notes[]': ['', ''],
+    })
+
+
+def prepare_monthly_report(client, data, run):
+    return _get(client, reverse('monthly_payment_report'), view_mode='month', month=f'{data.last_month:%Y-%m}')
+
+
+def prepare_calculate_payments(client, data, run):
+    options = {
+        'from_month': f'{data.months[0]:%Y-%m}', 'to_month': f'{data.last_month:%Y-%m}',
+        'recalculate': True, 'stdout': StringIO(),
+    }
+    return lambda: call_command('calculate_monthly_payments', **options)
+
+
+# name -> (prepare, хүлээгдэх HTTP статус; команд бол None)
+SCENARIOS = {
+    'payment_list': (prepare_payment_list, 200),
+    'attendance_record_get': (prepare_attendance_get, 200),
+    'attendance_record_post': (prepare_attendance_post, 200),
+    'bank_transaction_upload': (prepare_upload, 302),
+    'bank_transaction_match_get': (prepare_match_get, 200),
+    'bank_transaction_match_post': (prepare_match_post, 302),
+    'monthly_payment_report': (prepare_monthly_report, 200),
+    'calculate_monthly_payments': (prepare_calculate_payments, None),
+}
+
+
+def measure(action):
+    """Нэг удаагийн хэмжилт - (хариу, wall ms, query тоо)"""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for db_connection in connections.all():
+            stack.enter_context(db_connection.execute_wrapper(recorder))
+        started = time.perf_counter()
+        response = action()
+        wall_time = time.perf_counter() - started
+    return response, round(wall_time * 1000, 2), len(recorder.queries)
+
+
+def run_scenarios(data, names=None, repeat=5):
+    """
+    Returns: {name: {'median_ms', 'min_ms', 'max_ms', 'queries', 'runs'}}
+    Хүлээгдээгүй HTTP статус ирвэл RuntimeError
+    """
+    names = names or list(SCENARIOS)
+    if 'bank_transaction_match_post' in names and repeat > len(data.pending_transactions):
+        raise ValueError(f'bank_transaction_match_post-д {repeat} хүлээгдэж буй гүйлгээ хэрэгтэй')
+
+    client = Client()
+    client.force_login(data.user)
+    results = {}
+    for name in names:
+        prepare, expected_status = SCENARIOS[name]
+        timings = []
+        queries = []
+        for run in range(repeat):
+            action = prepare(client, data, run)
+            cache.clear()
+            response, wall_ms, query_count = measure(action)
+            if expected_status is not None and response.status_code != expected_status:
+                raise RuntimeError(f'{name}: HTTP {response.status_code} (хүлээгдэж байсан {expected_status})')
+            timings.append(wall_ms)
+            queries.append(query_count)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': min(timings),
+            'max_ms': max(timings),
+            'queries': max(queries),
+            'runs': repeat,
+        }
+    return results
+
+
+def report(data, results):
+    """Baseline файлд хадгалах бүтэц"""
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'params': data.params,
+        'counts': data.counts,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def save_baseline(payload, path=None):
+    path = Path(path or baseline_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def load_baseline(path=None):
+    with open(path or baseline_path(), encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def compare(baseline, results, tolerance=0.25):
+    """
+    Регресс - query тоо өссөн эсвэл median хугацаа baseline*(1+tolerance)-аас их
+    Returns: [(name, тайлбар)]
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append((name, f'query {before["queries"]} -> {result["queries"]}'))
+        limit = before['median_ms'] * (1 + tolerance)
+        if result['median_ms'] > limit:
+            regressions.append((name, f'median {before["median_ms"]:.1f} -> {result["median_ms"]:.1f} ms'))
+    return regressions
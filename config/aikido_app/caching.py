@@ -0,0 +1,82 @@
+"""
+Тайлангийн cache - тайлан бүр өөрийн namespace-тэй, хувилбарын дугаараар хүчингүй болгоно
+- key: aikido:<namespace>:<version>:<parts...>
+- invalidate(namespace) нь хувилбарыг солих тул хуучин түлхүүрүүд TIMEOUT-оор аяндаа устна
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+CACHE_ALIAS = 'default'
+KEY_PREFIX = 'aikido'
+
+PAYMENT_PIVOT = 'payment_pivot'
+MONTHLY_REPORT = 'monthly_report'
+DASHBOARD = 'dashboard'
+INSTRUCTOR_STATS = 'instructor_stats'
+STUDENT_INDEX = 'student_index'
+
+NAMESPACES = (PAYMENT_PIVOT, MONTHLY_REPORT, DASHBOARD, INSTRUCTOR_STATS, STUDENT_INDEX)
+
+# Process бүрт тусдаа санах ойтой backend-ууд - worker-ууд хувилбарын дугаараа хуваалцахгүй
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def is_shared():
+    """Cache бүх worker-т нийтлэг эсэх (файл, DB, Redis, Memcached) - LocMem бол нэг process-ийнх"""
+    return settings.CACHES[CACHE_ALIAS]['BACKEND'] not in LOCAL_BACKENDS
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}:version'
+
+
+def namespace_version(namespace):
+    """Namespace-ийн одоогийн хувилбар (байхгүй бол үүсгэнэ)"""
+    cache = get_cache()
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        version = time.time_ns()
+        cache.set(_version_key(namespace), version, None)
+    return version
+
+
+def make_key(namespace, *parts):
+    """Хувилбартай cache түлхүүр үүсгэх"""
+    return ':'.join(
+        [KEY_PREFIX, namespace, str(namespace_version(namespace))]
+        + ['' if part is None else str(part) for part in parts]
+    )
+
+
+def get_or_build(namespace, parts, build, timeout):
+    """Cache-д байвал буцаах, үгүй бол build()-ийг дуудаж хадгалах"""
+    cache = get_cache()
+    key = make_key(namespace, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def delete(namespace, *parts_list):
+    """Namespace доторх тодорхой түлхүүрүүдийг устгах (parts_list - tuple-уудын жагсаалт)"""
+    keys = [make_key(namespace, *parts) for parts in parts_list]
+    if keys:
+        get_cache().delete_many(keys)
+
+
+def invalidate(*namespaces):
+    """Namespace-уудын бүх түлхүүрийг нэг дор хүчингүй болгох"""
+    version = time.time_ns()
+    get_cache().set_many({_version_key(namespace): version for namespace in namespaces}, None)
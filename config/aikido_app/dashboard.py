@@ -0,0 +1,90 @@
+"""
+Хяналтын самбарын үзүүлэлтүүд - цөөн aggregate query, богино хугацааны cache
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q, Sum
+
+from . import caching
+from .models import Attendance, ClassSession, Instructor, Payment, Student
+
+
+TILES_TIMEOUT = 60
+ATTENDANCE_TIMEOUT = 60 * 5
+
+
+def invalidate_dashboard():
+    """Самбарын бүх cache-ийг хүчингүй болгох (signals.py-аас дуудагдана)"""
+    caching.invalidate(caching.DASHBOARD)
+
+
+def _cached(name, today, timeout, build):
+    return caching.get_or_build(caching.DASHBOARD, (name, today.isoformat()), lambda: build(today), timeout)
+
+
+def week_start_for(today):
+    return today - timedelta(days=today.weekday())
+
+
+def build_tiles(today):
+    """Сурагч, багш, хичээл, орлогын тоонууд"""
+    week_start = week_start_for(today)
+    month_start = today.replace(day=1)
+
+    students = Student.objects.aggregate(
+        total_students=Count('id', filter=Q(is_active=True)),
+        new_students_this_month=Count('id', filter=Q(enrollment_date__gte=month_start)),
+    )
+    payments = Payment.objects.filter(transaction_date__gte=month_start, is_verified=True).aggregate(
+        total_revenue=Sum('amount'),
+        payments_this_month=Count('id'),
+    )
+    return {
+        'total_students': students['total_students'],
+        'total_instructors': Instructor.objects.filter(is_active=True).count(),
+        'classes_this_week': ClassSession.objects.filter(
+            date__gte=week_start,
+            date__lte=week_start + timedelta(days=6)
+        ).count(),
+        'total_revenue': payments['total_revenue'] or 0,
+        'payments_this_month': payments['payments_this_month'],
+        'new_students_this_month': students['new_students_this_month'],
+    }
+
+
+def build_attendance_last_week(today):
+    """Өмнөх 7 хоногийн өдөр бүрийн ирц - нэг GROUP BY session__date query"""
+    last_week_start = week_start_for(today) - timedelta(days=7)
+    days = [last_week_start + timedelta(days=i) for i in range(7)]
+
+    counts = {
+        row['session__date']: row
+        for row in Attendance.objects.filter(
+            session__date__gte=days[0], session__date__lte=days[-1]
+        ).values('session__date').annotate(
+            total=Count('id'),
+            present=Count('id', filter=Q(is_present=True)),
+        ).order_by()
+    }
+
+    attendance_last_week = []
+    for day in days:
+        total_attendance = counts.get(day, {}).get('total', 0)
+        present_count = counts.get(day, {}).get('present', 0)
+        attendance_last_week.append({
+            'date': day,
+            'weekday': day.strftime('%a'),
+            'total': total_attendance,
+            'present': present_count,
+            'percentage': (present_count / total_attendance * 100) if total_attendance > 0 else 0
+        })
+    return attendance_last_week
+
+
+def dashboard_metrics(today):
+    """Самбарын бүх үзүүлэлт (cache-лэгдсэн)"""
+    metrics = dict(_cached('tiles', today, TILES_TIMEOUT, build_tiles))
+    metrics['attendance_last_week'] = _cached(
+        'attendance_last_week', today, ATTENDANCE_TIMEOUT, build_attendance_last_week
+    )
+    return metrics
@@ -347,3 +347,36 @@ class AttendanceRecordForm(forms.Form):
                 raise ValidationError('Эхлэх цаг дуусах цагаас өмнө байх ёстой.')
         
         return cleaned_data
+
+
+class RankPromotionForm(forms.Form):
+    """Шалгалтын дараа зэрэг олноор ахиулах форм - мөрүүд нь маягтаас эсвэл CSV-ээс"""
+    
+    exam_date = forms.DateField(
+        label='Шалгалтын огноо',
+        initial=date.today,
+        widget=forms.DateInput(attrs={
+            'type': 'date',
+            'class': 'px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500'
+        })
+    )
+    
+    notes = forms.CharField(
+        label='Тэмдэглэл',
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500',
+            'placeholder': 'Жишээ: Намрын кюү шалгалт'
+        })
+    )
+    
+    csv_file = forms.FileField(
+        label='CSV файл',
+        required=False,
+        help_text='Багана: сурагчийн ID, шинэ зэрэг (жишээ: 12,4 kyu). Файл өгвөл доорх хүснэгтийг ашиглахгүй',
+        widget=forms.FileInput(attrs={
+            'class': 'block w-full text-sm text-gray-900 border border-gray-300 rounded-lg cursor-pointer bg-gray-50 focus:outline-none',
+            'accept': '.csv'
+        })
+    )
@@ -0,0 +1,209 @@
+"""
+Багшийн томилолтын статистик - үүрэг × ангийн төрлөөр нэг query-ээр тоолох
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+
+from . import caching
+from .models import ClassSession, ClassType, InstructorAssignment
+from .periods import MonthRange
+
+
+STATS_TIMEOUT = 60 * 10
+
+ROLE_KEYS = {
+    InstructorAssignment.LEAD: 'lead',
+    InstructorAssignment.ASSISTANT: 'assistant',
+}
+
+CLASS_TYPE_KEYS = {
+    ClassType.MORNING: 'morning',
+    ClassType.EVENING: 'evening',
+    ClassType.CHILDREN: 'children',
+}
+
+
+def invalidate_instructor_stats():
+    caching.invalidate(caching.INSTRUCTOR_STATS)
+
+
+def parse_date_range(params):
+    """GET параметрээс date_from/date_to унших - буруу утгыг үл тооно"""
+    date_range = []
+    for name in ('date_from', 'date_to'):
+        try:
+            date_range.append(parse_date(params.get(name, '')))
+        except ValueError:
+            date_range.append(None)
+    return tuple(date_range)
+
+
+def empty_stats():
+    stats = {
+        class_key: {role_key: 0 for role_key in ROLE_KEYS.values()}
+        for class_key in CLASS_TYPE_KEYS.values()
+    }
+    stats['total_lead'] = 0
+    stats['total_assistant'] = 0
+    return stats
+
+
+def instructor_assignment_stats(instructor_ids=None, date_from=None, date_to=None):
+    """
+    Багш бүрийн ахлах/туслах × өглөө/орой/хүүхэд хичээлийн тоо
+    Returns: {instructor_id: stats} - томилолтгүй багш dict-д орохгүй
+    """
+    assignments = InstructorAssignment.objects.all()
+    if instructor_ids is not None:
+        assignments = assignments.filter(instructor_id__in=instructor_ids)
+    if date_from:
+        assignments = assignments.filter(session__date__gte=date_from)
+    if date_to:
+        assignments = assignments.filter(session__date__lte=date_to)
+
+    aggregates = {
+        f'{role_key}_{class_key}': Count(
+            'id', filter=Q(role=role, session__class_type__name=class_name)
+        )
+        for role, role_key in ROLE_KEYS.items()
+        for class_name, class_key in CLASS_TYPE_KEYS.items()
+    }
+
+    stats_by_instructor = {}
+    for row in assignments.values('instructor_id').annotate(**aggregates).order_by():
+        stats = empty_stats()
+        for role_key in ROLE_KEYS.values():
+            for class_key in CLASS_TYPE_KEYS.values():
+                count = row[f'{role_key}_{class_key}']
+                stats[class_key][role_key] = count
+                stats[f'total_{role_key}'] += count
+        stats_by_instructor[row['instructor_id']] = stats
+    return stats_by_instructor
+
+
+def cached_assignment_stats(date_from=None, date_to=None):
+    """Бүх багшийн статистик огнооны мужаар cache-лэгдсэн"""
+    return caching.get_or_build(
+        caching.INSTRUCTOR_STATS, ('assignments', date_from, date_to),
+        lambda: instructor_assignment_stats(None, date_from, date_to),
+        STATS_TIMEOUT,
+    )
+
+
+def attach_instructor_stats(instructors, date_from=None, date_to=None):
+    """Багш бүрт .stats атрибут онооно (template-д instructor.stats.morning.lead гэх мэт)"""
+    instructors = list(instructors)
+    stats_by_instructor = cached_assignment_stats(date_from, date_to)
+    for instructor in instructors:
+        instructor.stats = stats_by_instructor.get(instructor.pk) or empty_stats()
+    return instructors
+
+
+def period_sessions(period, class_type_ids=None):
+    """Хүрээний цуцлагдаагүй (is_cancelled=False) хичээлүүд - цалин болон ирцийн хуудас хоёулаа үүнийг тоолно"""
+    sessions = ClassSession.objects.filter(is_cancelled=False).in_period(period)
+    if class_type_ids is not None:
+        sessions = sessions.filter(class_type_id__in=class_type_ids)
+    return sessions
+
+
+def month_sessions(year, month):
+    """Тухайн сарын цуцлагдаагүй хичээлүүд"""
+    return period_sessions(MonthRange.month(date(year, month, 1)))
+
+
+def session_assignment_counts(sessions):
+    """
+    Хичээлүүд дээрх томилолтыг нэг GROUP BY-оор тоолох
+    Returns: {(instructor_id, class_type_name, role): count}
+    """
+    rows = InstructorAssignment.objects.filter(session__in=sessions).values_list(
+        'instructor_id', 'session__class_type__name', 'role'
+    ).annotate(count=Count('id')).order_by()
+    return {(instructor_id, class_name, role): count for instructor_id, class_name, role, count in rows}
+
+
+def session_month_counts(sessions):
+    """
+    Олон сарын хичээлийг (анги, сар)-аар тоолох
+    Returns: {(class_type_id, month): count}
+    """
+    rows = sessions.values('class_type_id', month=TruncMonth('date')).annotate(count=Count('id')).order_by()
+    return {(row['class_type_id'], row['month']): row['count'] for row in rows}
+
+
+def session_month_assignment_counts(sessions):
+    """
+    Олон сарын хичээл дээрх томилолтыг (анги, сар)-аар бүлэглэж тоолох - session_assignment_counts-ийн мужийн хувилбар
+    Returns: {(class_type_id, month): [{'instructor_id', 'role', 'count'}, ...]} - instructor_id-аар эрэмбэлсэн
+    """
+    counts = defaultdict(list)
+    for row in InstructorAssignment.objects.filter(session__in=sessions).values(
+        'instructor_id', 'role', class_type_id=F('session__class_type_id'), month=TruncMonth('session__date')
+    ).annotate(count=Count('id')).order_by('instructor_id'):
+        counts[(row.pop('class_type_id'), row.pop('month'))].append(row)
+    return counts
+
+
+def month_assignment_counts(year, month):
+    """Сарын томилолтын тоо (cache-лэгдсэн)"""
+    return caching.get_or_build(
+        caching.INSTRUCTOR_STATS, ('month', year, month),
+        lambda: session_assignment_counts(month_sessions(year, month)),
+        STATS_TIMEOUT,
+    )
+
+
+def monthly_instructor_stats(year, month, instructors, class_types, selected_class_type=''):
+    """
+    Ирцийн хуудасны багшийн статистик (сарын хичээлээр)
+    Сонгосон ангид хичээл заасан бол тэр ангийн тоог, үгүй бол нийт тоог гол тоо болгоно
+    """
+    counts = month_assignment_counts(year, month)
+    by_instructor = defaultdict(dict)
+    for (instructor_id, class_name, role), count in counts.items():
+        by_instructor[instructor_id][(class_name, role)] = count
+
+    instructor_stats = []
+    for instructor in instructors:
+        instructor_counts = by_instructor.get(instructor.pk)
+        if not instructor_counts:
+            continue
+
+        stats_by_class = {}
+        for class_type in class_types:
+            lead_count = instructor_counts.get((class_type.name, InstructorAssignment.LEAD), 0)
+            assistant_count = instructor_counts.get((class_type.name, InstructorAssignment.ASSISTANT), 0)
+            if lead_count > 0 or assistant_count > 0:
+                stats_by_class[class_type.name] = {
+                    'class_type': class_type,
+                    'lead': lead_count,
+                    'assistant': assistant_count,
+                    'total': lead_count + assistant_count
+                }
+        if not stats_by_class:
+            continue
+
+        main_stats = stats_by_class.get(selected_class_type)
+        if main_stats is None:
+            main_stats = {
+                'lead': sum(stats['lead'] for stats in stats_by_class.values()),
+                'assistant': sum(stats['assistant'] for stats in stats_by_class.values()),
+            }
+            main_stats['total'] = main_stats['lead'] + main_stats['assistant']
+
+        instructor_stats.append({
+            'instructor': instructor,
+            'stats_by_class': stats_by_class,
+            'lead_count': main_stats['lead'],
+            'assistant_count': main_stats['assistant'],
+            'total': main_stats['total']
+        })
+
+    # Sort by total descending
+    instructor_stats.sort(key=lambda stat: stat['total'], reverse=True)
+    return instructor_stats
@@ -0,0 +1,275 @@
+"""
+Санхүүгийн нэгдсэн бүртгэл (LedgerEntry)
+- зургаан allocation хүснэгт болон банкны гүйлгээтэй холбогдсон холбооны төлбөр бүр нэг мөр
+- signals.py нэг бичлэгийг, allocations_written() bulk бичилтийг, rebuild_ledger команд бүгдийг тулгаж засна
+- тайлангууд LedgerEntry дээр нэг GROUP BY хийнэ (monthly_totals)
+- өөрчлөгдсөн сарууд transaction commit хийгдэхэд нэг удаа MonthlyRollup-д дахин нэгтгэгдэнэ
+  (schedule_rollups -> refresh_rollups) - P&L тайлан түүнийг уншина
+"""
+import threading
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import (
+    ExpenseAllocation, IncomeAllocation, InstructorPaymentAllocation, LedgerEntry, MembershipPaymentAllocation,
+    MonthlyFederationPayment, MonthlyRollup, PaymentAllocation, SeminarPaymentAllocation
+)
+
+
+# Эх сурвалж бүр: (model, чиглэл, queryset, LedgerEntry талбар -> values() expression)
+SOURCES = {
+    LedgerEntry.SOURCE_PAYMENT: (
+        PaymentAllocation, LedgerEntry.INCOME, PaymentAllocation.objects.all,
+        {'month': F('payment_month'), 'category': Value('Сурагчийн төлбөр'), 'student_id': F('student_id')},
+    ),
+    LedgerEntry.SOURCE_INCOME: (
+        IncomeAllocation, LedgerEntry.INCOME, IncomeAllocation.objects.all,
+        {'month': F('income_date'), 'category': Coalesce(F('income_category__name'), Value('Бусад орлого'))},
+    ),
+    LedgerEntry.SOURCE_SEMINAR: (
+        SeminarPaymentAllocation, LedgerEntry.INCOME, SeminarPaymentAllocation.objects.all,
+        {'month': F('bank_transaction__transaction_date'), 'category': Value('Семинар'), 'student_id': F('student_id')},
+    ),
+    LedgerEntry.SOURCE_MEMBERSHIP: (
+        MembershipPaymentAllocation, LedgerEntry.INCOME, MembershipPaymentAllocation.objects.all,
+        {'month': F('payment_month'), 'category': Value('Гишүүнчлэл'), 'student_id': F('student_id')},
+    ),
+    LedgerEntry.SOURCE_EXPENSE: (
+        ExpenseAllocation, LedgerEntry.EXPENSE, ExpenseAllocation.objects.all,
+        {'month': F('expense_date'), 'category': Coalesce(F('expense_category__name'), Value('Бусад зардал'))},
+    ),
+    LedgerEntry.SOURCE_INSTRUCTOR_PAYMENT: (
+        InstructorPaymentAllocation, LedgerEntry.EXPENSE, InstructorPaymentAllocation.objects.all,
+        {
+            'month': F('instructor_payment__month'), 'category': Value('Багшийн цалин'),
+            'instructor_id': F('instructor_payment__instructor_id'),
+            'class_type_id': F('instructor_payment__class_type_id'),
+        },
+    ),
+    # Холбооны төлбөр allocation-гүй - банкны гүйлгээтэй холбогдсон сарын төлбөр өөрөө нэг бичилт
+    LedgerEntry.SOURCE_FEDERATION_PAYMENT: (
+        MonthlyFederationPayment, LedgerEntry.EXPENSE,
+        lambda: MonthlyFederationPayment.objects.filter(bank_transaction__isnull=False),
+        {
+            'month': F('month'), 'category': Value('Холбооны төлбөр'),
+            'class_type_id': F('class_type_id'), 'amount': F('federation_share_amount'),
+        },
+    ),
+}
+
+SOURCE_BY_MODEL = {source[0]: source_type for source_type, source in SOURCES.items()}
+
+# Commit хүлээж буй сарууд (thread бүрт - DB connection шиг)
+_pending = threading.local()
+
+# Зөрүү шалгах талбарууд
+COMPARED_FIELDS = (
+    'bank_transaction_id', 'month', 'entry_date', 'direction', 'category',
+    'student_id', 'instructor_id', 'class_type_id', 'amount',
+)
+
+
+def source_rows(source_type, source_ids=None):
+    """
+    Эх хүснэгтээс тооцсон LedgerEntry-ийн утгууд (нэг query)
+    Returns: {source_id: {field: value}}
+    """
+    model, direction, queryset, expressions = SOURCES[source_type]
+    queryset = queryset()
+    if source_ids is not None:
+        queryset = queryset.filter(pk__in=source_ids)
+    expressions = {'amount': F('amount'), **expressions}
+
+    rows = {}
+    for row in queryset.values(
+        ledger_source_id=F('pk'),
+        ledger_bank_transaction_id=F('bank_transaction_id'),
+        ledger_entry_date=F('bank_transaction__transaction_date'),
+        **{f'ledger_{field}': expression for field, expression in expressions.items()}
+    ).order_by():
+        month = row['ledger_month'] or row['ledger_entry_date']
+        rows[row['ledger_source_id']] = {
+            'bank_transaction_id': row['ledger_bank_transaction_id'],
+            'month': date(month.year, month.month, 1) if month else None,
+            'entry_date': row['ledger_entry_date'],
+            'direction': direction,
+            'category': row['ledger_category'],
+            'student_id': row.get('ledger_student_id'),
+            'instructor_id': row.get('ledger_instructor_id'),
+            'class_type_id': row.get('ledger_class_type_id'),
+            'amount': row['ledger_amount'] or Decimal('0.00'),
+        }
+    return rows
+
+
+def _apply(source_type, expected, existing, batch_size=500, refresh=True):
+    """
+    Хүлээгдэж буй ба байгаа мөрүүдийг тулгаж create/update/delete хийх - (үүссэн, засагдсан, устсан) тоо
+    refresh=True бол өөрчлөгдсөн (хуучин болон шинэ) сарын MonthlyRollup-ийг commit-ийн дараа дахин тооцно
+    """
+    to_create = [
+        LedgerEntry(source_type=source_type, source_id=source_id, **values)
+        for source_id, values in expected.items()
+        if source_id not in existing and values['month']
+    ]
+    months = {entry.month for entry in to_create}
+    to_update = []
+    for source_id, entry in existing.items():
+        values = expected.get(source_id)
+        if values is None or not values['month']:
+            months.add(entry.month)
+            continue
+        if any(getattr(entry, field) != values[field] for field in COMPARED_FIELDS):
+            months.update((entry.month, values['month']))
+            for field in COMPARED_FIELDS:
+                setattr(entry, field, values[field])
+            to_update.append(entry)
+    to_delete = [
+        entry.pk for source_id, entry in existing.items()
+        if source_id not in expected or not expected[source_id]['month']
+    ]
+
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(to_create, batch_size=batch_size)
+        LedgerEntry.objects.bulk_update(to_update, COMPARED_FIELDS, batch_size=batch_size)
+        for start in range(0, len(to_delete), batch_size):
+            LedgerEntry.objects.filter(pk__in=to_delete[start:start + batch_size]).delete()
+    if refresh:
+        schedule_rollups(months)
+    return len(to_create), len(to_update), len(to_delete)
+
+
+def sync(model, source_ids):
+    """Тодорхой эх бичлэгүүдийн LedgerEntry-г шинэчлэх (signal, bulk бичилтийн дараа)"""
+    source_type = SOURCE_BY_MODEL.get(model)
+    source_ids = [source_id for source_id in source_ids if source_id]
+    if source_type is None or not source_ids:
+        return 0, 0, 0
+    existing = {
+        entry.source_id: entry
+        for entry in LedgerEntry.objects.filter(source_type=source_type, source_id__in=source_ids)
+    }
+    return _apply(source_type, source_rows(source_type, source_ids), existing)
+
+
+def remove(model, source_ids):
+    source_type = SOURCE_BY_MODEL.get(model)
+    if source_type is None:
+        return 0
+    entries = LedgerEntry.objects.filter(source_type=source_type, source_id__in=source_ids)
+    with transaction.atomic():
+        months = set(entries.values_list('month', flat=True))
+        deleted = entries.delete()[0]
+    schedule_rollups(months)
+    return deleted
+
+
+def sync_bank_transaction(bank_transaction_id):
+    """Гүйлгээний огноо өөрчлөгдөхөд түүний бичилтүүдийг (entry_date, семинарын сар) шинэчлэх"""
+    by_source = defaultdict(list)
+    for source_type, source_id in LedgerEntry.objects.filter(
+        bank_transaction_id=bank_transaction_id
+    ).values_list('source_type', 'source_id'):
+        by_source[source_type].append(source_id)
+    for source_type, source_ids in by_source.items():
+        sync(SOURCES[source_type][0], source_ids)
+
+
+def rebuild(source_types=None, batch_size=500):
+    """
+    Эх хүснэгтүүдтэй бүрэн тулгах - зөвхөн зөрүүтэй мөрүүдийг бичиж, MonthlyRollup-ийг бүхэлд нь дахин тооцно
+    Returns: {source_type: (үүссэн, засагдсан, устсан)}
+    """
+    results = {}
+    for source_type in source_types or SOURCES:
+        existing = {
+            entry.source_id: entry
+            for entry in LedgerEntry.objects.filter(source_type=source_type).iterator(chunk_size=2000)
+        }
+        results[source_type] = _apply(source_type, source_rows(source_type), existing, batch_size, refresh=False)
+    refresh_rollups()
+    return results
+
+
+def _pending_months():
+    if not hasattr(_pending, 'months'):
+        _pending.months = set()
+    return _pending.months
+
+
+def schedule_rollups(months):
+    """
+    Саруудыг commit-ийн дараах нэг refresh_rollups()-д нэмэх
+    Нэг transaction доторх олон save нэг DELETE + GROUP BY болно; transaction-гүй үед шууд ажиллана
+    Rollback хийгдсэн сарууд дараагийн commit-д дахин тооцогдоно (илүү тооцоолол, алдаа биш)
+    """
+    months = {month for month in months if month}
+    if not months:
+        return
+    _pending_months().update(months)
+    transaction.on_commit(flush_rollups)
+
+
+def flush_rollups():
+    """Хүлээж буй саруудыг нэг удаа дахин тооцох - дараагийн on_commit callback-ууд хоосон олно"""
+    months = _pending_months()
+    if not months:
+        return 0
+    refresh = set(months)
+    months.clear()
+    return refresh_rollups(refresh)
+
+
+def refresh_rollups(months=None):
+    """
+    Сарын нэгтгэлийг LedgerEntry-ээс дахин тооцох (нэг GROUP BY, нэг DELETE, нэг bulk_create)
+    months=None бол бүх сар
+    """
+    if months is not None:
+        months = {month for month in months if month}
+        if not months:
+            return 0
+    entries = LedgerEntry.objects.all()
+    rollups = MonthlyRollup.objects.all()
+    if months is not None:
+        entries = entries.filter(month__in=months)
+        rollups = rollups.filter(month__in=months)
+
+    with transaction.atomic():
+        rollups.delete()
+        created = MonthlyRollup.objects.bulk_create(
+            MonthlyRollup(
+                month=row['month'], direction=row['direction'], category=row['category'],
+                total=row['total'], entry_count=row['count'],
+            )
+            for row in entries.values('month', 'direction', 'category').annotate(
+                total=Sum('amount'), count=Count('id')
+            ).order_by()
+        )
+    return len(created)
+
+
+def monthly_totals(period=None, cash_basis=False):
+    """
+    Сар, чиглэл, ангиллаар нэг GROUP BY
+    cash_basis=True бол гүйлгээний огнооны сараар (cash-flow), үгүй бол хамаарах сараар (P&L)
+    Returns: {month: {direction: {category: {'total': Decimal, 'count': int}}}}
+    """
+    entries = LedgerEntry.objects.all()
+    if period is not None:
+        entries = entries.in_period(period, 'entry_date' if cash_basis else 'month')
+    month_expression = TruncMonth('entry_date') if cash_basis else F('month')
+
+    totals = defaultdict(lambda: defaultdict(dict))
+    for row in entries.values('direction', 'category', period_month=month_expression).annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by():
+        totals[row['period_month']][row['direction']][row['category']] = {
+            'total': row['total'], 'count': row['count'],
+        }
+    return totals
@@ -0,0 +1,88 @@
+"""
+Бүтэцтэй лог - модуль бүр logging.getLogger(__name__) ашиглана
+- JsonFormatter: бичлэг бүрийг нэг JSON мөр болгоно (extra талбаруудыг хамт)
+- RowSampler: мөр бүрийн үйл явдлыг (алгассан мөр гэх мэт) LOG_ROW_SAMPLE_EVERY мөр тутамд нэг удаа бичнэ
+- log_timings: импортын шат бүрийн хугацааг тусдаа бичлэгээр гаргана
+Мессежийг '%s' загвараар өгнө - түвшин идэвхгүй бол форматлахгүй
+"""
+import json
+import logging
+
+from django.conf import settings
+
+
+# LogRecord-ийн өөрийн талбарууд - эдгээрээс бусад нь extra=... -ээр ирсэн бүтэцтэй талбар
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """{'ts', 'level', 'logger', 'message', ...extra} хэлбэрийн нэг мөр"""
+
+    def format(self, record):
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS
+        )
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def sample_every():
+    """0 бол мөр бүрийн үйл явдлыг огт бичихгүй, 1 бол бүгдийг"""
+    return getattr(settings, 'LOG_ROW_SAMPLE_EVERY', 100)
+
+
+class RowSampler:
+    """
+    Мөр бүрийн үйл явдлыг түүвэрлэх - эхнийхийг, дараа нь every тутамд нэгийг бичнэ
+    summary() нь нийт тоог нэг бичлэгээр гаргана
+    """
+
+    def __init__(self, logger, event, every=None, level=logging.DEBUG):
+        self.logger = logger
+        self.event = event
+        self.every = sample_every() if every is None else every
+        self.level = level
+        self.count = 0
+        self.enabled = self.every > 0 and logger.isEnabledFor(level)
+
+    def __call__(self, msg, *args, **fields):
+        self.count += 1
+        if self.enabled and (self.count - 1) % self.every == 0:
+            self.logger.log(
+                self.level, msg, *args,
+                extra={'event': self.event, 'seen': self.count, **fields},
+            )
+
+    def summary(self, **fields):
+        if self.count and self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, '%s: нийт %d', self.event, self.count,
+                extra={'event': f'{self.event}.total', 'count': self.count, **fields},
+            )
+
+
+def log_timings(logger, event, timings, level=logging.INFO, **fields):
+    """
+    timings: {'parse': секунд, ...} - шат бүрт нэг бичлэг, дараа нь нийт хугацааны нэг бичлэг
+    fields нь бүх бичлэгт нэмэгдэнэ (source, rows гэх мэт)
+    """
+    if not logger.isEnabledFor(level):
+        return
+    for phase, seconds in timings.items():
+        logger.log(
+            level, '%s %s: %.1f ms', event, phase, seconds * 1000,
+            extra={'event': event, 'phase': phase, 'ms': round(seconds * 1000, 2), **fields},
+        )
+    total = sum(timings.values())
+    logger.log(
+        level, '%s: %.1f ms', event, total * 1000,
+        extra={'event': f'{event}.total', 'ms': round(total * 1000, 2), **fields},
+    )
+
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+from config.aikido_app.auto_match import AUTO_MATCH_SCORE, TransactionMatcher
+
+
+class Command(BaseCommand):
+    help = 'Хүлээгдэж буй банкны гүйлгээг сурагчтай автоматаар холбоно (нэр, утас, өмнөх дансаар)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Итгэлтэй саналуудаас allocation үүсгэнэ (өгөхгүй бол зөвхөн саналыг харуулна)',
+        )
+        parser.add_argument(
+            '--min-score',
+            type=int,
+            default=AUTO_MATCH_SCORE,
+            help=f'Автоматаар холбох доод оноо 0-100 (default: {AUTO_MATCH_SCORE})',
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=str,
+            help='Эхлэх огноо YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=str,
+            help='Дуусах огноо YYYY-MM-DD (орно)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_date(options['date_from'] or '')
+            date_to = parse_date(options['date_to'] or '')
+        except ValueError:
+            self.stdout.write(self.style.ERROR('Огнооны формат буруу байна. YYYY-MM-DD хэлбэрээр оруулна уу'))
+            return
+
+        matcher = TransactionMatcher(auto_score=options['min_score'])
+        transactions = list(matcher.pending_transactions(date_from, date_to))
+        if not transactions:
+            self.stdout.write('✅ Хүлээгдэж буй гүйлгээ байхгүй')
+            return
+
+        proposals = matcher.propose_all(transactions)
+        confident = [proposal for proposal in proposals if proposal.is_confident]
+        for proposal in proposals:
+            bank_transaction = proposal.bank_transaction
+            months = ', '.join(f'{month:%Y-%m} {amount:,.0f}₮' for month, amount in proposal.months)
+            line = (
+                f'  {"✅" if proposal.is_confident else "❔"} {bank_transaction.transaction_date} '
+                f'{bank_transaction.amount:,.0f}₮ → {proposal.student_name} '
+                f'({proposal.score} оноо: {", ".join(proposal.reasons)}) [{months}]'
+            )
+            self.stdout.write(line if proposal.is_confident else self.style.WARNING(line))
+
+        self.stdout.write(
+            f'\n📊 {len(transactions)} гүйлгээ: {len(confident)} итгэлтэй, '
+            f'{len(proposals) - len(confident)} шалгах шаардлагатай, {len(transactions) - len(proposals)} олдсонгүй'
+        )
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING('⚠️  Зөвхөн санал (--apply өгвөл холбоно)'))
+            return
+
+        created = matcher.apply(confident)
+        self.stdout.write(self.style.SUCCESS(f'✅ {created} хуваарилалт үүслээ'))
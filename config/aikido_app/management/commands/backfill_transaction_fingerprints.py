@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from config.aikido_app.models import BankTransaction
+
+
+class Command(BaseCommand):
+    help = 'Fingerprint-гүй хуучин банкны гүйлгээнүүдэд fingerprint тооцож бөглөнө (давхардсаныг зөвхөн мэдээлнэ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Зөвхөн тоог харуулна, өөрчлөхгүй',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='bulk_update-ийн batch хэмжээ (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        seen = set(
+            BankTransaction.objects.filter(fingerprint__isnull=False).values_list('fingerprint', flat=True)
+        )
+
+        filled = []
+        duplicates = []
+        transactions = BankTransaction.objects.filter(fingerprint__isnull=True).only(
+            'id', 'transaction_date', 'credit_amount', 'debit_amount',
+            'description', 'counterparty_account', 'closing_balance'
+        ).order_by('id')
+        for bank_transaction in transactions.iterator(chunk_size=2000):
+            fingerprint = bank_transaction.compute_fingerprint()
+            # Хамгийн бага id-тай нь fingerprint авна, бусад нь NULL хэвээр (unique index зөрчихгүй)
+            if fingerprint in seen:
+                duplicates.append(bank_transaction.pk)
+                continue
+            seen.add(fingerprint)
+            bank_transaction.fingerprint = fingerprint
+            filled.append(bank_transaction)
+
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {len(duplicates)} давхардсан гүйлгээ fingerprint-гүй үлдлээ: '
+                + ', '.join(f'#{pk}' for pk in duplicates)
+            ))
+
+        if not filled:
+            self.stdout.write(self.style.SUCCESS('✅ Бөглөх гүйлгээ олдсонгүй'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(filled)} гүйлгээ бөглөгдөнө (--dry-run, өөрчлөөгүй)'))
+            return
+
+        with transaction.atomic():
+            BankTransaction.objects.bulk_update(filled, ['fingerprint'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(filled)} гүйлгээнд fingerprint бөглөгдлөө'))
@@ -0,0 +1,116 @@
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from config.aikido_app import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Хиймэл өгөгдөл бүхий түр тест баазад гол хуудас, командуудын хугацаа, query тоог хэмжинэ; '
+            'JSON baseline хадгалж, дараагийн хэмжилтийг түүнтэй харьцуулна (бодит баазад хүрэхгүй)')
+
+    def add_arguments(self, parser):
+        defaults = benchmarks.DEFAULT_PARAMS
+        parser.add_argument('--students', type=int, default=defaults['students'], help='Сурагчдын тоо')
+        parser.add_argument('--instructors', type=int, default=defaults['instructors'], help='Багш нарын тоо')
+        parser.add_argument('--years', type=int, default=defaults['years'], help='Хичээл, ирц, төлбөрийн жилийн тоо')
+        parser.add_argument('--end-year', type=int, default=defaults['end_year'], help='Өгөгдлийн сүүлийн жил')
+        parser.add_argument(
+            '--upload-rows', type=int, default=defaults['upload_rows'],
+            help='bank_transaction_upload-д илгээх хуулгын мөрийн тоо',
+        )
+        parser.add_argument('--seed', type=int, default=defaults['seed'], help='Санамсаргүй үүсгэгчийн seed')
+        parser.add_argument('--repeat', type=int, default=5, help='Сценари бүрийн давталт (default: 5)')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=list(benchmarks.SCENARIOS),
+            help='Зөвхөн энэ сценарийг хэмжих (олон удаа өгч болно), default: бүгд',
+        )
+        parser.add_argument('--save', action='store_true', help='Үр дүнг baseline болгон хадгалах')
+        parser.add_argument('--compare', action='store_true', help='Baseline-тэй харьцуулж регресс байвал алдаа буцаах')
+        parser.add_argument('--baseline', help='Baseline JSON файл (default: settings.BENCHMARK_BASELINE_FILE)')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Median хугацааны зөвшөөрөгдөх өсөлт (default: 0.25 = 25%%); query тоо огт өсөх ёсгүй',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat 1-ээс бага байж болохгүй')
+        params = {
+            'students': options['students'],
+            'instructors': options['instructors'],
+            'years': options['years'],
+            'end_year': options['end_year'],
+            'pending': max(benchmarks.DEFAULT_PARAMS['pending'], options['repeat']),
+            'upload_rows': options['upload_rows'],
+            'seed': options['seed'],
+        }
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = benchmarks.load_baseline(options['baseline'])
+            except FileNotFoundError:
+                raise CommandError('Baseline олдсонгүй - эхлээд --save-ээр хадгална уу')
+            changed = {
+                key: (baseline['params'].get(key), value)
+                for key, value in params.items() if baseline['params'].get(key) != value
+            }
+            if changed:
+                raise CommandError(
+                    'Baseline өөр параметрээр хэмжигдсэн: '
+                    + ', '.join(f'{key} {before} -> {after}' for key, (before, after) in changed.items())
+                )
+
+        # Импортын хугацааны бичлэгүүд хэмжилтийн гаралтыг дарахгүй
+        app_logger = logging.getLogger('config.aikido_app')
+        log_level = app_logger.level
+        if options['verbosity'] < 2:
+            app_logger.setLevel(logging.WARNING)
+
+        # Хиймэл өгөгдлийн cache сайтын нийтлэг file cache-ийг цэвэрлэхгүй, түүнтэй холилдохгүй
+        cache_dir = tempfile.TemporaryDirectory(prefix='aikido-benchmark-cache-')
+        isolated_cache = override_settings(CACHES={'default': {**settings.CACHES['default'], 'LOCATION': cache_dir.name}})
+        isolated_cache.enable()
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('🧪 Хиймэл өгөгдөл үүсгэж байна...')
+            data = benchmarks.generate(**params)
+            self.stdout.write('   ' + ', '.join(f'{key} {value}' for key, value in data.counts.items()))
+            results = benchmarks.run_scenarios(data, options['scenario'], repeat=options['repeat'])
+            payload = benchmarks.report(data, results)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            isolated_cache.disable()
+            cache_dir.cleanup()
+            app_logger.setLevel(log_level)
+
+        self.stdout.write(f'\n⏱  {options["repeat"]} давталт, хүйтэн cache:')
+        for name, result in results.items():
+            line = (
+                f'  {name}: median {result["median_ms"]:.1f} ms '
+                f'({result["min_ms"]:.1f}-{result["max_ms"]:.1f}), {result["queries"]} query'
+            )
+            before = baseline and baseline['results'].get(name)
+            if before:
+                line += f'  [baseline {before["median_ms"]:.1f} ms, {before["queries"]} query]'
+            self.stdout.write(line)
+
+        if options['save']:
+            path = benchmarks.save_baseline(payload, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Baseline хадгалагдлаа: {path}'))
+
+        if baseline is not None:
+            regressions = benchmarks.compare(baseline, results, options['tolerance'])
+            if regressions:
+                for name, reason in regressions:
+                    self.stdout.write(self.style.WARNING(f'  ⚠️  {name}: {reason}'))
+                raise CommandError(f'{len(regressions)} регресс илэрлээ')
+            self.stdout.write(self.style.SUCCESS('✅ Baseline-тэй харьцуулахад регресс алга'))
@@ -1,11 +1,10 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Sum, Count, Q
-from decimal import Decimal
 from datetime import datetime
-from config.aikido_app.models import (
-    PaymentAllocation, ClassSession, InstructorAssignment, 
-    ClassType, MonthlyInstructorPayment, MonthlyFederationPayment
+from config.aikido_app.payroll import (
+    PayrollEngine, parse_month, month_range,
+    STATUS_LOCKED, STATUS_NO_PAYMENTS, STATUS_NO_SESSIONS
 )
+from config.aikido_app.models import Instructor, InstructorAssignment
 
 
 class Command(BaseCommand):
@@ -27,6 +26,18 @@ class Command(BaseCommand):
             type=int,
             help='Сарын дугаар 1-12 (жишээ: 1 = Нэгдүгээр сар)',
         )
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            type=str,
+            help='Эхлэх сар YYYY-MM (--to-той хамт олон сарыг нэг дор тооцоолно)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_month',
+            type=str,
+            help='Дуусах сар YYYY-MM (орно)',
+        )
         parser.add_argument(
             '--recalculate',
             action='store_true',
@@ -34,29 +45,36 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        # Parse month
-        if options['month']:
-            try:
-                year, month = map(int, options['month'].split('-'))
-            except ValueError:
-                self.stdout.write(self.style.ERROR('Сарын формат буруу байна. YYYY-MM хэлбэрээр оруулна уу'))
-                return
-        elif options['year'] and options['month_number']:
-            year = options['year']
-            month = options['month_number']
-        else:
-            # Default to current month
-            now = datetime.now()
-            year = now.year
-            month = now.month
+        # Parse month range
+        try:
+            if options['from_month'] or options['to_month']:
+                first_month = parse_month(options['from_month'] or options['to_month'])
+                last_month = parse_month(options['to_month'] or options['from_month'])
+            elif options['month']:
+                first_month = last_month = parse_month(options['month'])
+            elif options['year'] and options['month_number']:
+                first_month = last_month = datetime(options['year'], options['month_number'], 1).date()
+            else:
+                # Default to current month
+                first_month = last_month = datetime.now().date().replace(day=1)
+        except ValueError:
+            self.stdout.write(self.style.ERROR(
+                'Сарын формат буруу байна. YYYY-MM хэлбэрээр, сарын дугаарыг 1-12 хооронд оруулна уу'
+            ))
+            return
 
-        # Validate month
-        if month < 1 or month > 12:
-            self.stdout.write(self.style.ERROR(f'Сарын дугаар 1-12 хооронд байх ёстой: {month}'))
+        if last_month < first_month:
+            self.stdout.write(self.style.ERROR('--from сар --to сараас өмнө байх ёстой'))
             return
 
-        month_date = datetime(year, month, 1).date()
-        self.stdout.write(f'\n📅 Тооцоолж буй сар: {month_date.strftime("%Y-%m")}\n')
+        months = month_range(first_month, last_month)
+        if len(months) == 1:
+            self.stdout.write(f'\n📅 Тооцоолж буй сар: {first_month.strftime("%Y-%m")}\n')
+        else:
+            self.stdout.write(
+                f'\n📅 Тооцоолж буй сарууд: {first_month.strftime("%Y-%m")} - {last_month.strftime("%Y-%m")}'
+                f' ({len(months)} сар)\n'
+            )
 
         recalculate = options.get('recalculate', False)
         
@@ -69,192 +87,57 @@ class Command(BaseCommand):
                 '    Төлөгдсөн болон банкны гүйлгээтэй холбогдсон цалин мөн дахин тооцоологдоно!\n'
             ))
 
-        # Process each class type
-        for class_type in ClassType.objects.all():
-            self.stdout.write(f'\n🏫 {class_type.get_name_display()} анги:')
-            self.process_class_type(class_type, month_date, recalculate)
+        results = PayrollEngine(recalculate=recalculate).run(first_month, last_month)
+
+        instructor_ids = {payment.instructor_id for result in results for payment in result['instructors']}
+        instructors = Instructor.objects.in_bulk(instructor_ids)
+        current_month = None
+        for result in results:
+            if len(months) > 1 and result['month'] != current_month:
+                current_month = result['month']
+                self.stdout.write(f'\n📅 {current_month.strftime("%Y-%m")}')
+            self.stdout.write(f'\n🏫 {result["class_type"].get_name_display()} анги:')
+            self.report(result, instructors)
 
         self.stdout.write(self.style.SUCCESS('\n✅ Тооцоолол амжилттай дууслаа!'))
 
-    def process_class_type(self, class_type, month_date, recalculate):
-        """Тухайн ангийн төрлийн төлбөрийг тооцоолох"""
-        
-        # Check if payments already exist and are paid or linked to bank transactions
-        existing_payments = MonthlyInstructorPayment.objects.filter(
-            class_type=class_type,
-            month=month_date
-        )
-        
-        existing_federation = MonthlyFederationPayment.objects.filter(
-            class_type=class_type,
-            month=month_date
-        )
-        
-        # Check if any payments are already paid or linked to bank transactions
-        has_paid_payments = existing_payments.filter(is_paid=True).exists()
-        has_linked_payments = existing_payments.filter(bank_transaction__isnull=False).exists()
-        has_paid_federation = existing_federation.filter(is_paid=True).exists()
-        has_linked_federation = existing_federation.filter(bank_transaction__isnull=False).exists()
-        
-        if (has_paid_payments or has_linked_payments or has_paid_federation or has_linked_federation) and not recalculate:
+    def report(self, result, instructors):
+        """Нэг анги, нэг сарын тооцооллын дэлгэрэнгүй"""
+        if result['status'] == STATUS_LOCKED:
             self.stdout.write(self.style.WARNING(
-                f'  ⚠️  {month_date.strftime("%Y-%m")} сарын төлбөр аль хэдийн төлөгдсөн эсвэл банкны гүйлгээтэй холбогдсон байна.'
+                f'  ⚠️  {result["month"].strftime("%Y-%m")} сарын төлбөр аль хэдийн төлөгдсөн эсвэл банкны гүйлгээтэй холбогдсон байна.'
             ))
             self.stdout.write(self.style.WARNING(
                 f'      Дахин тооцоолохыг хүсвэл --recalculate flag ашиглана уу.'
             ))
             return
-        
-        # Get total payments collected for this class type in this month
-        payments = PaymentAllocation.objects.filter(
-            payment_month__year=month_date.year,
-            payment_month__month=month_date.month,
-            student__class_types=class_type
-        )
-        
-        total_collected = payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        student_count = payments.values('student').distinct().count()
-        
-        if total_collected == 0:
+
+        if result['status'] == STATUS_NO_PAYMENTS:
             self.stdout.write(f'  ⚠️  Төлбөр байхгүй байна')
             return
-        
-        self.stdout.write(f'  💰 Цуглуулсан төлбөр: {total_collected:,.0f}₮ ({student_count} сурагч)')
-        
-        # Calculate splits
-        instructor_pool = total_collected * Decimal('0.50')  # 50% for instructors
-        federation_share = total_collected * Decimal('0.50')  # 50% for federation
-        
-        self.stdout.write(f'  📊 Багш нарт: {instructor_pool:,.0f}₮ (50%)')
-        self.stdout.write(f'  📊 Холбоонд: {federation_share:,.0f}₮ (50%)')
-        
-        # Save/update federation payment
-        if recalculate:
-            MonthlyFederationPayment.objects.filter(
-                class_type=class_type,
-                month=month_date
-            ).delete()
-        
-        federation_payment, created = MonthlyFederationPayment.objects.get_or_create(
-            class_type=class_type,
-            month=month_date,
-            defaults={
-                'total_payment_collected': total_collected,
-                'federation_share_amount': federation_share,
-            }
-        )
-        
-        if not created:
-            federation_payment.total_payment_collected = total_collected
-            federation_payment.federation_share_amount = federation_share
-            federation_payment.save()
-        
-        # Get all class sessions for this month/class type
-        sessions = ClassSession.objects.filter(
-            class_type=class_type,
-            date__year=month_date.year,
-            date__month=month_date.month,
-            is_cancelled=False
-        )
-        
-        total_sessions = sessions.count()
-        
-        if total_sessions == 0:
+
+        self.stdout.write(f'  💰 Цуглуулсан төлбөр: {result["total_collected"]:,.0f}₮ ({result["student_count"]} сурагч)')
+        self.stdout.write(f'  📊 Багш нарт: {result["instructor_pool"]:,.0f}₮ (50%)')
+        self.stdout.write(f'  📊 Холбоонд: {result["federation"].federation_share_amount:,.0f}₮ (50%)')
+
+        if result['status'] == STATUS_NO_SESSIONS:
             self.stdout.write(f'  ⚠️  Хичээл байхгүй байна')
             return
-        
-        self.stdout.write(f'  📚 Нийт хичээл: {total_sessions}')
-        
-        # Calculate instructor shares
-        # Get lead and assistant instructor counts
-        lead_assignments = InstructorAssignment.objects.filter(
-            session__in=sessions,
-            role=InstructorAssignment.LEAD
-        )
-        
-        assistant_assignments = InstructorAssignment.objects.filter(
-            session__in=sessions,
-            role=InstructorAssignment.ASSISTANT
-        )
-        
-        # Group by instructor
-        lead_instructors = lead_assignments.values('instructor').annotate(
-            class_count=Count('id')
-        )
-        
-        assistant_instructors = assistant_assignments.values('instructor').annotate(
-            class_count=Count('id')
-        )
-        
-        # Calculate per-assignment payment (NOT per-session)
-        # Lead pool (60%) divided by total lead assignments
-        # Assistant pool (40%) divided by total assistant assignments
-        total_lead_assignments = lead_assignments.count()
-        total_assistant_assignments = assistant_assignments.count()
-        
-        lead_share_per_assignment = (instructor_pool * Decimal('0.60')) / total_lead_assignments if total_lead_assignments > 0 else Decimal('0.00')
-        assistant_share_per_assignment = (instructor_pool * Decimal('0.40')) / total_assistant_assignments if total_assistant_assignments > 0 else Decimal('0.00')
-        
-        self.stdout.write(f'  💵 Ахлах багш (1 хичээл): {lead_share_per_assignment:,.0f}₮ ({total_lead_assignments} assignments)')
-        self.stdout.write(f'  💵 Туслах багш (1 хичээл): {assistant_share_per_assignment:,.0f}₮ ({total_assistant_assignments} assignments)')
-        
-        # Delete old records if recalculating
-        if recalculate:
-            MonthlyInstructorPayment.objects.filter(
-                class_type=class_type,
-                month=month_date
-            ).delete()
-        
-        # Save lead instructor payments
-        for lead_data in lead_instructors:
-            from config.aikido_app.models import Instructor
-            instructor = Instructor.objects.get(pk=lead_data['instructor'])
-            class_count = lead_data['class_count']
-            amount = lead_share_per_assignment * class_count
-            
-            payment, created = MonthlyInstructorPayment.objects.get_or_create(
-                instructor=instructor,
-                class_type=class_type,
-                month=month_date,
-                role=InstructorAssignment.LEAD,
-                defaults={
-                    'total_classes': class_count,
-                    'total_payment_collected': total_collected,
-                    'instructor_share_amount': amount,
-                }
-            )
-            
-            if not created:
-                payment.total_classes = class_count
-                payment.total_payment_collected = total_collected
-                payment.instructor_share_amount = amount
-                payment.save()
-            
-            self.stdout.write(f'    👨‍🏫 {instructor} (Ахлах): {class_count} хичээл × {lead_share_per_assignment:,.0f}₮ = {amount:,.0f}₮')
-        
-        # Save assistant instructor payments
-        for assistant_data in assistant_instructors:
-            from config.aikido_app.models import Instructor
-            instructor = Instructor.objects.get(pk=assistant_data['instructor'])
-            class_count = assistant_data['class_count']
-            amount = assistant_share_per_assignment * class_count
-            
-            payment, created = MonthlyInstructorPayment.objects.get_or_create(
-                instructor=instructor,
-                class_type=class_type,
-                month=month_date,
-                role=InstructorAssignment.ASSISTANT,
-                defaults={
-                    'total_classes': class_count,
-                    'total_payment_collected': total_collected,
-                    'instructor_share_amount': amount,
-                }
-            )
-            
-            if not created:
-                payment.total_classes = class_count
-                payment.total_payment_collected = total_collected
-                payment.instructor_share_amount = amount
-                payment.save()
-            
-            self.stdout.write(f'    👨‍🏫 {instructor} (Туслах): {class_count} хичээл × {assistant_share_per_assignment:,.0f}₮ = {amount:,.0f}₮')
+
+        self.stdout.write(f'  📚 Нийт хичээл: {result["total_sessions"]}')
+
+        shares = result['share_per_assignment']
+        totals = result['assignment_totals']
+        lead_share = shares[InstructorAssignment.LEAD]
+        assistant_share = shares[InstructorAssignment.ASSISTANT]
+        self.stdout.write(f'  💵 Ахлах багш (1 хичээл): {lead_share:,.0f}₮ ({totals[InstructorAssignment.LEAD]} assignments)')
+        self.stdout.write(f'  💵 Туслах багш (1 хичээл): {assistant_share:,.0f}₮ ({totals[InstructorAssignment.ASSISTANT]} assignments)')
+
+        for role, label in ((InstructorAssignment.LEAD, 'Ахлах'), (InstructorAssignment.ASSISTANT, 'Туслах')):
+            for payment in result['instructors']:
+                if payment.role != role:
+                    continue
+                self.stdout.write(
+                    f'    👨‍🏫 {instructors.get(payment.instructor_id)} ({label}): {payment.total_classes} хичээл'
+                    f' × {shares[role]:,.0f}₮ = {payment.instructor_share_amount:,.0f}₮'
+                )
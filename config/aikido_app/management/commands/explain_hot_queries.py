@@ -0,0 +1,62 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from config.aikido_app.models import (
+    Attendance, BankTransaction, ClassSession, MonthlyInstructorPayment, PaymentAllocation
+)
+from config.aikido_app.periods import next_month
+
+
+def hot_queries(month):
+    """Views-ийн хамгийн их ажилладаг шүүлтүүдтэй ижил queryset-үүд (нэр, queryset)"""
+    month_end = next_month(month)
+    return [
+        ('payment_list: жилийн төлбөр (student, payment_month)', PaymentAllocation.objects.for_year(month.year).values('student_id', 'payment_month').annotate(amount=Sum('amount')).order_by()),
+        ('payment_list: жилийн ирц', Attendance.objects.filter(is_present=True).for_year(month.year).values_list('student_id', 'session__date__month').annotate(count=Count('id')).order_by()),
+        ('monthly_payment_report: ангиар', PaymentAllocation.objects.filter(
+            student__class_types__isnull=False,
+        ).for_month(month).values('student__class_types').annotate(total=Sum('amount')).order_by()),
+        ('monthly_payment_report: багшийн төлөгдөөгүй төлбөр', MonthlyInstructorPayment.objects.filter(is_paid=False).for_month(month)),
+        ('attendance_record: хичээл', ClassSession.objects.filter(date=month, class_type_id=1)),
+        ('attendance_record: ирц', Attendance.objects.filter(
+            session__date__in=[month, month_end], is_present=True,
+        ).values_list('student_id', 'session__date')),
+        ('bank_transaction_list: төлөвөөр', BankTransaction.objects.filter(
+            status=BankTransaction.STATUS_PENDING,
+        ).order_by('-transaction_date')[:50]),
+        ('bank_transaction_list: сараар', BankTransaction.objects.for_month(month).order_by('-transaction_date', '-imported_at')[:50]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Гол view-уудын query-ний EXPLAIN төлөвлөгөөг хэвлэж индекс ашиглаж буй эсэхийг шалгана'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            type=str,
+            help='Шалгах сар (YYYY-MM), default: энэ сар',
+        )
+
+    def handle(self, *args, **options):
+        today = date.today()
+        month = date(today.year, today.month, 1)
+        if options['month']:
+            year, month_number = map(int, options['month'].split('-'))
+            month = date(year, month_number, 1)
+
+        full_scans = 0
+        for name, queryset in hot_queries(month):
+            plan = queryset.explain()
+            # SQLite: "SCAN <table>" (индекс дагуу ч гэсэн бүтэн уншилт) / PostgreSQL: "Seq Scan"
+            scans = [line for line in plan.splitlines() if ' SCAN ' in f' {line} ' or 'Seq Scan' in line]
+            full_scans += bool(scans)
+            style = self.style.WARNING if scans else self.style.SUCCESS
+            self.stdout.write(style(f'{"⚠️ " if scans else "✅"} {name}'))
+            for line in plan.splitlines():
+                self.stdout.write(f'      {line}')
+
+        if full_scans:
+            self.stdout.write(self.style.WARNING(f'⚠️  {full_scans} query бүтэн хүснэгт уншиж байна'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Бүх query индекс ашиглаж байна'))
@@ -0,0 +1,85 @@
+import glob
+import os
+from django.core.management.base import BaseCommand
+from config.aikido_app.bank_import import DEFAULT_BATCH_SIZE, BankStatementImporter
+
+
+class Command(BaseCommand):
+    help = 'Олон банкны хуулгын (.xlsx) файлыг зэрэг уншиж нэг дор импортолно (давхардлыг хасна)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Файл, хавтас эсвэл glob (жишээ: statements/2025/*.xlsx)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Зэрэг унших process-ийн тоо (default: CPU-ийн тоо, 1 = дараалсан)',
+        )
+        parser.add_argument(
+            '--start-row',
+            type=int,
+            default=2,
+            help='Өгөгдөл эхлэх мөр (default: 2)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'bulk_create-ийн batch хэмжээ (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Уншиж, давхардлыг шалгана, баазад бичихгүй',
+        )
+
+    def handle(self, *args, **options):
+        paths = self.expand_paths(options['paths'])
+        if not paths:
+            self.stdout.write(self.style.ERROR('.xlsx файл олдсонгүй'))
+            return
+
+        self.stdout.write(f'\n📂 {len(paths)} файл импортлож байна...\n')
+        importer = BankStatementImporter(batch_size=options['batch_size'])
+        file_stats, total = importer.run_many(
+            paths, start_row=options['start_row'], workers=options['workers'], dry_run=options['dry_run']
+        )
+
+        for stats in file_stats:
+            line = (
+                f'  📄 {os.path.basename(stats.source)}: {stats.imported} шинэ, {stats.skipped} алгассан, '
+                f'{len(stats.errors)} алдаа - {stats.summary()}'
+            )
+            self.stdout.write(self.style.WARNING(line) if stats.errors else line)
+            for error in stats.errors[:5]:
+                self.stdout.write(f'      ⚠️  {error}')
+            if len(stats.errors) > 5:
+                self.stdout.write(f'      ... болон {len(stats.errors) - 5} бусад алдаа')
+
+        timings = ', '.join(f'{phase} {seconds:.2f}с' for phase, seconds in total.timings.items())
+        self.stdout.write(f'\n⏱  {total.summary()} ({timings})')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'⚠️  {total.imported} гүйлгээ импортлогдох байсан (--dry-run)'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total.imported} гүйлгээ импортлогдлоо, {total.skipped} алгасагдсан, {len(total.errors)} алдаа'
+        ))
+
+    def expand_paths(self, patterns):
+        """Хавтас, glob, файлуудыг давхардалгүй .xlsx жагсаалт болгох"""
+        paths = []
+        for pattern in patterns:
+            if os.path.isdir(pattern):
+                matches = glob.glob(os.path.join(pattern, '*.xlsx'))
+            else:
+                matches = glob.glob(pattern) or [pattern]
+            # Excel-ийн түр файлууд (~$...) алгасна
+            paths.extend(
+                path for path in sorted(matches)
+                if not os.path.basename(path).startswith('~$') and path not in paths
+            )
+        return paths
@@ -0,0 +1,70 @@
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from config.aikido_app.models import PayrollDirtyMonth
+from config.aikido_app.payroll import PayrollEngine, STATUS_LOCKED
+
+
+class Command(BaseCommand):
+    help = 'Өөрчлөгдсөн (анги, сар) хосуудын багшийн болон холбооны төлбөрийг дахин тооцоолно (төлөгдсөн сар алгасагдана)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=500,
+            help='Нэг удаад боловсруулах хосын дээд тоо (default: 500)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='0-ээс их бол тэдэн секунд тутамд дахин ажиллана (worker горим)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Зөвхөн дараалалд байгаа хосуудыг харуулна',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.process(options['limit'], options['dry_run'])
+            if options['interval'] <= 0 or options['dry_run']:
+                return
+            time.sleep(options['interval'])
+
+    def process(self, limit, dry_run):
+        started = timezone.now()
+        dirty = list(
+            PayrollDirtyMonth.objects.filter(marked_at__lte=started).select_related('class_type')[:limit]
+        )
+        if not dirty:
+            self.stdout.write('✅ Дахин тооцоолох сар байхгүй')
+            return
+
+        for item in dirty:
+            self.stdout.write(f'  🔄 {item}')
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(dirty)} хос дараалалд байна (--dry-run)'))
+            return
+
+        results = PayrollEngine(prune=True).run_pairs(
+            (item.class_type_id, item.month) for item in dirty
+        )
+
+        # Re-marked while we were working -> marked_at is newer, keep it for the next run
+        PayrollDirtyMonth.objects.filter(
+            pk__in=[item.pk for item in dirty], marked_at__lte=started
+        ).delete()
+
+        statuses = Counter(result['status'] for result in results)
+        for result in results:
+            if result['status'] == STATUS_LOCKED:
+                self.stdout.write(self.style.WARNING(
+                    f'  ⚠️  {result["class_type"]} {result["month"].strftime("%Y-%m")}: '
+                    f'төлөгдсөн эсвэл банкны гүйлгээтэй холбогдсон тул алгаслаа'
+                ))
+        summary = ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(results)} хос дахин тооцоологдлоо ({summary})'))
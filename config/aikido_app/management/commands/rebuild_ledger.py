@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from config.aikido_app import ledger
+
+
+class Command(BaseCommand):
+    help = 'LedgerEntry хүснэгтийг хуваарилалт, төлбөрүүдтэй тулгаж дахин бүтээнэ (зөвхөн зөрүүтэй мөрүүдийг бичнэ), MonthlyRollup-ийг дахин тооцно'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            action='append',
+            choices=list(ledger.SOURCES),
+            help='Зөвхөн энэ эх сурвалжийг тулгах (олон удаа өгч болно), default: бүгд',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='bulk_create/bulk_update-ийн batch хэмжээ (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        results = ledger.rebuild(options['source'], batch_size=options['batch_size'])
+
+        changed = 0
+        for source_type, (created, updated, deleted) in results.items():
+            changed += created + updated + deleted
+            self.stdout.write(f'  {source_type}: +{created} ~{updated} -{deleted}')
+
+        if changed:
+            self.stdout.write(self.style.SUCCESS(f'✅ Ledger шинэчлэгдлээ: {changed} мөр өөрчлөгдсөн'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Ledger эх хүснэгтүүдтэй таарч байна'))
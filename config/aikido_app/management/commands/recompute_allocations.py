@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from decimal import Decimal
+from config.aikido_app.allocations import compute_allocated_totals
+from config.aikido_app.models import BankTransaction
+
+
+class Command(BaseCommand):
+    help = 'BankTransaction.allocated_amount-ийг allocation хүснэгтүүдээс дахин тооцоолж зөрүүг засна'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Зөвхөн зөрүүтэй гүйлгээнүүдийг харуулна, өөрчлөхгүй',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='bulk_update-ийн batch хэмжээ (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        totals = compute_allocated_totals()
+
+        drifted = []
+        transactions = BankTransaction.objects.only(
+            'id', 'amount', 'allocated_amount', 'status'
+        ).order_by('id')
+        for bank_transaction in transactions.iterator(chunk_size=2000):
+            expected = totals.get(bank_transaction.pk, Decimal('0.00'))
+            expected_status = bank_transaction.status
+            if bank_transaction.status != BankTransaction.STATUS_IGNORED:
+                expected_status = bank_transaction.get_status_for(expected)
+
+            if bank_transaction.allocated_amount != expected or bank_transaction.status != expected_status:
+                self.stdout.write(
+                    f'  #{bank_transaction.pk}: {bank_transaction.allocated_amount}₮ → {expected}₮'
+                    f' ({bank_transaction.status} → {expected_status})'
+                )
+                bank_transaction.allocated_amount = expected
+                bank_transaction.status = expected_status
+                drifted.append(bank_transaction)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✅ Зөрүү олдсонгүй'))
+            return
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(drifted)} гүйлгээ зөрүүтэй (--dry-run, өөрчлөөгүй)'))
+            return
+
+        with transaction.atomic():
+            BankTransaction.objects.bulk_update(
+                drifted, ['allocated_amount', 'status'], batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(drifted)} гүйлгээ засагдлаа'))
@@ -0,0 +1,71 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from config.aikido_app import caching
+from config.aikido_app.auto_match import StudentIndex
+from config.aikido_app.dashboard import dashboard_metrics
+from config.aikido_app.instructor_stats import cached_assignment_stats, month_assignment_counts
+from config.aikido_app.monthly_report import collected_by_class_type
+from config.aikido_app.pivot import get_payment_pivot, get_payment_years
+
+
+class Command(BaseCommand):
+    help = 'Тайлангийн cache-ийг урьдчилан дүүргэнэ (банкны хуулга импортолсны дараа ажиллуулна)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            action='append',
+            dest='years',
+            help='Дүүргэх жил (олон удаа өгч болно, default: одоогийн жил)',
+        )
+        parser.add_argument(
+            '--all-years',
+            action='store_true',
+            help='Төлбөр бүртгэгдсэн бүх жилийн pivot-ийг дүүргэнэ',
+        )
+        parser.add_argument(
+            '--invalidate',
+            action='store_true',
+            help='Эхлээд бүх namespace-ийг хүчингүй болгоно',
+        )
+
+    def handle(self, *args, **options):
+        today = date.today()
+        self.verbosity = options['verbosity']
+        if options['invalidate']:
+            caching.invalidate(*caching.NAMESPACES)
+            self.stdout.write('🧹 Cache хүчингүй болгосон')
+
+        years = set(options['years'] or [today.year])
+        if options['all_years']:
+            years.update(get_payment_years())
+
+        for year in sorted(years):
+            self.warm(f'Төлбөрийн pivot {year}', get_payment_pivot, year)
+            self.warm(f'Сарын тайлан {year} он', collected_by_class_type, year=year)
+            started = time.perf_counter()
+            months = range(1, 13 if year < today.year else today.month + 1)
+            for month in months:
+                month_date = date(year, month, 1)
+                self.warm(f'Сарын тайлан {month_date:%Y-%m}', collected_by_class_type, month_date, detail=True)
+                self.warm(f'Багшийн статистик {month_date:%Y-%m}', month_assignment_counts, year, month, detail=True)
+            self.stdout.write(
+                f'  🔥 {year} оны {len(months)} сарын тайлан, багшийн статистик: '
+                f'{(time.perf_counter() - started) * 1000:.0f}ms'
+            )
+
+        self.warm('Сарын тайлан (бүх хугацаа)', collected_by_class_type)
+        self.warm('Багшийн статистик (бүх хугацаа)', cached_assignment_stats)
+        self.warm('Хяналтын самбар', dashboard_metrics, today)
+        self.warm('Гүйлгээ холбох index', StudentIndex.cached)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Cache дүүрлээ ({", ".join(map(str, sorted(years)))})'))
+
+    def warm(self, label, build, *args, detail=False, **kwargs):
+        started = time.perf_counter()
+        build(*args, **kwargs)
+        # Сар бүрийн мөрийг зөвхөн -v 2 үед
+        if not detail or self.verbosity > 1:
+            self.stdout.write(f'  {"  " if detail else ""}🔥 {label}: {(time.perf_counter() - started) * 1000:.0f}ms')
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:05
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+CREDIT_RELATIONS = ['PaymentAllocation', 'IncomeAllocation', 'SeminarPaymentAllocation', 'MembershipPaymentAllocation']
+DEBIT_RELATIONS = ['ExpenseAllocation', 'InstructorPaymentAllocation']
+
+
+def backfill_allocated_amount(apps, schema_editor):
+    """Одоо байгаа гүйлгээнүүдийн allocated_amount-ийг allocation-уудаас тооцоолох"""
+    BankTransaction = apps.get_model('aikido_app', 'BankTransaction')
+    credit = Q(credit_amount__gt=0)
+    debit = ~Q(credit_amount__gt=0) & ~Q(debit_amount=0) & Q(debit_amount__isnull=False)
+
+    totals = {}
+    for model_names, direction_filter in [(CREDIT_RELATIONS, credit), (DEBIT_RELATIONS, debit)]:
+        matching = BankTransaction.objects.filter(direction_filter)
+        for model_name in model_names:
+            model = apps.get_model('aikido_app', model_name)
+            rows = model.objects.filter(
+                bank_transaction__in=matching
+            ).order_by().values('bank_transaction_id').annotate(total=Sum('amount'))
+            for row in rows:
+                transaction_id = row['bank_transaction_id']
+                totals[transaction_id] = totals.get(transaction_id, Decimal('0.00')) + (row['total'] or Decimal('0.00'))
+
+    transactions = list(BankTransaction.objects.filter(pk__in=totals.keys()))
+    for bank_transaction in transactions:
+        bank_transaction.allocated_amount = totals[bank_transaction.pk]
+    BankTransaction.objects.bulk_update(transactions, ['allocated_amount'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0022_student_is_fee_exempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banktransaction',
+            name='allocated_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Allocation-уудын нийлбэр - allocation үүсэх/устах үед автоматаар шинэчлэгдэнэ', max_digits=15, verbose_name='Хуваарилагдсан дүн'),
+        ),
+        migrations.RunPython(backfill_allocated_amount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0023_banktransaction_allocated_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollDirtyMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Тухайн сарын эхний өдөр', verbose_name='Сар')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Дахин өөрчлөгдөх бүрт шинэчлэгдэнэ', verbose_name='Тэмдэглэсэн цаг')),
+                ('class_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='aikido_app.classtype', verbose_name='Ангийн төрөл')),
+            ],
+            options={
+                'verbose_name': 'Дахин тооцоолох цалингийн сар',
+                'verbose_name_plural': 'Дахин тооцоолох цалингийн сарууд',
+                'ordering': ['month', 'class_type'],
+                'unique_together': {('class_type', 'month')},
+            },
+        ),
+    ]
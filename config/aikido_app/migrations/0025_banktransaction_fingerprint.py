@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:27
+
+import hashlib
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def make_fingerprint(transaction_date, credit_amount, debit_amount, description, counterparty_account, closing_balance):
+    """BankTransaction.make_fingerprint-ийн хуулбар - migration model-ийн хуучин хувилбараас хамаарахгүй"""
+    def amount(value):
+        return format(Decimal(value).quantize(Decimal('0.01')), 'f') if value is not None else ''
+
+    def text(value):
+        return ' '.join((value or '').split()).lower()
+
+    parts = [
+        transaction_date.isoformat(), amount(credit_amount), amount(debit_amount),
+        text(description), text(counterparty_account), amount(closing_balance),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """
+    Одоо байгаа гүйлгээнүүдийн fingerprint - давхардсан бол хамгийн бага id-тай нь авна
+    Бусад нь NULL үлдэнэ (unique); импорт тэднийг огнооны хүрээгээр тооцож давхардал гэж таньсаар
+    """
+    BankTransaction = apps.get_model('aikido_app', 'BankTransaction')
+    seen = set()
+    filled = []
+    for bank_transaction in BankTransaction.objects.only(
+        'id', 'transaction_date', 'credit_amount', 'debit_amount',
+        'description', 'counterparty_account', 'closing_balance'
+    ).order_by('id').iterator(chunk_size=2000):
+        fingerprint = make_fingerprint(
+            bank_transaction.transaction_date, bank_transaction.credit_amount, bank_transaction.debit_amount,
+            bank_transaction.description, bank_transaction.counterparty_account, bank_transaction.closing_balance,
+        )
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        bank_transaction.fingerprint = fingerprint
+        filled.append(bank_transaction)
+    BankTransaction.objects.bulk_update(filled, ['fingerprint'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0024_payrolldirtymonth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banktransaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Огноо, дүн, утга, харьцсан данс, үлдэгдлээс тооцсон SHA-256 - давхар импортоос сэргийлнэ', max_length=64, null=True, unique=True, verbose_name='Хурууны хээ'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
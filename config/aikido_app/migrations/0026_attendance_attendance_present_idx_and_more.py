@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0025_banktransaction_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['session', 'is_present', 'student'], name='attendance_present_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['-transaction_date', '-imported_at'], name='banktxn_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['status', '-transaction_date'], name='banktxn_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['date', 'class_type'], name='session_date_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlyinstructorpayment',
+            index=models.Index(fields=['month', 'is_paid'], name='instr_payment_month_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentallocation',
+            index=models.Index(fields=['payment_month', 'student', 'amount'], name='payalloc_month_student_idx'),
+        ),
+    ]
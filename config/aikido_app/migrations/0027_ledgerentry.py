@@ -0,0 +1,105 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:36
+
+from datetime import date
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+
+# ledger.SOURCES-ийн хуулбар (migration нь app-ийн кодоос хамаарахгүй):
+# (source_type, model, чиглэл, LedgerEntry талбар -> expression, шүүлт)
+LEDGER_SOURCES = [
+    ('payment', 'PaymentAllocation', 'income',
+     {'month': F('payment_month'), 'category': Value('Сурагчийн төлбөр'), 'student_id': F('student_id')}, {}),
+    ('income', 'IncomeAllocation', 'income',
+     {'month': F('income_date'), 'category': Coalesce(F('income_category__name'), Value('Бусад орлого'))}, {}),
+    ('seminar', 'SeminarPaymentAllocation', 'income',
+     {'month': F('bank_transaction__transaction_date'), 'category': Value('Семинар'), 'student_id': F('student_id')}, {}),
+    ('membership', 'MembershipPaymentAllocation', 'income',
+     {'month': F('payment_month'), 'category': Value('Гишүүнчлэл'), 'student_id': F('student_id')}, {}),
+    ('expense', 'ExpenseAllocation', 'expense',
+     {'month': F('expense_date'), 'category': Coalesce(F('expense_category__name'), Value('Бусад зардал'))}, {}),
+    ('instructor_payment', 'InstructorPaymentAllocation', 'expense',
+     {
+         'month': F('instructor_payment__month'), 'category': Value('Багшийн цалин'),
+         'instructor_id': F('instructor_payment__instructor_id'),
+         'class_type_id': F('instructor_payment__class_type_id'),
+     }, {}),
+    ('federation_payment', 'MonthlyFederationPayment', 'expense',
+     {
+         'month': F('month'), 'category': Value('Холбооны төлбөр'),
+         'class_type_id': F('class_type_id'), 'amount': F('federation_share_amount'),
+     }, {'bank_transaction__isnull': False}),
+]
+
+
+def backfill_ledger(apps, schema_editor):
+    """Одоо байгаа allocation, холбооны төлбөрүүдээс LedgerEntry үүсгэх (rebuild_ledger-тэй ижил утга)"""
+    LedgerEntry = apps.get_model('aikido_app', 'LedgerEntry')
+    for source_type, model_name, direction, expressions, filters in LEDGER_SOURCES:
+        model = apps.get_model('aikido_app', model_name)
+        expressions = {'amount': F('amount'), **expressions}
+        rows = model.objects.filter(**filters).order_by().values(
+            ledger_source_id=F('pk'),
+            ledger_bank_transaction_id=F('bank_transaction_id'),
+            ledger_entry_date=F('bank_transaction__transaction_date'),
+            **{f'ledger_{field}': expression for field, expression in expressions.items()}
+        )
+        entries = []
+        for row in rows.iterator(chunk_size=2000):
+            month = row['ledger_month'] or row['ledger_entry_date']
+            if not month:
+                continue
+            entries.append(LedgerEntry(
+                source_type=source_type,
+                source_id=row['ledger_source_id'],
+                bank_transaction_id=row['ledger_bank_transaction_id'],
+                month=date(month.year, month.month, 1),
+                entry_date=row['ledger_entry_date'],
+                direction=direction,
+                category=row['ledger_category'],
+                student_id=row.get('ledger_student_id'),
+                instructor_id=row.get('ledger_instructor_id'),
+                class_type_id=row.get('ledger_class_type_id'),
+                amount=row['ledger_amount'] or Decimal('0.00'),
+            ))
+        LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0026_attendance_attendance_present_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_type', models.CharField(choices=[('payment', 'Сурагчийн төлбөр'), ('income', 'Бусад орлого'), ('seminar', 'Семинарын төлбөр'), ('membership', 'Гишүүнчлэлийн төлбөр'), ('expense', 'Зардал'), ('instructor_payment', 'Багшийн төлбөр'), ('federation_payment', 'Холбооны төлбөр')], max_length=20, verbose_name='Эх сурвалж')),
+                ('source_id', models.PositiveBigIntegerField(verbose_name='Эх бичлэгийн ID')),
+                ('month', models.DateField(help_text='Орлого/зардал хамаарах сарын эхний өдөр (төлбөрийн сар, зардлын огноо гэх мэт)', verbose_name='Сар')),
+                ('entry_date', models.DateField(blank=True, help_text='Мөнгөн гүйлгээ хийгдсэн огноо (cash-flow тайлан)', null=True, verbose_name='Гүйлгээний огноо')),
+                ('direction', models.CharField(choices=[('income', 'Орлого'), ('expense', 'Зарлага')], max_length=10, verbose_name='Чиглэл')),
+                ('category', models.CharField(max_length=200, verbose_name='Ангилал')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Дүн')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Шинэчилсэн огноо')),
+                ('bank_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='aikido_app.banktransaction', verbose_name='Банкны гүйлгээ')),
+                ('class_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='aikido_app.classtype', verbose_name='Ангийн төрөл')),
+                ('instructor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='aikido_app.instructor', verbose_name='Багш')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='aikido_app.student', verbose_name='Сурагч')),
+            ],
+            options={
+                'verbose_name': 'Санхүүгийн бичилт',
+                'verbose_name_plural': 'Санхүүгийн бичилтүүд',
+                'ordering': ['-month', 'direction', 'category'],
+                'indexes': [models.Index(fields=['month', 'direction', 'category', 'amount'], name='ledger_month_category_idx'), models.Index(fields=['entry_date', 'direction'], name='ledger_entry_date_idx')],
+                'unique_together': {('source_type', 'source_id')},
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:39
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    """LedgerEntry-ээс сарын нэгтгэлийг тооцох (ledger.refresh_rollups()-тэй ижил GROUP BY)"""
+    LedgerEntry = apps.get_model('aikido_app', 'LedgerEntry')
+    MonthlyRollup = apps.get_model('aikido_app', 'MonthlyRollup')
+    MonthlyRollup.objects.bulk_create([
+        MonthlyRollup(
+            month=row['month'], direction=row['direction'], category=row['category'],
+            total=row['total'], entry_count=row['count'],
+        )
+        for row in LedgerEntry.objects.values('month', 'direction', 'category').annotate(
+            total=Sum('amount'), count=Count('id')
+        ).order_by()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aikido_app', '0027_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Сар')),
+                ('direction', models.CharField(choices=[('income', 'Орлого'), ('expense', 'Зарлага')], max_length=10, verbose_name='Чиглэл')),
+                ('category', models.CharField(max_length=200, verbose_name='Ангилал')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Нийт дүн')),
+                ('entry_count', models.PositiveIntegerField(default=0, verbose_name='Бичилтийн тоо')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Шинэчилсэн огноо')),
+            ],
+            options={
+                'verbose_name': 'Сарын нэгтгэл',
+                'verbose_name_plural': 'Сарын нэгтгэлүүд',
+                'ordering': ['month', 'direction', 'category'],
+                'unique_together': {('month', 'direction', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,90 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from decimal import Decimal
+import hashlib
 
+from .periods import PeriodQuerySet
 
-class Student(models.Model):
+
+class RankTrackingMixin:
+    """
+    Зэрэг цолын түүх хөтлөх - зэрэг өөрчлөгдөхөд өмнөх зэргийг RankHistory-д хадгална
+    - ачаалах үеийн (from_db) зэргийн утгуудыг хадгалдаг тул save() бүрт DB-ээс дахин уншихгүй
+    - save(update_fields=[...]) зэргийн талбаргүй бол шалгахгүй
+    """
+
+    RANK_FIELDS = ('kyu_rank', 'dan_rank', 'current_rank_date')
+    # RankHistory-ийн FK талбар, зэргийн огноо хоосон үед хэрэглэх огноо
+    RANK_HISTORY_FIELD = None
+    RANK_FALLBACK_DATE_FIELD = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_rank_snapshot()
+        return instance
+
+    def _rank_snapshot_fields(self):
+        return self.RANK_FIELDS + (self.RANK_FALLBACK_DATE_FIELD,)
+
+    def _take_rank_snapshot(self):
+        fields = self._rank_snapshot_fields()
+        # only()/defer()-ээр ачаалаагүй талбар байвал snapshot-гүй - save() үед DB-ээс уншина
+        if all(field in self.__dict__ for field in fields):
+            self._rank_snapshot = {field: self.__dict__[field] for field in fields}
+        else:
+            self._rank_snapshot = None
+
+    def loaded_ranks(self):
+        """DB дэх (ачаалах үеийн) зэргийн утгууд, шинэ бичлэг бол None"""
+        snapshot = getattr(self, '_rank_snapshot', None)
+        if snapshot is None and self.pk:
+            snapshot = type(self)._base_manager.filter(pk=self.pk).values(*self._rank_snapshot_fields()).first()
+        return snapshot
+
+    def rank_history_entry(self, previous, notes=None):
+        """Зэрэг өөрчлөгдсөн бол өмнөх зэргийн RankHistory (хадгалаагүй), үгүй бол None"""
+        if not previous or not (previous['kyu_rank'] or previous['dan_rank']):
+            return None
+        if (previous['kyu_rank'], previous['dan_rank']) == (self.kyu_rank, self.dan_rank):
+            return None
+        if previous['dan_rank']:
+            label = dict(self.DAN_CHOICES).get(previous['dan_rank'])
+        else:
+            label = dict(self.KYU_CHOICES).get(previous['kyu_rank'])
+        return RankHistory(**{
+            self.RANK_HISTORY_FIELD: self,
+            'rank_type': 'kyu' if previous['kyu_rank'] else 'dan',
+            'rank_number': previous['kyu_rank'] or previous['dan_rank'],
+            'obtained_date': previous['current_rank_date'] or previous[self.RANK_FALLBACK_DATE_FIELD],
+            'notes': notes or f'Автоматаар хадгалагдсан: {label}',
+        })
+
+    def save(self, *args, **kwargs):
+        """Зэрэг өөрчлөгдсөн бол өмнөх зэргийг түүхэнд хадгалах"""
+        update_fields = kwargs.get('update_fields')
+        tracks_rank = update_fields is None or bool(set(update_fields) & set(self._rank_snapshot_fields()))
+        history = self.rank_history_entry(self.loaded_ranks()) if tracks_rank else None
+
+        if history is None:
+            super().save(*args, **kwargs)
+        else:
+            with db_transaction.atomic():
+                super().save(*args, **kwargs)
+                history.save()
+        if tracks_rank:
+            self._take_rank_snapshot()
+
+
+class Student(RankTrackingMixin, models.Model):
     """Сурагч - Айкидо сургалтад хамрагдагчид"""
     
+    RANK_HISTORY_FIELD = 'student'
+    RANK_FALLBACK_DATE_FIELD = 'enrollment_date'
+    
     # Rank choices
     KYU_CHOICES = [
         (1, '1 кюү'),
@@ -124,40 +201,14 @@ class Student(models.Model):
             raise ValidationError({
                 'monthly_fee': 'Сарын төлбөр сөрөг утга байж болохгүй.'
             })
-    
-    def save(self, *args, **kwargs):
-        """Override save to track rank history"""
-        # Check if this is an existing record (has pk)
-        if self.pk:
-            try:
-                # Get the old version from database
-                old_instance = Student.objects.get(pk=self.pk)
-                
-                # Check if rank changed
-                rank_changed = (
-                    old_instance.kyu_rank != self.kyu_rank or 
-                    old_instance.dan_rank != self.dan_rank
-                )
-                
-                # If rank changed and there was a previous rank, save to history
-                if rank_changed and (old_instance.kyu_rank or old_instance.dan_rank):
-                    from .models import RankHistory
-                    RankHistory.objects.create(
-                        student=self,
-                        rank_type='kyu' if old_instance.kyu_rank else 'dan',
-                        rank_number=old_instance.kyu_rank or old_instance.dan_rank,
-                        obtained_date=old_instance.current_rank_date or old_instance.enrollment_date,
-                        notes=f'Автоматаар хадгалагдсан: {old_instance.get_rank_display_full()}'
-                    )
-            except Student.DoesNotExist:
-                pass
-        
-        super().save(*args, **kwargs)
 
 
-class Instructor(models.Model):
+class Instructor(RankTrackingMixin, models.Model):
     """Багш - Хичээл заадаг багш нар"""
     
+    RANK_HISTORY_FIELD = 'instructor'
+    RANK_FALLBACK_DATE_FIELD = 'hire_date'
+    
     # Rank choices
     KYU_CHOICES = [
         (1, '1 кюү'),
@@ -263,35 +314,6 @@ class Instructor(models.Model):
             raise ValidationError({
                 'current_rank_date': 'Зэрэг авсан огноог оруулна уу.'
             })
-    
-    def save(self, *args, **kwargs):
-        """Override save to track rank history"""
-        # Check if this is an existing record (has pk)
-        if self.pk:
-            try:
-                # Get the old version from database
-                old_instance = Instructor.objects.get(pk=self.pk)
-                
-                # Check if rank changed
-                rank_changed = (
-                    old_instance.kyu_rank != self.kyu_rank or 
-                    old_instance.dan_rank != self.dan_rank
-                )
-                
-                # If rank changed and there was a previous rank, save to history
-                if rank_changed and (old_instance.kyu_rank or old_instance.dan_rank):
-                    from .models import RankHistory
-                    RankHistory.objects.create(
-                        instructor=self,
-                        rank_type='kyu' if old_instance.kyu_rank else 'dan',
-                        rank_number=old_instance.kyu_rank or old_instance.dan_rank,
-                        obtained_date=old_instance.current_rank_date or old_instance.hire_date,
-                        notes=f'Автоматаар хадгалагдсан: {old_instance.get_rank_display_full()}'
-                    )
-            except Instructor.DoesNotExist:
-                pass
-        
-        super().save(*args, **kwargs)
 
 
 class ClassType(models.Model):
@@ -324,6 +346,9 @@ class ClassType(models.Model):
 
 class ClassSession(models.Model):
     """Хичээлийн хуваарь - Тодорхой өдрийн хичээл"""
+    PERIOD_FIELD = 'date'
+    objects = PeriodQuerySet.as_manager()
+    
     MONDAY = 0
     TUESDAY = 1
     WEDNESDAY = 2
@@ -361,6 +386,10 @@ class ClassSession(models.Model):
         verbose_name = "Хичээлийн хуваарь"
         verbose_name_plural = "Хичээлийн хуваарь"
         ordering = ['-date', 'start_time']
+        indexes = [
+            # Өдрийн хуваарь, (date, class_type)-ээр get_or_create
+            models.Index(fields=['date', 'class_type'], name='session_date_type_idx'),
+        ]
     
     def __str__(self):
         return f"{self.class_type} - {self.date} ({self.get_weekday_display()})"
@@ -368,6 +397,9 @@ class ClassSession(models.Model):
 
 class InstructorAssignment(models.Model):
     """Багшийн томилолт - Хичээлд томилогдсон багш нар"""
+    PERIOD_FIELD = 'session__date'
+    objects = PeriodQuerySet.as_manager()
+    
     LEAD = 'LEAD'
     ASSISTANT = 'ASSISTANT'
     
@@ -404,6 +436,9 @@ class InstructorAssignment(models.Model):
 
 class Attendance(models.Model):
     """Ирц - Сурагчдын ирц"""
+    PERIOD_FIELD = 'session__date'
+    objects = PeriodQuerySet.as_manager()
+    
     session = models.ForeignKey(
         ClassSession,
         on_delete=models.CASCADE,
@@ -430,6 +465,10 @@ class Attendance(models.Model):
         verbose_name_plural = "Ирц"
         unique_together = ['session', 'student']
         ordering = ['-session__date']
+        indexes = [
+            # session__date хүрээнээс is_present-ээр шүүж student_id-г хүснэгт уншилгүй авна
+            models.Index(fields=['session', 'is_present', 'student'], name='attendance_present_idx'),
+        ]
     
     def __str__(self):
         status = "Ирсэн" if self.is_present else "Тасалсан"
@@ -549,11 +588,17 @@ class RankHistory(models.Model):
 class BankTransaction(models.Model):
     """Банкны гүйлгээний бичлэг - Excel файлаас импортлосон"""
     
+    PERIOD_FIELD = 'transaction_date'
+    objects = PeriodQuerySet.as_manager()
+    
     STATUS_PENDING = 'PENDING'
     STATUS_MATCHED = 'MATCHED'
     STATUS_PARTIALLY_MATCHED = 'PARTIALLY_MATCHED'
     STATUS_IGNORED = 'IGNORED'
     
+    # Зөвхөн allocation-ууд (F()) болон импорт бичнэ - хуучирсан instance-ийн save() дарж бичихгүй
+    UPDATE_PROTECTED_FIELDS = ('allocated_amount', 'fingerprint')
+    
     STATUS_CHOICES = [
         (STATUS_PENDING, 'Хүлээгдэж буй'),
         (STATUS_MATCHED, 'Холбогдсон'),
@@ -623,18 +668,83 @@ class BankTransaction(models.Model):
         blank=True,
         verbose_name="Тэмдэглэл"
     )
+    allocated_amount = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Хуваарилагдсан дүн",
+        help_text="Allocation-уудын нийлбэр - allocation үүсэх/устах үед автоматаар шинэчлэгдэнэ"
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Хурууны хээ",
+        help_text="Огноо, дүн, утга, харьцсан данс, үлдэгдлээс тооцсон SHA-256 - давхар импортоос сэргийлнэ"
+    )
     imported_at = models.DateTimeField(auto_now_add=True, verbose_name="Импортлосон огноо")
     
     class Meta:
         verbose_name = "Банкны гүйлгээ"
         verbose_name_plural = "Банкны гүйлгээнүүд"
         ordering = ['-transaction_date', '-imported_at']
+        indexes = [
+            models.Index(fields=['-transaction_date', '-imported_at'], name='banktxn_date_idx'),
+            models.Index(fields=['status', '-transaction_date'], name='banktxn_status_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_date} - {self.amount}₮ - {self.payer_name or 'Тодорхойгүй'}"
     
+    @staticmethod
+    def make_fingerprint(transaction_date, credit_amount, debit_amount, description, counterparty_account, closing_balance):
+        """Гүйлгээний агуулгын хэвийн болгосон SHA-256 (зай, том жижиг үсэг, дүнгийн бичлэгээс үл хамаарна)"""
+        def amount(value):
+            return format(Decimal(value).quantize(Decimal('0.01')), 'f') if value is not None else ''
+
+        def text(value):
+            return ' '.join((value or '').split()).lower()
+
+        parts = [
+            transaction_date.isoformat(), amount(credit_amount), amount(debit_amount),
+            text(description), text(counterparty_account), amount(closing_balance),
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+    
+    def compute_fingerprint(self):
+        return self.make_fingerprint(
+            self.transaction_date, self.credit_amount, self.debit_amount,
+            self.description, self.counterparty_account, self.closing_balance
+        )
+    
+    def save(self, *args, **kwargs):
+        """
+        allocated_amount-ийг зөвхөн allocation-ууд F() ашиглан шинэчилнэ - хуучирсан instance дарж бичихгүй
+        fingerprint нь импортын өөрчлөгдөшгүй түлхүүр: үүсэх үед тооцогдоно, засварлахад бичигдэхгүй
+        (огноо, утгыг зассан ч анхны хуулгын мөрийг дахин импортлоход давхардал гэж танигдана)
+        """
+        if self._state.adding and not self.fingerprint:
+            self.fingerprint = self.compute_fingerprint()
+        super().save(*args, **kwargs)
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, *args, **kwargs):
+        """
+        update_fields өгөөгүй save()-ийн UPDATE-ээс allocated_amount, fingerprint-ийг хасна
+        Defer хийсэн талбар, мөр устсан бол INSERT хийх зэрэг Django-гийн жам хэвээр үлдэнэ
+        """
+        if update_fields is None:
+            values = [value for value in values if value[0].attname not in self.UPDATE_PROTECTED_FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, *args, **kwargs)
+    
     def get_allocated_amount(self):
         """Хуваарилагдсан нийт дүн (орлого эсвэл зардал)"""
+        return self.allocated_amount
+    
+    def compute_allocated_amount(self):
+        """Хуваарилагдсан нийт дүнг allocation хүснэгтүүдээс шууд тооцоолох"""
         # Кредит гүйлгээ бол PaymentAllocation болон IncomeAllocation-оос
         if self.credit_amount and self.credit_amount > 0:
             payment_total = self.allocations.aggregate(total=models.Sum('amount'))['total'] or Decimal('0.00')
@@ -653,21 +763,46 @@ class BankTransaction(models.Model):
         """Үлдсэн дүн"""
         return self.amount - self.get_allocated_amount()
     
-    def update_status(self):
-        """Төлөвийг автоматаар шинэчлэх"""
-        allocated = self.get_allocated_amount()
+    def is_credit(self):
+        """Орлогын (кредит) гүйлгээ эсэх"""
+        return bool(self.credit_amount and self.credit_amount > 0)
+    
+    def get_status_for(self, allocated):
+        """Хуваарилагдсан дүнгээс төлөв тодорхойлох"""
         if allocated == Decimal('0.00'):
-            self.status = self.STATUS_PENDING
+            return self.STATUS_PENDING
         elif allocated >= self.amount:
-            self.status = self.STATUS_MATCHED
-        else:
-            self.status = self.STATUS_PARTIALLY_MATCHED
-        self.save()
+            return self.STATUS_MATCHED
+        return self.STATUS_PARTIALLY_MATCHED
+    
+    def update_status(self):
+        """Төлөвийг автоматаар шинэчлэх"""
+        self.refresh_from_db(fields=['allocated_amount'])
+        self.status = self.get_status_for(self.allocated_amount)
+        self.save(update_fields=['status'])
+
+
+class BankAllocationMixin:
+    """
+    Банкны гүйлгээний allocation model-уудын нийтлэг хэсэг
+    allocation_direction: 'credit' (орлого) эсвэл 'debit' (зардал) - аль төрлийн гүйлгээнд тоологдох
+    BankTransaction.allocated_amount-ийг signals.py шинэчилнэ; save() нэг transaction дотор явагдана
+    """
+    allocation_direction = 'credit'
+    
+    def save(self, *args, **kwargs):
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
 
 
-class PaymentAllocation(models.Model):
+class PaymentAllocation(BankAllocationMixin, models.Model):
     """Төлбөрийн хуваарилалт - Банкны гүйлгээг сурагч + сартай холбох"""
     
+    PERIOD_FIELD = 'payment_month'
+    objects = PeriodQuerySet.as_manager()
+    
+    allocation_direction = 'credit'
+    
     COLOR_CHOICES = [
         ('', 'Өнгөгүй'),
         ('green', 'Ногоон'),
@@ -732,6 +867,10 @@ class PaymentAllocation(models.Model):
         verbose_name = "Төлбөрийн хуваарилалт"
         verbose_name_plural = "Төлбөрийн хуваарилалтууд"
         ordering = ['-created_at']
+        indexes = [
+            # Pivot ба сарын тайлан: payment_month хүрээ, (student, payment_month)-ээр GROUP BY
+            models.Index(fields=['payment_month', 'student', 'amount'], name='payalloc_month_student_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.payment_month.strftime('%Y-%m')} - {self.amount}₮"
@@ -775,9 +914,14 @@ class IncomeCategory(models.Model):
         return self.name
 
 
-class IncomeAllocation(models.Model):
+class IncomeAllocation(BankAllocationMixin, models.Model):
     """Орлогын хуваарилалт - Банкны гүйлгээг орлогын ангилалтай холбох"""
     
+    PERIOD_FIELD = 'income_date'
+    objects = PeriodQuerySet.as_manager()
+    
+    allocation_direction = 'credit'
+    
     bank_transaction = models.ForeignKey(
         BankTransaction,
         on_delete=models.CASCADE,
@@ -849,9 +993,11 @@ class Seminar(models.Model):
         return f"{self.name} ({self.seminar_date})"
 
 
-class SeminarPaymentAllocation(models.Model):
+class SeminarPaymentAllocation(BankAllocationMixin, models.Model):
     """Семинарын төлбөрийн хуваарилалт - Банкны гүйлгээг сурагч + семинартай холбох"""
     
+    allocation_direction = 'credit'
+    
     bank_transaction = models.ForeignKey(
         BankTransaction,
         on_delete=models.CASCADE,
@@ -897,9 +1043,14 @@ class SeminarPaymentAllocation(models.Model):
         return f"{self.student} - {self.seminar} - {self.amount}₮"
 
 
-class MembershipPaymentAllocation(models.Model):
+class MembershipPaymentAllocation(BankAllocationMixin, models.Model):
     """Гишүүнчлэлийн төлбөрийн хуваарилалт - Банкны гүйлгээг сурагч + сартай холбох"""
     
+    PERIOD_FIELD = 'payment_month'
+    objects = PeriodQuerySet.as_manager()
+    
+    allocation_direction = 'credit'
+    
     bank_transaction = models.ForeignKey(
         BankTransaction,
         on_delete=models.CASCADE,
@@ -966,9 +1117,14 @@ class ExpenseCategory(models.Model):
         return self.name
 
 
-class ExpenseAllocation(models.Model):
+class ExpenseAllocation(BankAllocationMixin, models.Model):
     """Зардлын хуваарилалт - Банкны гүйлгээг зардлын ангилалтай холбох"""
     
+    PERIOD_FIELD = 'expense_date'
+    objects = PeriodQuerySet.as_manager()
+    
+    allocation_direction = 'debit'
+    
     bank_transaction = models.ForeignKey(
         BankTransaction,
         on_delete=models.CASCADE,
@@ -1013,9 +1169,11 @@ class ExpenseAllocation(models.Model):
         return f"{self.expense_category} - {self.expense_date} - {self.amount}₮"
 
 
-class InstructorPaymentAllocation(models.Model):
+class InstructorPaymentAllocation(BankAllocationMixin, models.Model):
     """Багшийн төлбөрийн хуваарилалт - Банкны зардлын гүйлгээг багшийн төлбөртэй холбох"""
     
+    allocation_direction = 'debit'
+    
     bank_transaction = models.ForeignKey(
         BankTransaction,
         on_delete=models.CASCADE,
@@ -1059,6 +1217,9 @@ class InstructorPaymentAllocation(models.Model):
 class MonthlyInstructorPayment(models.Model):
     """Багшийн сарын төлбөр - Хичээл заасны төлбөр (сарын төлбөрийн 50%-ийн 60% ахлах, 40% туслах)"""
     
+    PERIOD_FIELD = 'month'
+    objects = PeriodQuerySet.as_manager()
+    
     instructor = models.ForeignKey(
         Instructor,
         on_delete=models.CASCADE,
@@ -1135,6 +1296,9 @@ class MonthlyInstructorPayment(models.Model):
         verbose_name_plural = "Багшийн сарын төлбөрүүд"
         ordering = ['-month', 'class_type', 'instructor']
         unique_together = ['instructor', 'class_type', 'month', 'role']
+        indexes = [
+            models.Index(fields=['month', 'is_paid'], name='instr_payment_month_paid_idx'),
+        ]
     
     def __str__(self):
         return f"{self.instructor} - {self.class_type} - {self.month.strftime('%Y-%m')} - {self.get_role_display()} - {self.instructor_share_amount}₮"
@@ -1169,6 +1333,9 @@ class MonthlyInstructorPayment(models.Model):
 class MonthlyFederationPayment(models.Model):
     """Холбооны сарын төлбөр - Монголын айкидогийн холбоонд өгөх (сарын төлбөрийн 50%)"""
     
+    PERIOD_FIELD = 'month'
+    objects = PeriodQuerySet.as_manager()
+    
     class_type = models.ForeignKey(
         ClassType,
         on_delete=models.CASCADE,
@@ -1274,3 +1441,155 @@ class PaymentCellComment(models.Model):
     
     def __str__(self):
         return f"{self.student} - {self.month.strftime('%Y-%m')}"
+
+
+class PayrollDirtyMonth(models.Model):
+    """Дахин тооцоолох шаардлагатай цалингийн сар - төлбөр, томилолт, хичээл өөрчлөгдөхөд бүртгэгдэнэ"""
+    
+    class_type = models.ForeignKey(
+        ClassType,
+        on_delete=models.CASCADE,
+        verbose_name="Ангийн төрөл"
+    )
+    month = models.DateField(
+        verbose_name="Сар",
+        help_text="Тухайн сарын эхний өдөр"
+    )
+    marked_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Тэмдэглэсэн цаг",
+        help_text="Дахин өөрчлөгдөх бүрт шинэчлэгдэнэ"
+    )
+    
+    class Meta:
+        verbose_name = "Дахин тооцоолох цалингийн сар"
+        verbose_name_plural = "Дахин тооцоолох цалингийн сарууд"
+        ordering = ['month', 'class_type']
+        unique_together = ['class_type', 'month']
+    
+    def __str__(self):
+        return f"{self.class_type} - {self.month.strftime('%Y-%m')}"
+
+
+class LedgerEntry(models.Model):
+    """Санхүүгийн нэгдсэн бүртгэл - хуваарилалт бүрийн нэг мөр (ledger.py хөтөлнө, тайлангууд нэг GROUP BY-оор уншина)"""
+    
+    PERIOD_FIELD = 'month'
+    objects = PeriodQuerySet.as_manager()
+    
+    INCOME = 'income'
+    EXPENSE = 'expense'
+    DIRECTION_CHOICES = [
+        (INCOME, 'Орлого'),
+        (EXPENSE, 'Зарлага'),
+    ]
+    
+    SOURCE_PAYMENT = 'payment'
+    SOURCE_INCOME = 'income'
+    SOURCE_SEMINAR = 'seminar'
+    SOURCE_MEMBERSHIP = 'membership'
+    SOURCE_EXPENSE = 'expense'
+    SOURCE_INSTRUCTOR_PAYMENT = 'instructor_payment'
+    SOURCE_FEDERATION_PAYMENT = 'federation_payment'
+    SOURCE_CHOICES = [
+        (SOURCE_PAYMENT, 'Сурагчийн төлбөр'),
+        (SOURCE_INCOME, 'Бусад орлого'),
+        (SOURCE_SEMINAR, 'Семинарын төлбөр'),
+        (SOURCE_MEMBERSHIP, 'Гишүүнчлэлийн төлбөр'),
+        (SOURCE_EXPENSE, 'Зардал'),
+        (SOURCE_INSTRUCTOR_PAYMENT, 'Багшийн төлбөр'),
+        (SOURCE_FEDERATION_PAYMENT, 'Холбооны төлбөр'),
+    ]
+    
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="Эх сурвалж")
+    source_id = models.PositiveBigIntegerField(verbose_name="Эх бичлэгийн ID")
+    bank_transaction = models.ForeignKey(
+        BankTransaction,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name="Банкны гүйлгээ"
+    )
+    month = models.DateField(
+        verbose_name="Сар",
+        help_text="Орлого/зардал хамаарах сарын эхний өдөр (төлбөрийн сар, зардлын огноо гэх мэт)"
+    )
+    entry_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Гүйлгээний огноо",
+        help_text="Мөнгөн гүйлгээ хийгдсэн огноо (cash-flow тайлан)"
+    )
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES, verbose_name="Чиглэл")
+    category = models.CharField(max_length=200, verbose_name="Ангилал")
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name="Сурагч"
+    )
+    instructor = models.ForeignKey(
+        Instructor,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name="Багш"
+    )
+    class_type = models.ForeignKey(
+        ClassType,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name="Ангийн төрөл"
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Дүн")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Шинэчилсэн огноо")
+    
+    class Meta:
+        verbose_name = "Санхүүгийн бичилт"
+        verbose_name_plural = "Санхүүгийн бичилтүүд"
+        ordering = ['-month', 'direction', 'category']
+        unique_together = ['source_type', 'source_id']
+        indexes = [
+            # P&L / ангиллын тайлан: сарын хүрээ, (direction, category)-ээр GROUP BY
+            models.Index(fields=['month', 'direction', 'category', 'amount'], name='ledger_month_category_idx'),
+            models.Index(fields=['entry_date', 'direction'], name='ledger_entry_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.month.strftime('%Y-%m')} - {self.get_direction_display()} - {self.category} - {self.amount}₮"
+
+
+class MonthlyRollup(models.Model):
+    """Сар, чиглэл, ангиллын урьдчилан нэгтгэсэн дүн - LedgerEntry өөрчлөгдсөн сарууд дахин тооцоологдоно"""
+
+    PERIOD_FIELD = 'month'
+    objects = PeriodQuerySet.as_manager()
+
+    month = models.DateField(verbose_name="Сар")
+    direction = models.CharField(max_length=10, choices=LedgerEntry.DIRECTION_CHOICES, verbose_name="Чиглэл")
+    category = models.CharField(max_length=200, verbose_name="Ангилал")
+    total = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Нийт дүн")
+    entry_count = models.PositiveIntegerField(default=0, verbose_name="Бичилтийн тоо")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Шинэчилсэн огноо")
+
+    class Meta:
+        verbose_name = "Сарын нэгтгэл"
+        verbose_name_plural = "Сарын нэгтгэлүүд"
+        ordering = ['month', 'direction', 'category']
+        unique_together = ['month', 'direction', 'category']
+
+    def __str__(self):
+        return f"{self.month.strftime('%Y-%m')} - {self.get_direction_display()} - {self.category} - {self.total}₮"
+
+
+CREDIT_ALLOCATION_MODELS = [
+    PaymentAllocation, IncomeAllocation, SeminarPaymentAllocation, MembershipPaymentAllocation,
+]
+DEBIT_ALLOCATION_MODELS = [ExpenseAllocation, InstructorPaymentAllocation]
+BANK_ALLOCATION_MODELS = CREDIT_ALLOCATION_MODELS + DEBIT_ALLOCATION_MODELS
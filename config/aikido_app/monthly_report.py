@@ -0,0 +1,43 @@
+"""
+Сарын төлбөрийн тайлан - ангийн төрөл бүрийн цуглуулсан төлбөрийг нэг GROUP BY-оор тооцож cache-лэнэ
+"""
+from django.db.models import Count, Sum
+
+from . import caching
+from .models import PaymentAllocation
+
+
+REPORT_TIMEOUT = 60 * 10
+
+
+def invalidate_monthly_report():
+    caching.invalidate(caching.MONTHLY_REPORT)
+
+
+def build_collected_by_class_type(month_date=None, year=None):
+    """
+    Ангийн төрөл бүрийн цуглуулсан төлбөр, сурагчийн тоо
+    month_date, year хоёулаа байхгүй бол бүх хугацаагаар
+    Returns: {class_type_id: {'total': Decimal, 'student_count': int}}
+    """
+    payments = PaymentAllocation.objects.filter(student__class_types__isnull=False)
+    if month_date:
+        payments = payments.for_month(month_date)
+    elif year:
+        payments = payments.for_year(year)
+
+    return {
+        row['student__class_types']: {'total': row['total'], 'student_count': row['student_count']}
+        for row in payments.values('student__class_types').annotate(
+            total=Sum('amount'), student_count=Count('student', distinct=True)
+        ).order_by()
+    }
+
+
+def collected_by_class_type(month_date=None, year=None):
+    """Cache-лэгдсэн build_collected_by_class_type"""
+    return caching.get_or_build(
+        caching.MONTHLY_REPORT, ('collected', month_date, year),
+        lambda: build_collected_by_class_type(month_date, year),
+        REPORT_TIMEOUT,
+    )
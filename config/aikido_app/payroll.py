@@ -0,0 +1,266 @@
+"""
+Багшийн цалин ба холбооны төлбөрийн тооцоолол - олон сар, бүх ангийг цөөн GROUP BY query-ээр
+- сарын төлбөрийн 50% холбоонд, 50% багш нарт
+- багш нарын хэсгийн 60% ахлах, 40% туслах багшийн томилолтуудад тэнцүү хуваагдана
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import caching
+from .instructor_stats import period_sessions, session_month_assignment_counts, session_month_counts
+from .periods import MonthRange, next_month
+from .models import (
+    ClassType, InstructorAssignment, MonthlyFederationPayment,
+    MonthlyInstructorPayment, PaymentAllocation, PayrollDirtyMonth
+)
+
+
+FEDERATION_SHARE = Decimal('0.50')
+INSTRUCTOR_SHARE = Decimal('0.50')
+ROLE_SHARES = {
+    InstructorAssignment.LEAD: Decimal('0.60'),
+    InstructorAssignment.ASSISTANT: Decimal('0.40'),
+}
+
+STATUS_CALCULATED = 'calculated'
+STATUS_LOCKED = 'locked'
+STATUS_NO_PAYMENTS = 'no_payments'
+STATUS_NO_SESSIONS = 'no_sessions'
+
+
+def parse_month(value):
+    """'YYYY-MM' текстийг сарын эхний өдөр болгох"""
+    year, month = map(int, value.split('-'))
+    return date(year, month, 1)
+
+
+def month_range(first_month, last_month):
+    """Хоёр сарын хоорондох (хоёулаа орсон) бүх сарын эхний өдрүүд"""
+    return MonthRange(date(first_month.year, first_month.month, 1), next_month(last_month)).months()
+
+
+class PayrollEngine:
+    """
+    Сарын цалингийн тооцоолол
+    1. load    - төлбөр, хичээл, томилолт, түгжигдсэн сарыг бүх сараар нэг дор GROUP BY хийнэ
+    2. compute - (анги, сар) бүрийн холбоо/багшийн хувийг санах ойд тооцно
+    3. write   - bulk_create(update_conflicts=True)-ээр unique_together түлхүүр дээр upsert хийнэ
+    """
+
+    def __init__(self, recalculate=False, batch_size=500, prune=False):
+        self.recalculate = recalculate
+        self.batch_size = batch_size
+        # prune=True: түгжигдээгүй сарын хуучирсан мөрүүдийг (томилолтгүй болсон багш, төлбөргүй болсон анги) устгана
+        self.prune = prune
+
+    def load(self, months, class_type_ids=None):
+        """Сонгосон саруудын бүх өгөгдлийг цөөн query-ээр ачаалах"""
+        period = MonthRange(months[0], next_month(months[-1]))
+
+        # Class type condition in the same filter() so the M2M join is reused by values()
+        if class_type_ids is None:
+            student_class_filter = Q(student__class_types__isnull=False)
+        else:
+            student_class_filter = Q(student__class_types__in=class_type_ids)
+        payments = PaymentAllocation.objects.filter(student_class_filter).in_period(period)
+        # Хичээл, томилолтыг ирцийн хуудастай ижил instructor_stats helper-ээр тоолно
+        sessions = period_sessions(period, class_type_ids)
+        locked_filter = period.q('month') & (Q(is_paid=True) | Q(bank_transaction__isnull=False))
+        if class_type_ids is not None:
+            locked_filter &= Q(class_type_id__in=class_type_ids)
+
+        # Collected fees per (class type, month) - a student in two classes counts in both
+        collected = {
+            (row['student__class_types'], row['month']): row
+            for row in payments.values(
+                'student__class_types', month=TruncMonth('payment_month')
+            ).annotate(
+                total=Sum('amount'), student_count=Count('student', distinct=True)
+            ).order_by()
+        }
+        session_counts = session_month_counts(sessions)
+        assignment_counts = session_month_assignment_counts(sessions)
+
+        locked = set(MonthlyInstructorPayment.objects.filter(locked_filter).values_list('class_type_id', 'month'))
+        locked.update(MonthlyFederationPayment.objects.filter(locked_filter).values_list('class_type_id', 'month'))
+        # Locked rows may store any day of the month
+        locked = {(class_type_id, date(month.year, month.month, 1)) for class_type_id, month in locked}
+
+        return collected, session_counts, assignment_counts, locked
+
+    def compute(self, months, class_types):
+        """
+        (анги, сар) бүрийн тооцоолол
+        Returns: жагсаалт - status, дүнгүүд, federation болон instructor мөрүүд
+        """
+        collected, session_counts, assignment_counts, locked = self.load(
+            months, [class_type.pk for class_type in class_types]
+        )
+
+        results = []
+        for month_date in months:
+            for class_type in class_types:
+                key = (class_type.pk, month_date)
+                result = {
+                    'class_type': class_type,
+                    'month': month_date,
+                    'status': STATUS_CALCULATED,
+                    'total_collected': Decimal('0.00'),
+                    'student_count': 0,
+                    'total_sessions': session_counts.get(key, 0),
+                    'federation': None,
+                    'instructors': [],
+                    'share_per_assignment': {},
+                    'assignment_totals': {},
+                }
+                results.append(result)
+
+                if key in locked and not self.recalculate:
+                    result['status'] = STATUS_LOCKED
+                    continue
+
+                collected_row = collected.get(key)
+                if not collected_row or not collected_row['total']:
+                    result['status'] = STATUS_NO_PAYMENTS
+                    continue
+
+                total_collected = collected_row['total']
+                instructor_pool = total_collected * INSTRUCTOR_SHARE
+                result['total_collected'] = total_collected
+                result['student_count'] = collected_row['student_count']
+                result['instructor_pool'] = instructor_pool
+                result['federation'] = MonthlyFederationPayment(
+                    class_type=class_type,
+                    month=month_date,
+                    total_payment_collected=total_collected,
+                    federation_share_amount=total_collected * FEDERATION_SHARE,
+                )
+
+                if not result['total_sessions']:
+                    result['status'] = STATUS_NO_SESSIONS
+                    continue
+
+                # Per-assignment share (NOT per-session) for each role
+                rows = assignment_counts.get(key, [])
+                for role, role_share in ROLE_SHARES.items():
+                    role_total = sum(row['count'] for row in rows if row['role'] == role)
+                    result['share_per_assignment'][role] = (
+                        instructor_pool * role_share / role_total if role_total else Decimal('0.00')
+                    )
+                    result['assignment_totals'][role] = role_total
+
+                for row in rows:
+                    share = result['share_per_assignment'][row['role']]
+                    result['instructors'].append(MonthlyInstructorPayment(
+                        instructor_id=row['instructor_id'],
+                        class_type=class_type,
+                        month=month_date,
+                        role=row['role'],
+                        total_classes=row['count'],
+                        total_payment_collected=total_collected,
+                        instructor_share_amount=share * row['count'],
+                    ))
+        return results
+
+    @staticmethod
+    def _keys_filter(results):
+        keys = Q(pk__in=[])
+        for result in results:
+            keys |= Q(class_type=result['class_type'], month=result['month'])
+        return keys
+
+    def prune_stale(self, results):
+        """Шинэ тооцоонд ороогүй мөрүүдийг устгах - түгжигдсэн сар хөндөгдөхгүй"""
+        unlocked = [result for result in results if result['status'] != STATUS_LOCKED]
+        MonthlyFederationPayment.objects.filter(self._keys_filter(
+            result for result in unlocked if not result['federation']
+        )).delete()
+
+        stale_instructors = Q(pk__in=[])
+        for result in unlocked:
+            stale = Q(class_type=result['class_type'], month=result['month'])
+            for payment in result['instructors']:
+                stale &= ~Q(instructor_id=payment.instructor_id, role=payment.role)
+            stale_instructors |= stale
+        MonthlyInstructorPayment.objects.filter(stale_instructors).delete()
+
+    def write(self, results):
+        """Тооцоолсон мөрүүдийг нэг transaction дотор upsert хийх"""
+        federation_payments = [result['federation'] for result in results if result['federation']]
+        instructor_payments = [payment for result in results for payment in result['instructors']]
+
+        with transaction.atomic():
+            if self.recalculate:
+                # Recalculate mode replaces previous rows, including paid/linked ones
+                MonthlyFederationPayment.objects.filter(self._keys_filter(
+                    result for result in results if result['federation']
+                )).delete()
+                MonthlyInstructorPayment.objects.filter(self._keys_filter(
+                    result for result in results if result['status'] == STATUS_CALCULATED
+                )).delete()
+
+            elif self.prune:
+                self.prune_stale(results)
+
+            MonthlyFederationPayment.objects.bulk_create(
+                federation_payments,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['class_type', 'month'],
+                update_fields=['total_payment_collected', 'federation_share_amount', 'updated_at'],
+            )
+            MonthlyInstructorPayment.objects.bulk_create(
+                instructor_payments,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['instructor', 'class_type', 'month', 'role'],
+                update_fields=['total_classes', 'total_payment_collected', 'instructor_share_amount', 'updated_at'],
+            )
+        # bulk_create нь signal илгээдэггүй
+        caching.invalidate(caching.MONTHLY_REPORT)
+        return len(federation_payments), len(instructor_payments)
+
+    def run(self, first_month, last_month=None, class_types=None):
+        """Сарын мужийг тооцоолж бичих"""
+        months = month_range(first_month, last_month or first_month)
+        if class_types is None:
+            class_types = list(ClassType.objects.all())
+        results = self.compute(months, class_types)
+        self.write(results)
+        return results
+
+    def run_pairs(self, pairs):
+        """Зөвхөн өгөгдсөн (class_type_id, month) хосуудыг тооцоолж бичих"""
+        pairs = {(class_type_id, date(month.year, month.month, 1)) for class_type_id, month in pairs}
+        if not pairs:
+            return []
+        months = sorted({month for _, month in pairs})
+        class_types = list(ClassType.objects.filter(pk__in={class_type_id for class_type_id, _ in pairs}))
+        results = [
+            result for result in self.compute(month_range(months[0], months[-1]), class_types)
+            if (result['class_type'].pk, result['month']) in pairs
+        ]
+        self.write(results)
+        return results
+
+
+def mark_payroll_dirty(pairs):
+    """(class_type_id, date) хосуудыг дахин тооцоолох дараалалд нэмэх (давхардвал marked_at шинэчлэгдэнэ)"""
+    now = timezone.now()
+    dirty = {
+        (class_type_id, date(month.year, month.month, 1))
+        for class_type_id, month in pairs
+        if class_type_id and month
+    }
+    if dirty:
+        PayrollDirtyMonth.objects.bulk_create(
+            [PayrollDirtyMonth(class_type_id=class_type_id, month=month, marked_at=now) for class_type_id, month in dirty],
+            update_conflicts=True,
+            unique_fields=['class_type', 'month'],
+            update_fields=['marked_at'],
+        )
@@ -0,0 +1,75 @@
+"""
+Сар, жилийн огнооны хүрээ
+- MonthRange нь [start, end) хүрээ - шүүлтүүр нь `field >= start AND field < end` тул индекс ашиглана
+- PeriodQuerySet.for_month()/for_year() нь model-ийн PERIOD_FIELD талбараар шүүнэ
+  (__year/__month lookup нь SQLite дээр strftime() болж индекс ашиглахгүй)
+"""
+from datetime import date
+
+from django.db import models
+from django.db.models import Q
+
+
+def next_month(month_date):
+    if month_date.month == 12:
+        return date(month_date.year + 1, 1, 1)
+    return date(month_date.year, month_date.month + 1, 1)
+
+
+class MonthRange:
+    """Хагас нээлттэй огнооны хүрээ [start, end)"""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def month(cls, value):
+        """Огноо эсвэл 'YYYY-MM' текстийн сар (буруу текст бол ValueError)"""
+        if isinstance(value, str):
+            year, month = map(int, value.split('-')[:2])
+            value = date(year, month, 1)
+        start = date(value.year, value.month, 1)
+        return cls(start, next_month(start))
+
+    @classmethod
+    def year(cls, year):
+        year = int(year)
+        return cls(date(year, 1, 1), date(year + 1, 1, 1))
+
+    def months(self):
+        """Хүрээнд орох сарын эхний өдрүүд"""
+        months = []
+        current = date(self.start.year, self.start.month, 1)
+        while current < self.end:
+            months.append(current)
+            current = next_month(current)
+        return months
+
+    def q(self, field):
+        return Q(**{f'{field}__gte': self.start, f'{field}__lt': self.end})
+
+    def __contains__(self, value):
+        return self.start <= value < self.end
+
+    def __eq__(self, other):
+        return isinstance(other, MonthRange) and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self):
+        return hash((self.start, self.end))
+
+    def __repr__(self):
+        return f'MonthRange({self.start}, {self.end})'
+
+
+class PeriodQuerySet(models.QuerySet):
+    """Model-ийн PERIOD_FIELD (эсвэл өгсөн field)-ээр сар, жилийн хүрээгээр шүүх"""
+
+    def in_period(self, period, field=None):
+        return self.filter(period.q(field or self.model.PERIOD_FIELD))
+
+    def for_month(self, value, field=None):
+        return self.in_period(MonthRange.month(value), field)
+
+    def for_year(self, year, field=None):
+        return self.in_period(MonthRange.year(year), field)
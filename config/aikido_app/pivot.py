@@ -0,0 +1,329 @@
+"""
+Төлбөрийн pivot хүснэгт (сурагч × сар) - GROUP BY query-ээр бүтээж, жилээр cache-лэнэ
+"""
+import hashlib
+import json
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Max, Q, Sum
+
+from . import caching
+from .models import Attendance, PaymentAllocation, PaymentCellComment, Student
+from .periods import MonthRange
+
+
+NO_CLASS_GROUP = 'Ангигүй'
+
+# Өнгөрсөн жилүүд бараг өөрчлөгддөггүй; одоогийн жилийг олон process-той үед богино хугацаагаар хадгална
+PAST_YEAR_TIMEOUT = 60 * 60 * 24
+CURRENT_YEAR_TIMEOUT = 60 * 5
+
+# Хуудас анх ачаалахад анги бүрээс харуулах мөр, дараагийн хэсэг бүрийн хэмжээ
+PIVOT_PAGE_SIZE = 50
+MAX_PIVOT_PAGE_SIZE = 200
+
+YEARS_KEY = 'years'
+STAMP_KEY = 'stamp'
+
+
+def invalidate_payment_pivot(*years):
+    """Тухайн жилүүдийн pivot cache болон ETag-ийн тэмдгийг устгах"""
+    years = [year for year in set(years) if year]
+    caching.delete(caching.PAYMENT_PIVOT, *[(year,) for year in years], *[(STAMP_KEY, year) for year in years])
+
+
+def invalidate_all_payment_pivots():
+    """Сурагчийн мэдээлэл өөрчлөгдөхөд бүх жилийн pivot-ийг хүчингүй болгох"""
+    caching.invalidate(caching.PAYMENT_PIVOT)
+
+
+def invalidate_payment_years():
+    caching.delete(caching.PAYMENT_PIVOT, (YEARS_KEY,))
+
+
+def _empty_cell(month):
+    return {
+        'amount': 0,
+        'date': None,
+        'allocations': [],
+        'allocations_json': '[]',
+        'total_attendance': 0,
+        'actual_attendance': 0,
+        'comments': [],
+        'highlight_color': '',
+        'month_str': month.strftime('%Y-%m-%d'),
+        'has_data': False,
+    }
+
+
+def build_payment_pivot(year):
+    """
+    Жилийн pivot хүснэгтийг бүтээх
+    - ирц болон төлбөрийн нийлбэрийг (student, month)-ээр GROUP BY хийж авна
+    - бусад мэдээллийг values() ашиглан model instance үүсгэлгүй уншина
+    """
+    period = MonthRange.year(year)
+    months = [date(year, month, 1) for month in range(1, 13)]
+
+    # Attendance counts per (student, month)
+    attendance_counts = defaultdict(dict)
+    attendance_rows = Attendance.objects.filter(is_present=True).in_period(period).values_list('student_id', 'session__date__month').annotate(count=Count('id')).order_by()
+    for student_id, month_number, count in attendance_rows:
+        attendance_counts[student_id][date(year, month_number, 1)] = count
+
+    # Allocation sums per (student, payment_month)
+    year_allocations = PaymentAllocation.objects.in_period(period)
+    allocation_totals = defaultdict(dict)
+    summary_amount = Decimal('0.00')
+    summary_count = 0
+    for row in year_allocations.values('student_id', 'payment_month').annotate(
+        amount=Sum('amount'),
+        count=Count('id'),
+        total_attendance=Sum('attendance_count'),
+    ).order_by():
+        allocation_totals[row['student_id']][row['payment_month']] = row
+        summary_amount += row['amount']
+        summary_count += row['count']
+
+    # Allocation details for the cell modal (amount, date, comment, color)
+    allocation_details = defaultdict(lambda: defaultdict(list))
+    first_payment_dates = {}
+    for allocation_id, student_id, payment_month, amount, attendance_count, comment, color, transaction_date in (
+        year_allocations.order_by('id').values_list(
+            'id', 'student_id', 'payment_month', 'amount', 'attendance_count',
+            'comment', 'highlight_color', 'bank_transaction__transaction_date',
+        )
+    ):
+        first_payment_dates.setdefault((student_id, payment_month), transaction_date)
+        allocation_details[student_id][payment_month].append({
+            'id': allocation_id,
+            'amount': float(amount),
+            'date': transaction_date.strftime('%Y-%m-%d') if transaction_date else None,
+            'attendance_count': attendance_count,
+            'comment': comment or '',
+            'highlight_color': color or '',
+        })
+
+    cell_comments = {
+        (student_id, month): {'comment': comment, 'highlight_color': color}
+        for student_id, month, comment, color in PaymentCellComment.objects.filter(
+            period.q('month')
+        ).values_list('student_id', 'month', 'comment', 'highlight_color')
+    }
+
+    # Students grouped by class type
+    students = list(Student.objects.order_by('first_name', 'last_name').values(
+        'id', 'first_name', 'last_name', 'phone', 'is_fee_exempt'
+    ))
+    student_class_names = defaultdict(list)
+    for student_id, class_name in Student.class_types.through.objects.values_list(
+        'student_id', 'classtype__name'
+    ):
+        student_class_names[student_id].append(class_name)
+
+    class_groups = defaultdict(list)
+    for student in students:
+        for class_name in student_class_names.get(student['id']) or [NO_CLASS_GROUP]:
+            class_groups[class_name].append(student)
+
+    def build_cell(student_id, month):
+        totals = allocation_totals.get(student_id, {}).get(month)
+        actual_attendance = attendance_counts.get(student_id, {}).get(month, 0)
+        cell_comment = cell_comments.get((student_id, month))
+        cell = _empty_cell(month)
+
+        if totals or actual_attendance:
+            allocations = allocation_details.get(student_id, {}).get(month, [])
+            cell.update({
+                'amount': totals['amount'] if totals else 0,
+                'date': first_payment_dates.get((student_id, month)),
+                'allocations': allocations,
+                'allocations_json': json.dumps(allocations) if allocations else '[]',
+                'total_attendance': (totals['total_attendance'] or 0) if totals else 0,
+                'actual_attendance': actual_attendance,
+                'comments': [a['comment'] for a in allocations if a['comment']],
+                'highlight_color': next((a['highlight_color'] for a in allocations if a['highlight_color']), ''),
+                'has_data': True,
+            })
+
+        if cell_comment:
+            # Cell comment overrides allocation-based color/comment
+            if cell_comment['highlight_color']:
+                cell['highlight_color'] = cell_comment['highlight_color']
+            if cell_comment['comment']:
+                cell['comments'] = cell['comments'] + [cell_comment['comment']]
+            cell['has_data'] = True
+        return cell
+
+    groups = []
+    for class_name in sorted(class_groups.keys()):
+        group_students = class_groups[class_name]
+        rows = []
+        group_month_stats = [
+            {'total': 0, 'with_attendance': 0, 'with_payment': 0, 'fee_exempt': 0, 'should_pay': 0}
+            for _ in months
+        ]
+        students_with_attendance = set()
+        students_with_payment = set()
+        fee_exempt_students = set()
+
+        for student in group_students:
+            if student['is_fee_exempt']:
+                fee_exempt_students.add(student['id'])
+
+            row = {'student': student, 'months': [], 'row_total': 0}
+            for index, month in enumerate(months):
+                cell = build_cell(student['id'], month)
+                row['months'].append(cell)
+                row['row_total'] += cell['amount']
+
+                stats = group_month_stats[index]
+                stats['total'] += cell['amount']
+                if cell['actual_attendance'] > 0:
+                    students_with_attendance.add(student['id'])
+                    stats['with_attendance'] += 1
+                    if cell['amount'] > 0:
+                        stats['with_payment'] += 1
+                    if student['is_fee_exempt']:
+                        stats['fee_exempt'] += 1
+                    elif cell['amount'] == 0:
+                        stats['should_pay'] += 1
+                if cell['amount'] > 0:
+                    students_with_payment.add(student['id'])
+            rows.append(row)
+
+        groups.append({
+            'class_name': class_name,
+            'rows': rows,
+            'group_total': sum(row['row_total'] for row in rows),
+            'group_column_totals': [stats['total'] for stats in group_month_stats],
+            'month_statistics': group_month_stats,
+            'months_with_stats': list(zip(months, group_month_stats)),
+            'statistics': {
+                'total_students': len(group_students),
+                'students_with_attendance': len(students_with_attendance),
+                'students_with_payment': len(students_with_payment),
+                'fee_exempt_students': len(fee_exempt_students),
+            }
+        })
+
+    column_totals = []
+    for month in months:
+        column_totals.append(sum(
+            month_totals[month]['amount']
+            for month_totals in allocation_totals.values()
+            if month in month_totals
+        ))
+
+    return {
+        'groups': groups,
+        'months': months,
+        'column_totals': column_totals,
+        'summary': {
+            'total_amount': summary_amount if summary_count else None,
+            'total_count': summary_count,
+        },
+    }
+
+
+def get_payment_pivot(year):
+    """Cache-ээс pivot авах, байхгүй бол бүтээж хадгалах"""
+    timeout = CURRENT_YEAR_TIMEOUT if year >= date.today().year else PAST_YEAR_TIMEOUT
+    return caching.get_or_build(caching.PAYMENT_PIVOT, (year,), lambda: build_payment_pivot(year), timeout)
+
+
+def get_payment_years():
+    """Төлбөр бүртгэгдсэн жилүүд (cache-лэгдсэн)"""
+    return caching.get_or_build(
+        caching.PAYMENT_PIVOT, (YEARS_KEY,),
+        lambda: sorted(
+            {d.year for d in PaymentAllocation.objects.dates('payment_month', 'year')},
+            reverse=True
+        ),
+        PAST_YEAR_TIMEOUT,
+    )
+
+
+def window_groups(pivot, limit=PIVOT_PAGE_SIZE):
+    """Анги бүрийн эхний limit мөр - үлдсэнийг group_rows()-оор хэсэгчлэн ачаална"""
+    groups = []
+    for group in pivot['groups']:
+        window = dict(group, rows=group['rows'][:limit])
+        window['remaining'] = len(group['rows']) - len(window['rows'])
+        groups.append(window)
+    return groups
+
+
+def group_rows(pivot, class_name, offset=0, limit=PIVOT_PAGE_SIZE):
+    """
+    Нэг ангийн [offset, offset + limit) мөрүүд
+    Returns: (rows, remaining) - анги олдохгүй бол ([], 0)
+    """
+    limit = max(1, min(limit, MAX_PIVOT_PAGE_SIZE))
+    offset = max(0, offset)
+    for group in pivot['groups']:
+        if group['class_name'] == class_name:
+            rows = group['rows'][offset:offset + limit]
+            return rows, max(0, len(group['rows']) - offset - len(rows))
+    return [], 0
+
+
+def pivot_etag(year):
+    """
+    Жилийн pivot-ийн ETag - pivot бүтээхээс хамаагүй хямд (3 aggregate query)
+    - PaymentAllocation, Attendance, PaymentCellComment-ийн тоо, сүүлийн id, сүүлд үүсгэсэн/шинэчилсэн огноо
+    - signals-ээр pivot хүчингүй болох бүрт солигдох тэмдэг ба namespace-ийн хувилбар (сурагчийн нэр, анги гэх мэт)
+    Тэмдэг cache-д хадгалагддаг тул cache бүх worker-т нийтлэг биш (LocMem) бол None - ETag ашиглахгүй,
+    эс тэгвээс өөр worker дээр хийсэн өөрчлөлтийг мэдэхгүй worker хуучин хувилбарт 304 буцаана
+    """
+    if not caching.is_shared():
+        return None
+    period = MonthRange.year(year)
+    stamp = caching.get_or_build(caching.PAYMENT_PIVOT, (STAMP_KEY, year), time.time_ns, None)
+    parts = [year, caching.namespace_version(caching.PAYMENT_PIVOT), stamp]
+    parts.extend(PaymentAllocation.objects.in_period(period).aggregate(
+        count=Count('id'), last_id=Max('id'), latest=Max('created_at'),
+        amount=Sum('amount'), attendance=Sum('attendance_count'),
+    ).values())
+    parts.extend(Attendance.objects.in_period(period).aggregate(
+        count=Count('id'), present=Count('id', filter=Q(is_present=True)),
+        last_id=Max('id'), latest=Max('recorded_at'),
+    ).values())
+    parts.extend(PaymentCellComment.objects.filter(period.q('month')).aggregate(
+        count=Count('id'), latest=Max('updated_at'),
+    ).values())
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def pivot_as_json(year, pivot):
+    """Pivot-ийг JSON хэлбэрт (allocations_json-гүй - allocations нь аль хэдийн жагсаалт)"""
+    return {
+        'year': year,
+        'months': pivot['months'],
+        'column_totals': pivot['column_totals'],
+        'summary': pivot['summary'],
+        'groups': [
+            {
+                'class_name': group['class_name'],
+                'group_total': group['group_total'],
+                'group_column_totals': group['group_column_totals'],
+                'month_statistics': group['month_statistics'],
+                'statistics': group['statistics'],
+                'rows': [
+                    {
+                        'student': row['student'],
+                        'row_total': row['row_total'],
+                        'months': [
+                            {key: value for key, value in cell.items() if key != 'allocations_json'}
+                            for cell in row['months']
+                        ],
+                    }
+                    for row in group['rows']
+                ],
+            }
+            for group in pivot['groups']
+        ],
+    }
@@ -0,0 +1,183 @@
+"""
+Хүсэлтийн профайл - aikido_app-ийн view бүрийн query тоо, DB хугацаа, давхардсан query, нийт хугацаа
+- settings.PROFILING_ENABLED=False үед middleware огт ачаалагдахгүй (MiddlewareNotUsed)
+- хүсэлт бүр PROFILING_LOG_FILE-д нэг JSON мөр (RotatingFileHandler)
+- summarize() нь лог файлуудаас URL нэр бүрийн p50/p95 хугацаа, дундаж query тоог тооцно
+"""
+import hashlib
+import json
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+LOGGER_NAME = 'aikido_app.profiling'
+
+# Нэг хүсэлтэд хадгалах давхардсан query-ний дээд тоо
+MAX_DUPLICATES = 5
+
+# Профайлд оруулахгүй view-ууд (хураангуй хуудас өөрөө)
+IGNORED_URL_NAMES = {'profiling_summary'}
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def log_path():
+    return Path(getattr(settings, 'PROFILING_LOG_FILE', Path(settings.BASE_DIR) / 'logs' / 'profiling.log'))
+
+
+def _configure_logger():
+    """Лог файлын RotatingFileHandler-ийг нэг удаа холбох"""
+    if logger.handlers:
+        return
+    path = log_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=getattr(settings, 'PROFILING_LOG_MAX_BYTES', 5 * 1024 * 1024),
+        backupCount=getattr(settings, 'PROFILING_LOG_BACKUP_COUNT', 3),
+        encoding='utf-8',
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def fingerprint(sql):
+    """Параметргүй SQL-ийн хээ - ижил хээтэй query олон удаа ажиллавал N+1 байж магадгүй"""
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """connection.execute_wrapper - query бүрийн SQL загвар болон хугацааг цуглуулна"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def duplicates(self):
+        counts = Counter(sql for sql, _ in self.queries)
+        return [
+            {'fingerprint': fingerprint(sql), 'count': count, 'sql': sql[:200]}
+            for sql, count in counts.most_common(MAX_DUPLICATES)
+            if count > 1
+        ]
+
+
+class ProfilingMiddleware:
+    """aikido_app-ийн view бүрийн хүсэлтийг хэмжиж лог файлд бичнэ"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _configure_logger()
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.func.__module__.startswith('config.aikido_app'):
+            return response
+        if match.url_name in IGNORED_URL_NAMES:
+            return response
+
+        logger.info(json.dumps({
+            'ts': round(time.time(), 3),
+            'url_name': match.url_name or match.view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall_time * 1000, 2),
+            'db_ms': round(sum(duration for _, duration in recorder.queries) * 1000, 2),
+            'queries': len(recorder.queries),
+            'duplicates': recorder.duplicates(),
+        }, ensure_ascii=False))
+        return response
+
+
+def read_records(path=None):
+    """Лог болон rotate хийгдсэн файлуудын бичлэгүүд (эвдэрсэн мөрийг алгасна)"""
+    path = Path(path or log_path())
+    files = [path] + [path.with_name(f'{path.name}.{index}') for index in range(1, 100)]
+    records = []
+    for file in files:
+        if not file.exists():
+            if file != path:
+                break
+            continue
+        with open(file, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile (эрэмбэлсэн жагсаалт)"""
+    if not values:
+        return 0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(records):
+    """
+    URL нэр бүрийн хураангуй
+    Returns: [{'url_name', 'count', 'p50_ms', 'p95_ms', 'max_ms', 'avg_db_ms', 'avg_queries', 'max_queries',
+              'duplicate_requests', 'top_duplicates'}]
+    """
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record.get('url_name')].append(record)
+
+    summary = []
+    for url_name, view_records in by_view.items():
+        wall_times = sorted(record['wall_ms'] for record in view_records)
+        query_counts = [record['queries'] for record in view_records]
+        duplicates = Counter()
+        duplicate_sql = {}
+        for record in view_records:
+            for duplicate in record.get('duplicates', []):
+                duplicates[duplicate['fingerprint']] += duplicate['count']
+                duplicate_sql[duplicate['fingerprint']] = duplicate['sql']
+        count = len(view_records)
+        summary.append({
+            'url_name': url_name,
+            'count': count,
+            'p50_ms': percentile(wall_times, 0.50),
+            'p95_ms': percentile(wall_times, 0.95),
+            'max_ms': wall_times[-1],
+            'avg_db_ms': round(sum(record['db_ms'] for record in view_records) / count, 2),
+            'avg_queries': round(sum(query_counts) / count, 1),
+            'max_queries': max(query_counts),
+            'duplicate_requests': sum(1 for record in view_records if record.get('duplicates')),
+            'top_duplicates': [
+                {'fingerprint': key, 'count': total, 'sql': duplicate_sql[key]}
+                for key, total in duplicates.most_common(3)
+            ],
+        })
+    return summary
@@ -0,0 +1,91 @@
+"""
+Ашиг, алдагдлын тайлан (P&L) - олон жилийн сар × ангиллын хүснэгт
+- MonthlyRollup-ээс нэг query-ээр уншина, allocation хүснэгтүүдийг огт уншихгүй
+- MonthlyRollup-ийг ledger.schedule_rollups() хуваарилалт, импорт бүрийн transaction commit хийгдэхэд шинэчилнэ
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from .models import LedgerEntry, MonthlyRollup
+from .periods import MonthRange
+
+
+# Нэг хуудсанд харуулах хамгийн олон жил
+MAX_YEARS = 10
+
+DIRECTIONS = (
+    (LedgerEntry.INCOME, 'Орлого'),
+    (LedgerEntry.EXPENSE, 'Зарлага'),
+)
+
+ZERO = Decimal('0.00')
+
+
+def rollup_years():
+    """Нэгтгэл байгаа жилүүд (шинээс нь)"""
+    return sorted({d.year for d in MonthlyRollup.objects.dates('month', 'year')}, reverse=True)
+
+
+def rollups_missing():
+    """LedgerEntry байгаа ч MonthlyRollup хоосон - rebuild_ledger ажиллуулах шаардлагатай"""
+    return not MonthlyRollup.objects.exists() and LedgerEntry.objects.exists()
+
+
+def profit_loss_grid(start_year, end_year):
+    """
+    [start_year, end_year] жилүүдийн P&L хүснэгт
+    Returns: {'years': [{'year', 'months', 'sections', 'net', 'net_total'}], 'summary': {...}}
+    """
+    end_year = min(end_year, start_year + MAX_YEARS - 1)
+    period = MonthRange(date(start_year, 1, 1), date(end_year + 1, 1, 1))
+
+    totals = defaultdict(dict)
+    for month, direction, category, total in MonthlyRollup.objects.in_period(period).values_list(
+        'month', 'direction', 'category', 'total'
+    ):
+        totals[(direction, category)][month] = total
+
+    summary = {LedgerEntry.INCOME: ZERO, LedgerEntry.EXPENSE: ZERO}
+    years = []
+    for year in range(end_year, start_year - 1, -1):
+        months = MonthRange.year(year).months()
+        sections = []
+        section_totals = {}
+        for direction, label in DIRECTIONS:
+            rows = []
+            for (row_direction, category), by_month in sorted(totals.items()):
+                if row_direction != direction:
+                    continue
+                cells = [by_month.get(month, ZERO) for month in months]
+                if any(cells):
+                    rows.append({'category': category, 'cells': cells, 'total': sum(cells, ZERO)})
+            month_totals = [sum((row['cells'][index] for row in rows), ZERO) for index in range(len(months))]
+            section_totals[direction] = month_totals
+            total = sum(month_totals, ZERO)
+            summary[direction] += total
+            sections.append({
+                'direction': direction, 'label': label, 'rows': rows,
+                'month_totals': month_totals, 'total': total,
+            })
+
+        net = [
+            income - expense
+            for income, expense in zip(section_totals[LedgerEntry.INCOME], section_totals[LedgerEntry.EXPENSE])
+        ]
+        years.append({
+            'year': year,
+            'months': months,
+            'sections': sections,
+            'net': net,
+            'net_total': sum(net, ZERO),
+        })
+
+    return {
+        'years': years,
+        'summary': {
+            'income': summary[LedgerEntry.INCOME],
+            'expense': summary[LedgerEntry.EXPENSE],
+            'net': summary[LedgerEntry.INCOME] - summary[LedgerEntry.EXPENSE],
+        },
+    }
@@ -0,0 +1,176 @@
+"""
+Зэрэг цол олноор ахиулах (шалгалт, семинарын дараа)
+- мөрүүдийг маягт эсвэл CSV-ээс уншиж, сурагчдыг нэг in_bulk-аар ачаална
+- бүх мөрийг model-ийн clean() дүрмээр санах ойд шалгана
+- шинэ зэргүүдийг нэг bulk_update, өмнөх зэргийн RankHistory-г нэг bulk_create-ээр бичнэ
+- RankTrackingMixin.save()-тэй ижил түүх үүсгэнэ (зөвхөн зэрэг өөрчлөгдсөн, өмнө зэрэгтэй хүмүүст)
+"""
+import csv
+import io
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import RankHistory, Student
+
+
+RANK_TYPES = ('kyu', 'dan')
+RANK_TYPE_ALIASES = {'kyu': 'kyu', 'кюү': 'kyu', 'кю': 'kyu', 'dan': 'dan', 'дан': 'dan'}
+
+# Маягтын сонголт: ('kyu-8', '8 кюү') ... ('dan-8', '8 дан')
+RANK_OPTIONS = (
+    [(f'kyu-{number}', label) for number, label in reversed(Student.KYU_CHOICES)]
+    + [(f'dan-{number}', label) for number, label in Student.DAN_CHOICES]
+)
+
+
+def parse_rank(value):
+    """'kyu-4', '4 kyu', '4 кюү', '1 дан' -> ('kyu', 4), буруу бол ValueError"""
+    parts = str(value).strip().lower().replace('-', ' ').split()
+    if len(parts) != 2:
+        raise ValueError(value)
+    number, rank_type = parts if parts[0].isdigit() else reversed(parts)
+    if rank_type not in RANK_TYPE_ALIASES or not number.isdigit():
+        raise ValueError(value)
+    return RANK_TYPE_ALIASES[rank_type], int(number)
+
+
+def form_rows(post):
+    """POST-ийн student_id[] / new_rank[] жагсаалтаас мөрүүд - зэрэг сонгоогүй мөрийг алгасна"""
+    rows = []
+    for index, (student_id, rank) in enumerate(zip(post.getlist('student_id[]'), post.getlist('new_rank[]')), 1):
+        if student_id.strip() and rank.strip():
+            rows.append({'index': index, 'student': student_id.strip(), 'rank': rank.strip()})
+    return rows
+
+
+def csv_rows(uploaded_file):
+    """
+    CSV: сурагчийн ID, шинэ зэрэг ('4 kyu', '1 дан' гэх мэт) - толгой мөр байж болно
+    Буруу кодчилолтой файл бол ValidationError
+    """
+    try:
+        text = uploaded_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValidationError('CSV файл UTF-8 кодчилолтой байх ёстой')
+    rows = []
+    for index, line in enumerate(csv.reader(io.StringIO(text)), 1):
+        cells = [cell.strip() for cell in line]
+        if len(cells) < 2 or not any(cells):
+            continue
+        if index == 1 and not cells[0].isdigit():
+            continue  # толгой мөр
+        rows.append({'index': index, 'student': cells[0], 'rank': cells[1]})
+    return rows
+
+
+def build_promotions(rows, model=Student):
+    """
+    Мөрүүдийг (хүн, зэргийн төрөл, дугаар) болгох - хүмүүсийг нэг in_bulk-аар ачаална
+    Алдаатай мөр байвал ValidationError(бүх алдааны жагсаалт)
+    """
+    errors = []
+    parsed = []
+    for row in rows:
+        try:
+            person_id = int(row['student'])
+        except ValueError:
+            errors.append(f'{row["index"]}-р мөр: ID буруу ({row["student"]})')
+            continue
+        try:
+            rank_type, rank_number = parse_rank(row['rank'])
+        except ValueError:
+            errors.append(f'{row["index"]}-р мөр: зэрэг буруу ({row["rank"]})')
+            continue
+        parsed.append((row, person_id, rank_type, rank_number))
+
+    people = model.objects.in_bulk({person_id for _, person_id, _, _ in parsed})
+    promotions = []
+    for row, person_id, rank_type, rank_number in parsed:
+        if person_id not in people:
+            errors.append(f'{row["index"]}-р мөр: #{person_id} олдсонгүй')
+            continue
+        promotions.append((people[person_id], rank_type, rank_number))
+
+    if errors:
+        raise ValidationError(errors)
+    if not promotions:
+        raise ValidationError('Ахиулах мөр алга')
+    return promotions
+
+
+def _missing_snapshots(model, people):
+    """only()/defer()-ээр ачаалсан эсвэл гараар үүсгэсэн instance-уудын зэргийг нэг query-ээр уншина"""
+    missing = [person.pk for person in people if getattr(person, '_rank_snapshot', None) is None]
+    if not missing:
+        return {}
+    fields = people[0]._rank_snapshot_fields()
+    return {
+        row.pop('pk'): row
+        for row in model._base_manager.filter(pk__in=missing).values('pk', *fields)
+    }
+
+
+def promote_ranks(promotions, rank_date, notes=''):
+    """
+    promotions: [(Student эсвэл Instructor, 'kyu'/'dan', зэргийн дугаар)] - бүгд нэг model-ийнх
+    Returns: (шинэчилсэн хүний тоо, үүссэн түүхийн тоо)
+    Алдаатай мөр байвал юу ч бичихгүй, ValidationError(алдааны жагсаалт)
+    """
+    promotions = list(promotions)
+    if not promotions:
+        return 0, 0
+    model = type(promotions[0][0])
+
+    errors = []
+    seen = set()
+    for person, rank_type, rank_number in promotions:
+        if type(person) is not model:
+            errors.append(f'{person}: нэг удаад зөвхөн {model._meta.verbose_name_plural} ахиулна')
+        elif person.pk is None:
+            errors.append(f'{person}: хадгалаагүй бичлэг')
+        elif person.pk in seen:
+            errors.append(f'{person}: давхардсан')
+        seen.add(person.pk)
+        choices = dict(model.KYU_CHOICES if rank_type == 'kyu' else model.DAN_CHOICES)
+        if rank_type not in RANK_TYPES:
+            errors.append(f'{person}: зэргийн төрөл буруу ({rank_type})')
+        elif rank_number not in choices:
+            errors.append(f'{person}: зэрэг буруу ({rank_number} {rank_type})')
+    if errors:
+        raise ValidationError(errors)
+
+    people = [person for person, _, _ in promotions]
+    loaded = _missing_snapshots(model, people)
+
+    originals = [tuple(getattr(person, field) for field in model.RANK_FIELDS) for person in people]
+    history = []
+    for person, rank_type, rank_number in promotions:
+        previous = loaded.get(person.pk) or person.loaded_ranks()
+        person.kyu_rank = rank_number if rank_type == 'kyu' else None
+        person.dan_rank = rank_number if rank_type == 'dan' else None
+        person.current_rank_date = rank_date
+        # Маягтаар засахтай ижил дүрэм (кюү/дан хоёулаа биш, огноотой гэх мэт)
+        try:
+            person.clean()
+        except ValidationError as error:
+            errors.append(f'{person}: {"; ".join(error.messages)}')
+        entry = person.rank_history_entry(previous)
+        if entry is not None:
+            if notes:
+                entry.notes = f'{entry.notes} ({notes})'
+            history.append(entry)
+
+    if errors:
+        for person, values in zip(people, originals):
+            for field, value in zip(model.RANK_FIELDS, values):
+                setattr(person, field, value)
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        model.objects.bulk_update(people, model.RANK_FIELDS)
+        RankHistory.objects.bulk_create(history)
+
+    for person in people:
+        person._take_rank_snapshot()
+    return len(people), len(history)
@@ -0,0 +1,279 @@
+"""
+Model signal-ууд - денормальчилсан талбарууд болон cache-ийг шинэчлэх
+"""
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+
+from . import ledger
+from .allocations import adjust_allocated_amount
+from .auto_match import invalidate_student_index
+from .dashboard import invalidate_dashboard
+from .instructor_stats import invalidate_instructor_stats
+from .models import (
+    BANK_ALLOCATION_MODELS, Attendance, BankTransaction, ClassSession, ExpenseAllocation, ExpenseCategory,
+    IncomeAllocation, IncomeCategory, Instructor, InstructorAssignment, InstructorPaymentAllocation,
+    MonthlyFederationPayment, MonthlyInstructorPayment, Payment, PaymentAllocation, PaymentCellComment, Student
+)
+from .monthly_report import invalidate_monthly_report
+from .payroll import mark_payroll_dirty
+from .pivot import invalidate_all_payment_pivots, invalidate_payment_pivot, invalidate_payment_years
+
+
+def _amount(value):
+    return Decimal(str(value)) if value is not None else Decimal('0.00')
+
+
+def allocation_pre_save(sender, instance, **kwargs):
+    """Засварлах үед хуучин утгуудыг хадгалж авах"""
+    instance._allocation_snapshot = None
+    if not instance._state.adding and instance.pk:
+        instance._allocation_snapshot = sender.objects.filter(pk=instance.pk).values().first()
+
+
+def allocation_post_save(sender, instance, created, **kwargs):
+    """Allocation үүсэх/засагдах үед BankTransaction.allocated_amount шинэчлэх"""
+    direction = sender.allocation_direction
+    amount = _amount(instance.amount)
+    snapshot = getattr(instance, '_allocation_snapshot', None)
+
+    if created or snapshot is None:
+        adjust_allocated_amount(direction, instance.bank_transaction_id, amount)
+        return
+
+    old_transaction_id, old_amount = snapshot['bank_transaction_id'], snapshot['amount']
+    if old_transaction_id == instance.bank_transaction_id:
+        adjust_allocated_amount(direction, instance.bank_transaction_id, amount - _amount(old_amount))
+    else:
+        adjust_allocated_amount(direction, old_transaction_id, -_amount(old_amount))
+        adjust_allocated_amount(direction, instance.bank_transaction_id, amount)
+
+
+def allocation_post_delete(sender, instance, **kwargs):
+    """Allocation устах үед (cascade-аар ч гэсэн) BankTransaction.allocated_amount хасах"""
+    adjust_allocated_amount(sender.allocation_direction, instance.bank_transaction_id, -_amount(instance.amount))
+
+
+for allocation_model in BANK_ALLOCATION_MODELS:
+    pre_save.connect(allocation_pre_save, sender=allocation_model, dispatch_uid=f'{allocation_model.__name__}_pre_save')
+    post_save.connect(allocation_post_save, sender=allocation_model, dispatch_uid=f'{allocation_model.__name__}_post_save')
+    post_delete.connect(allocation_post_delete, sender=allocation_model, dispatch_uid=f'{allocation_model.__name__}_post_delete')
+
+
+# Төлбөрийн pivot cache (payment_list)
+
+def _year(value):
+    return value.year if value else None
+
+
+def payment_allocation_changed(sender, instance, **kwargs):
+    """Төлбөр өөрчлөгдөхөд тухайн (болон хуучин) жилийн pivot-ийг хүчингүй болгох"""
+    snapshot = getattr(instance, '_allocation_snapshot', None) or {}
+    invalidate_payment_pivot(_year(instance.payment_month), _year(snapshot.get('payment_month')))
+    invalidate_payment_years()
+    # Index-ийн өмнөх данс, сүүлд төлсөн сар төлбөрөөс хамаарна
+    invalidate_student_index()
+
+
+def attendance_changed(sender, instance, **kwargs):
+    """Ирц өөрчлөгдөхөд хичээлийн жилийн pivot-ийг хүчингүй болгох"""
+    if Attendance.session.is_cached(instance):
+        session_date = instance.session.date
+    else:
+        session_date = ClassSession.objects.filter(pk=instance.session_id).values_list('date', flat=True).first()
+    invalidate_payment_pivot(_year(session_date))
+
+
+def cell_comment_changed(sender, instance, **kwargs):
+    invalidate_payment_pivot(_year(instance.month))
+
+
+def student_changed(sender, **kwargs):
+    """Сурагчийн нэр, анги, төлбөрөөс чөлөөлөлт бүх жилд харагддаг"""
+    invalidate_all_payment_pivots()
+    invalidate_student_index()
+
+
+for signal_name, signal in (('save', post_save), ('delete', post_delete)):
+    signal.connect(payment_allocation_changed, sender=PaymentAllocation, dispatch_uid=f'pivot_allocation_{signal_name}')
+    signal.connect(attendance_changed, sender=Attendance, dispatch_uid=f'pivot_attendance_{signal_name}')
+    signal.connect(cell_comment_changed, sender=PaymentCellComment, dispatch_uid=f'pivot_cell_comment_{signal_name}')
+    signal.connect(student_changed, sender=Student, dispatch_uid=f'pivot_student_{signal_name}')
+m2m_changed.connect(student_changed, sender=Student.class_types.through, dispatch_uid='pivot_student_class_types')
+
+
+# Цалингийн дахин тооцоолол (PayrollDirtyMonth)
+
+def allocation_payroll_changed(sender, instance, **kwargs):
+    """Төлбөр өөрчлөгдөхөд сурагчийн ангиудын тухайн (болон хуучин) сарыг тэмдэглэх"""
+    snapshot = getattr(instance, '_allocation_snapshot', None) or {}
+    student_ids = {instance.student_id, snapshot.get('student_id')} - {None}
+    months = {instance.payment_month, snapshot.get('payment_month')} - {None}
+    class_type_ids = Student.class_types.through.objects.filter(
+        student_id__in=student_ids
+    ).values_list('classtype_id', flat=True)
+    mark_payroll_dirty((class_type_id, month) for class_type_id in set(class_type_ids) for month in months)
+
+
+def assignment_payroll_changed(sender, instance, **kwargs):
+    """Багшийн томилолт өөрчлөгдөхөд хичээлийн анги, сарыг тэмдэглэх"""
+    if InstructorAssignment.session.is_cached(instance):
+        session_key = (instance.session.class_type_id, instance.session.date)
+    else:
+        session_key = ClassSession.objects.filter(pk=instance.session_id).values_list('class_type_id', 'date').first()
+    if session_key:
+        mark_payroll_dirty([session_key])
+
+
+def session_pre_save(sender, instance, **kwargs):
+    """Хичээл засварлах үед хуучин анги, огноо, cancelled төлвийг хадгалах"""
+    instance._payroll_snapshot = None
+    if not instance._state.adding and instance.pk:
+        instance._payroll_snapshot = ClassSession.objects.filter(pk=instance.pk).values(
+            'class_type_id', 'date', 'is_cancelled'
+        ).first()
+
+
+def session_payroll_changed(sender, instance, created=False, **kwargs):
+    """Хичээл цуцлагдах/сэргээгдэх, эсвэл анги, огноо нь өөрчлөгдөхөд тэмдэглэх"""
+    snapshot = getattr(instance, '_payroll_snapshot', None)
+    if created:
+        return
+    if snapshot and (snapshot['class_type_id'], snapshot['date'], snapshot['is_cancelled']) == (
+        instance.class_type_id, instance.date, instance.is_cancelled
+    ):
+        return
+    pairs = [(instance.class_type_id, instance.date)]
+    if snapshot:
+        pairs.append((snapshot['class_type_id'], snapshot['date']))
+    mark_payroll_dirty(pairs)
+
+
+for signal_name, signal in (('save', post_save), ('delete', post_delete)):
+    signal.connect(allocation_payroll_changed, sender=PaymentAllocation, dispatch_uid=f'payroll_allocation_{signal_name}')
+    signal.connect(assignment_payroll_changed, sender=InstructorAssignment, dispatch_uid=f'payroll_assignment_{signal_name}')
+    signal.connect(session_payroll_changed, sender=ClassSession, dispatch_uid=f'payroll_session_{signal_name}')
+pre_save.connect(session_pre_save, sender=ClassSession, dispatch_uid='payroll_session_pre_save')
+
+
+# Хяналтын самбарын cache
+
+def dashboard_changed(sender, **kwargs):
+    invalidate_dashboard()
+
+
+for signal_name, signal in (('save', post_save), ('delete', post_delete)):
+    for dashboard_model in (Student, Instructor, ClassSession, Attendance, Payment):
+        signal.connect(
+            dashboard_changed, sender=dashboard_model,
+            dispatch_uid=f'dashboard_{dashboard_model.__name__}_{signal_name}'
+        )
+
+
+# Санхүүгийн тайлангууд (monthly_report) болон багшийн статистик
+
+FINANCIAL_MODELS = [BankTransaction, Payment, MonthlyInstructorPayment, MonthlyFederationPayment] + BANK_ALLOCATION_MODELS
+
+
+def financial_changed(sender, **kwargs):
+    invalidate_monthly_report()
+
+
+def bank_transaction_pre_save(sender, instance, update_fields=None, **kwargs):
+    """Засварлах үед хуучин огноог хадгалах - update_status() зэрэг огноо бичихгүй save-д query хийхгүй"""
+    instance._date_snapshot = None
+    if instance._state.adding or not instance.pk:
+        return
+    if update_fields is not None and 'transaction_date' not in update_fields:
+        return
+    instance._date_snapshot = BankTransaction.objects.filter(pk=instance.pk).values_list(
+        'transaction_date', flat=True
+    ).first()
+
+
+def bank_transaction_changed(sender, instance, created=False, **kwargs):
+    """
+    Гүйлгээний огноо pivot-ийн нүдэнд харагддаг - огноо өөрчлөгдсөн үед л
+    холбогдсон төлбөрүүдийн сарын жилүүдийг хүчингүй болгоно
+    Устгахад PaymentAllocation-ууд cascade-аар устаж өөрсдийн signal-аар жилээ цэвэрлэнэ
+    """
+    old_date = getattr(instance, '_date_snapshot', None)
+    if created or old_date is None or old_date == instance.transaction_date:
+        return
+    months = instance.allocations.values_list('payment_month', flat=True)
+    invalidate_payment_pivot(*{month.year for month in months})
+
+
+def instructor_stats_changed(sender, **kwargs):
+    invalidate_instructor_stats()
+
+
+for signal_name, signal in (('save', post_save), ('delete', post_delete)):
+    for financial_model in FINANCIAL_MODELS:
+        signal.connect(
+            financial_changed, sender=financial_model,
+            dispatch_uid=f'monthly_report_{financial_model.__name__}_{signal_name}'
+        )
+    for stats_model in (InstructorAssignment, ClassSession):
+        signal.connect(
+            instructor_stats_changed, sender=stats_model,
+            dispatch_uid=f'instructor_stats_{stats_model.__name__}_{signal_name}'
+        )
+pre_save.connect(bank_transaction_pre_save, sender=BankTransaction, dispatch_uid='pivot_bank_transaction_pre_save')
+post_save.connect(bank_transaction_changed, sender=BankTransaction, dispatch_uid='pivot_bank_transaction_save')
+# Сурагчийн анги солигдоход ангийн төрөл бүрийн нийлбэр өөрчлөгдөнө
+m2m_changed.connect(financial_changed, sender=Student.class_types.through, dispatch_uid='monthly_report_student_class_types')
+
+
+# Санхүүгийн нэгдсэн бүртгэл (LedgerEntry)
+
+def ledger_source_saved(sender, instance, **kwargs):
+    ledger.sync(sender, [instance.pk])
+
+
+def ledger_source_deleted(sender, instance, **kwargs):
+    ledger.remove(sender, [instance.pk])
+
+
+def ledger_bank_transaction_pre_delete(sender, instance, **kwargs):
+    """Гүйлгээ устахад бичилтүүд нь cascade-аар устана - сарын нэгтгэлд зориулж сарыг нь хадгалах"""
+    instance._ledger_months = set(instance.ledger_entries.values_list('month', flat=True))
+
+
+def ledger_bank_transaction_deleted(sender, instance, **kwargs):
+    ledger.schedule_rollups(getattr(instance, '_ledger_months', None) or ())
+
+
+def ledger_bank_transaction_saved(sender, instance, created=False, **kwargs):
+    """Огноо өөрчлөгдвөл бичилтүүдийн entry_date, семинарын сар хуучирна (_date_snapshot - bank_transaction_pre_save)"""
+    old_date = getattr(instance, '_date_snapshot', None)
+    if created or old_date is None or old_date == instance.transaction_date:
+        return
+    ledger.sync_bank_transaction(instance.pk)
+
+
+def ledger_category_changed(sender, instance, created=False, **kwargs):
+    """Ангиллын нэр солигдоход түүний бичилтүүдийг шинэчлэх"""
+    if created:
+        return
+    if sender is IncomeCategory:
+        ledger.sync(IncomeAllocation, IncomeAllocation.objects.filter(income_category=instance).values_list('pk', flat=True))
+    else:
+        ledger.sync(ExpenseAllocation, instance.allocations.values_list('pk', flat=True))
+
+
+def ledger_instructor_payment_changed(sender, instance, created=False, **kwargs):
+    """Багшийн төлбөрийн сар, багш, анги өөрчлөгдөхөд холбогдсон хуваарилалтуудыг шинэчлэх"""
+    if not created:
+        ledger.sync(InstructorPaymentAllocation, instance.allocations.values_list('pk', flat=True))
+
+
+for ledger_model in ledger.SOURCE_BY_MODEL:
+    post_save.connect(ledger_source_saved, sender=ledger_model, dispatch_uid=f'ledger_{ledger_model.__name__}_save')
+    post_delete.connect(ledger_source_deleted, sender=ledger_model, dispatch_uid=f'ledger_{ledger_model.__name__}_delete')
+pre_delete.connect(ledger_bank_transaction_pre_delete, sender=BankTransaction, dispatch_uid='ledger_BankTransaction_pre_delete')
+post_delete.connect(ledger_bank_transaction_deleted, sender=BankTransaction, dispatch_uid='ledger_BankTransaction_delete')
+post_save.connect(ledger_bank_transaction_saved, sender=BankTransaction, dispatch_uid='ledger_BankTransaction_save')
+for category_model in (IncomeCategory, ExpenseCategory):
+    post_save.connect(ledger_category_changed, sender=category_model, dispatch_uid=f'ledger_{category_model.__name__}_save')
+post_save.connect(ledger_instructor_payment_changed, sender=MonthlyInstructorPayment, dispatch_uid='ledger_MonthlyInstructorPayment_save')
@@ -1,3 +1,786 @@
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from openpyxl import Workbook
+
+from . import caching, ledger
+from .allocation_batch import REGULAR_EXPENSE, STUDENT_PAYMENT, BankAllocationBatch
+from .auto_match import TransactionMatcher, split_months
+from .attendance_batch import STATUS_CREATED, STATUS_DELETED, AttendanceBatchSaver
+from .bank_import import BankStatementImporter, read_workbook
+from .models import (
+    Attendance, BankTransaction, ClassSession, ClassType, ExpenseAllocation, ExpenseCategory,
+    IncomeAllocation, IncomeCategory, Instructor, InstructorAssignment, LedgerEntry,
+    MonthlyFederationPayment, MonthlyInstructorPayment, MonthlyRollup, PaymentAllocation, PayrollDirtyMonth,
+    PaymentCellComment, RankHistory, Student
+)
+from .payroll import PayrollEngine
+from .pivot import build_payment_pivot, get_payment_pivot
+from .ranks import build_promotions, promote_ranks
+
+
+# Тест сайтын нийтлэг file cache-д (BASE_DIR/cache) бичихгүй
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix='aikido-test-cache-')
+test_cache = override_settings(CACHES={'default': {**settings.CACHES['default'], 'LOCATION': TEST_CACHE_DIR}})
+
+
+def setUpModule():
+    test_cache.enable()
+
+
+def tearDownModule():
+    test_cache.disable()
+    shutil.rmtree(TEST_CACHE_DIR, ignore_errors=True)
+
+
+def credit_transaction(amount, transaction_date=date(2025, 3, 5), description='Төлбөр'):
+    return BankTransaction.objects.create(
+        transaction_date=transaction_date, credit_amount=amount, amount=amount, description=description
+    )
+
+
+def debit_transaction(amount, transaction_date=date(2025, 3, 5), description='Зардал'):
+    return BankTransaction.objects.create(
+        transaction_date=transaction_date, debit_amount=-amount, amount=amount, description=description
+    )
+
+
+class AllocatedAmountTests(TestCase):
+    """allocated_amount нь F()-ээр шинэчлэгдэж, compute_allocated_amount()-тэй үргэлж тэнцүү байх"""
+
+    def setUp(self):
+        self.student = Student.objects.create(first_name='Бат', last_name='Дорж')
+        self.first = credit_transaction(Decimal('100000'))
+        self.second = credit_transaction(Decimal('80000'))
+
+    def assertInvariant(self, *transactions):
+        for bank_transaction in transactions:
+            bank_transaction.refresh_from_db()
+            self.assertEqual(bank_transaction.allocated_amount, bank_transaction.compute_allocated_amount())
+
+    def allocate(self, bank_transaction, amount, month=date(2025, 3, 1)):
+        return PaymentAllocation.objects.create(
+            bank_transaction=bank_transaction, student=self.student, payment_month=month, amount=amount
+        )
+
+    def test_create(self):
+        self.allocate(self.first, Decimal('40000'))
+        IncomeAllocation.objects.create(
+            bank_transaction=self.first, income_category=IncomeCategory.objects.create(name='Түрээс'),
+            income_date=date(2025, 3, 5), amount=Decimal('10000'),
+        )
+        self.assertInvariant(self.first)
+        self.assertEqual(self.first.allocated_amount, Decimal('50000'))
+
+    def test_edit_amount(self):
+        allocation = self.allocate(self.first, Decimal('40000'))
+        allocation.amount = Decimal('60000')
+        allocation.save()
+        self.assertInvariant(self.first)
+        self.assertEqual(self.first.allocated_amount, Decimal('60000'))
+
+    def test_stale_transaction_save_keeps_amount(self):
+        stale = BankTransaction.objects.get(pk=self.first.pk)
+        self.allocate(self.first, Decimal('40000'))
+        stale.notes = 'Засвар'
+        stale.save()
+        self.assertInvariant(self.first)
+        self.assertEqual(self.first.allocated_amount, Decimal('40000'))
+
+    def test_deferred_save_writes_loaded_fields(self):
+        self.allocate(self.first, Decimal('40000'))
+        bank_transaction = BankTransaction.objects.only('id', 'status').get(pk=self.first.pk)
+        bank_transaction.status = BankTransaction.STATUS_IGNORED
+        with self.assertNumQueries(1):
+            bank_transaction.save()
+        self.assertInvariant(self.first)
+        self.assertEqual(self.first.status, BankTransaction.STATUS_IGNORED)
+
+    def test_save_after_row_deleted_inserts(self):
+        bank_transaction = BankTransaction.objects.get(pk=self.first.pk)
+        BankTransaction.objects.filter(pk=self.first.pk).delete()
+        bank_transaction.save()
+        self.assertTrue(BankTransaction.objects.filter(pk=self.first.pk).exists())
+
+    def test_move_between_transactions(self):
+        allocation = self.allocate(self.first, Decimal('40000'))
+        allocation.bank_transaction = self.second
+        allocation.save()
+        self.assertInvariant(self.first, self.second)
+        self.assertEqual(self.first.allocated_amount, Decimal('0'))
+        self.assertEqual(self.second.allocated_amount, Decimal('40000'))
+
+    def test_delete(self):
+        allocation = self.allocate(self.first, Decimal('40000'))
+        self.allocate(self.first, Decimal('30000'), date(2025, 4, 1))
+        allocation.delete()
+        self.assertInvariant(self.first)
+        self.assertEqual(self.first.allocated_amount, Decimal('30000'))
+
+    def test_cascade_delete(self):
+        self.allocate(self.first, Decimal('40000'))
+        self.allocate(self.second, Decimal('20000'))
+        other = Student.objects.create(first_name='Болд', last_name='Сүх')
+        PaymentAllocation.objects.create(
+            bank_transaction=self.first, student=other, payment_month=date(2025, 3, 1), amount=Decimal('15000')
+        )
+        self.student.delete()
+        self.assertInvariant(self.first, self.second)
+        self.assertEqual(self.first.allocated_amount, Decimal('15000'))
+        self.assertEqual(self.second.allocated_amount, Decimal('0'))
+
+
+class PayrollEngineTests(TestCase):
+    """Сарын төлбөрийн 50% холбоонд, багш нарын хэсгийн 60/40 ахлах/туслахын томилолтод"""
+
+    month = date(2025, 3, 1)
+
+    def setUp(self):
+        self.class_type = ClassType.objects.create(name=ClassType.MORNING)
+        payment = credit_transaction(Decimal('150000'))
+        for first_name, amount in (('Бат', Decimal('100000')), ('Болд', Decimal('50000'))):
+            student = Student.objects.create(first_name=first_name, last_name='Дорж')
+            student.class_types.add(self.class_type)
+            PaymentAllocation.objects.create(
+                bank_transaction=payment, student=student, payment_month=self.month, amount=amount
+            )
+
+        self.lead, self.second_lead, self.assistant = [
+            Instructor.objects.create(first_name=name, last_name='Багш', phone='99000000', hire_date=date(2020, 1, 1))
+            for name in ('Ахлах', 'Ахлах2', 'Туслах')
+        ]
+        leads = [self.lead, self.lead, self.second_lead]
+        for day, lead in zip((3, 10, 17), leads):
+            session = ClassSession.objects.create(
+                class_type=self.class_type, date=date(2025, 3, day), weekday=0,
+                start_time=time(7), end_time=time(8, 30),
+            )
+            InstructorAssignment.objects.create(session=session, instructor=lead, role=InstructorAssignment.LEAD)
+            InstructorAssignment.objects.create(
+                session=session, instructor=self.assistant, role=InstructorAssignment.ASSISTANT
+            )
+        # Ороогүй хичээл тоологдохгүй
+        cancelled = ClassSession.objects.create(
+            class_type=self.class_type, date=date(2025, 3, 24), weekday=0,
+            start_time=time(7), end_time=time(8, 30), is_cancelled=True,
+        )
+        InstructorAssignment.objects.create(session=cancelled, instructor=self.lead, role=InstructorAssignment.LEAD)
+
+    def instructor_share(self, instructor, role):
+        return MonthlyInstructorPayment.objects.get(
+            instructor=instructor, class_type=self.class_type, month=self.month, role=role
+        )
+
+    def test_federation_and_instructor_halves(self):
+        [result] = PayrollEngine().run(self.month)
+        self.assertEqual(result['total_collected'], Decimal('150000'))
+        self.assertEqual(result['total_sessions'], 3)
+        federation = MonthlyFederationPayment.objects.get(class_type=self.class_type, month=self.month)
+        self.assertEqual(federation.federation_share_amount, Decimal('75000'))
+        instructor_total = sum(
+            MonthlyInstructorPayment.objects.filter(month=self.month).values_list('instructor_share_amount', flat=True)
+        )
+        self.assertEqual(instructor_total, Decimal('75000'))
+
+    def test_lead_assistant_split(self):
+        PayrollEngine().run(self.month)
+        # 75000-ийн 60% = 45000 гурван ахлах томилолтод, 40% = 30000 гурван туслах томилолтод
+        lead = self.instructor_share(self.lead, InstructorAssignment.LEAD)
+        self.assertEqual((lead.total_classes, lead.instructor_share_amount), (2, Decimal('30000')))
+        second_lead = self.instructor_share(self.second_lead, InstructorAssignment.LEAD)
+        self.assertEqual((second_lead.total_classes, second_lead.instructor_share_amount), (1, Decimal('15000')))
+        assistant = self.instructor_share(self.assistant, InstructorAssignment.ASSISTANT)
+        self.assertEqual((assistant.total_classes, assistant.instructor_share_amount), (3, Decimal('30000')))
+
+    def test_recalculate_is_idempotent(self):
+        PayrollEngine().run(self.month)
+        PayrollEngine().run(self.month)
+        self.assertEqual(MonthlyFederationPayment.objects.count(), 1)
+        self.assertEqual(MonthlyInstructorPayment.objects.count(), 3)
+
+
+class LedgerSyncTests(TestCase):
+    """Signal-ээр хийгдсэн ledger, rollup нь ledger.rebuild()-ийн бүрэн тооцоотой ижил байх"""
+
+    def setUp(self):
+        self.student = Student.objects.create(first_name='Бат', last_name='Дорж')
+        self.income_category = IncomeCategory.objects.create(name='Түрээс')
+        self.expense_category = ExpenseCategory.objects.create(name='Заал')
+
+    def snapshot(self):
+        entries = list(LedgerEntry.objects.order_by('source_type', 'source_id').values_list(
+            'source_type', 'source_id', 'bank_transaction_id', 'month', 'entry_date',
+            'direction', 'category', 'amount',
+        ))
+        rollups = list(MonthlyRollup.objects.order_by('month', 'direction', 'category').values_list(
+            'month', 'direction', 'category', 'total', 'entry_count',
+        ))
+        return entries, rollups
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        self.assertTrue(incremental[1], 'rollup-ууд signal-ээр үүсээгүй')
+        with self.captureOnCommitCallbacks(execute=True):
+            results = ledger.rebuild()
+        self.assertTrue(all(counts == (0, 0, 0) for counts in results.values()), results)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_create_edit_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            credit = credit_transaction(Decimal('200000'))
+            debit = debit_transaction(Decimal('90000'), date(2025, 4, 2))
+            payment = PaymentAllocation.objects.create(
+                bank_transaction=credit, student=self.student, payment_month=date(2025, 3, 1),
+                amount=Decimal('100000'),
+            )
+            PaymentAllocation.objects.create(
+                bank_transaction=credit, student=self.student, payment_month=date(2025, 4, 1),
+                amount=Decimal('50000'),
+            )
+            income = IncomeAllocation.objects.create(
+                bank_transaction=credit, income_category=self.income_category,
+                income_date=date(2025, 3, 7), amount=Decimal('30000'),
+            )
+            ExpenseAllocation.objects.create(
+                bank_transaction=debit, expense_category=self.expense_category,
+                expense_date=date(2025, 4, 2), amount=Decimal('90000'),
+            )
+        self.assertEqual(LedgerEntry.objects.count(), 4)
+        self.assertMatchesRebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.payment_month = date(2025, 5, 1)
+            payment.amount = Decimal('80000')
+            payment.save()
+            income.delete()
+            self.income_category.name = 'Заалны түрээс'
+            self.income_category.save()
+        self.assertMatchesRebuild()
+
+    def test_transaction_date_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            credit = credit_transaction(Decimal('40000'))
+            IncomeAllocation.objects.create(
+                bank_transaction=credit, income_category=self.income_category,
+                income_date=date(2025, 3, 5), amount=Decimal('40000'),
+            )
+            debit = debit_transaction(Decimal('25000'))
+            ExpenseAllocation.objects.create(
+                bank_transaction=debit, expense_category=self.expense_category,
+                expense_date=date(2025, 3, 5), amount=Decimal('25000'),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            credit.transaction_date = date(2025, 6, 1)
+            credit.save()
+            debit.delete()
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+        self.assertMatchesRebuild()
+
+
+class AttendanceBatchTests(TestCase):
+    """Ирцийн багц хадгалалтын query тоо мөрийн тооноос хамаарахгүй"""
+
+    session_date = date(2025, 3, 3)
+
+    def setUp(self):
+        class_type = ClassType.objects.create(name=ClassType.MORNING)
+        ClassSession.objects.create(
+            class_type=class_type, date=self.session_date, weekday=0, start_time=time(7), end_time=time(8, 30)
+        )
+
+    def run_batch(self, students, is_present):
+        items = [
+            {'student_id': student.pk, 'date': self.session_date.isoformat(), 'is_present': is_present}
+            for student in students
+        ]
+        results, _ = AttendanceBatchSaver(ClassType.MORNING).run(items)
+        return results
+
+    def create_students(self, count):
+        return [Student.objects.create(first_name=f'Сурагч{index}', last_name='Дорж') for index in range(count)]
+
+    def count_queries(self, students, is_present):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.run_batch(students, is_present)
+        return len(queries), results
+
+    def test_create_and_delete_are_constant_query(self):
+        small, large = self.create_students(5), self.create_students(40)
+        create_small, results = self.count_queries(small, True)
+        self.assertEqual({result['status'] for result in results}, {STATUS_CREATED})
+        create_large, _ = self.count_queries(large, True)
+        self.assertEqual(create_large, create_small)
+
+        delete_small, results = self.count_queries(small, False)
+        self.assertEqual({result['status'] for result in results}, {STATUS_DELETED})
+        with self.assertNumQueries(delete_small):
+            self.run_batch(large, False)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_delete_invalidates_pivot_year(self):
+        students = self.create_students(2)
+        self.run_batch(students, True)
+        pivot = get_payment_pivot(self.session_date.year)
+        self.assertEqual(pivot, get_payment_pivot(self.session_date.year))
+        self.run_batch(students[:1], False)
+        with CaptureQueriesContext(connection) as queries:
+            get_payment_pivot(self.session_date.year)
+        self.assertTrue(queries, 'Ирц устгасны дараа pivot cache-ээс уншигдлаа')
+
+
+def allocation_effects(bank_transaction):
+    """Гүйлгээний allocated_amount, төлөв, ledger бичилтүүд, цалингийн дараалал"""
+    bank_transaction.refresh_from_db()
+    entries = sorted(LedgerEntry.objects.filter(bank_transaction=bank_transaction).values_list(
+        'month', 'entry_date', 'direction', 'category', 'student_id', 'amount',
+    ))
+    dirty = set(PayrollDirtyMonth.objects.values_list('class_type_id', 'month'))
+    return bank_transaction.allocated_amount, bank_transaction.status, entries, dirty
+
+
+class BankAllocationBatchTests(TestCase):
+    """Багц хадгалалт нь мөр бүрийг save() хийсэнтэй ижил үр дагавартай, алдаатай бол юу ч бичихгүй"""
+
+    def setUp(self):
+        self.class_type = ClassType.objects.create(name=ClassType.EVENING)
+        self.student = Student.objects.create(first_name='Бат', last_name='Дорж')
+        self.student.class_types.add(self.class_type)
+        self.expense_category = ExpenseCategory.objects.create(name='Заал')
+
+    @staticmethod
+    def post(**lists):
+        post = QueryDict(mutable=True)
+        for name, values in lists.items():
+            post.setlist(f'{name}[]', values)
+        return post
+
+    def test_student_payments_match_single_saves(self):
+        months, amounts = ['2025-03', '2025-04'], ['50000', '30000']
+        batch_transaction = credit_transaction(Decimal('100000'))
+        with self.captureOnCommitCallbacks(execute=True):
+            created = BankAllocationBatch(batch_transaction, STUDENT_PAYMENT).save(self.post(
+                student_id=[str(self.student.pk)] * 2, payment_month=months, amount=amounts, notes=['', ''],
+            ))
+        self.assertEqual(created, 2)
+        batch_effects = allocation_effects(batch_transaction)
+        PayrollDirtyMonth.objects.all().delete()
+
+        single_transaction = credit_transaction(Decimal('100000'), description='Нэг бүрчлэн')
+        with self.captureOnCommitCallbacks(execute=True):
+            for month, amount in zip(months, amounts):
+                PaymentAllocation.objects.create(
+                    bank_transaction=single_transaction, student=self.student,
+                    payment_month=date(*map(int, month.split('-')), 1), amount=Decimal(amount),
+                )
+            single_transaction.update_status()
+        self.assertEqual(batch_effects, allocation_effects(single_transaction))
+        self.assertEqual(batch_effects[0], Decimal('80000'))
+        self.assertEqual(batch_effects[1], BankTransaction.STATUS_PARTIALLY_MATCHED)
+        self.assertEqual(len(batch_effects[2]), 2)
+        self.assertEqual(batch_effects[3], {
+            (self.class_type.pk, date(2025, 3, 1)), (self.class_type.pk, date(2025, 4, 1)),
+        })
+
+    def test_expenses_match_single_saves(self):
+        batch_transaction = debit_transaction(Decimal('60000'))
+        with self.captureOnCommitCallbacks(execute=True):
+            BankAllocationBatch(batch_transaction, REGULAR_EXPENSE).save(self.post(
+                expense_category=[str(self.expense_category.pk)], new_category=[''],
+                expense_date=['2025-03-05'], amount=['60000'], notes=[''],
+            ))
+
+        single_transaction = debit_transaction(Decimal('60000'), description='Нэг бүрчлэн')
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseAllocation.objects.create(
+                bank_transaction=single_transaction, expense_category=self.expense_category,
+                expense_date=date(2025, 3, 5), amount=Decimal('60000'),
+            )
+            single_transaction.update_status()
+        self.assertEqual(allocation_effects(batch_transaction), allocation_effects(single_transaction))
+        self.assertEqual(batch_transaction.status, BankTransaction.STATUS_MATCHED)
+
+    def assertNothingWritten(self, bank_transaction):
+        bank_transaction.refresh_from_db()
+        self.assertEqual(bank_transaction.allocated_amount, Decimal('0'))
+        self.assertEqual(bank_transaction.status, BankTransaction.STATUS_PENDING)
+        self.assertFalse(PaymentAllocation.objects.exists())
+        self.assertFalse(ExpenseAllocation.objects.exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.assertFalse(PayrollDirtyMonth.objects.exists())
+
+    def test_kind_must_match_transaction_side(self):
+        credit = credit_transaction(Decimal('60000'))
+        with self.assertRaises(ValidationError):
+            BankAllocationBatch(credit, REGULAR_EXPENSE)
+        debit = debit_transaction(Decimal('60000'))
+        with self.assertRaises(ValidationError):
+            BankAllocationBatch(debit, STUDENT_PAYMENT)
+        self.assertNothingWritten(credit)
+
+    def test_over_remaining_amount_writes_nothing(self):
+        bank_transaction = credit_transaction(Decimal('50000'))
+        with self.assertRaises(ValidationError):
+            BankAllocationBatch(bank_transaction, STUDENT_PAYMENT).save(self.post(
+                student_id=[str(self.student.pk)] * 2, payment_month=['2025-03', '2025-04'],
+                amount=['30000', '30000'], notes=['', ''],
+            ))
+        self.assertNothingWritten(bank_transaction)
+
+    def test_invalid_row_rejects_batch(self):
+        bank_transaction = credit_transaction(Decimal('50000'))
+        with self.assertRaises(ValidationError):
+            BankAllocationBatch(bank_transaction, STUDENT_PAYMENT).save(self.post(
+                student_id=[str(self.student.pk), '999999'], payment_month=['2025-03', '2025-04'],
+                amount=['20000', '20000'], notes=['', ''],
+            ))
+        self.assertNothingWritten(bank_transaction)
+
+
+
+class AutoMatchTests(TestCase):
+    """Автомат холболт сар сараар хувааж, гараар холбосонтой ижил үр дагавартай"""
+
+    def setUp(self):
+        self.class_type = ClassType.objects.create(name=ClassType.EVENING)
+        self.student = Student.objects.create(
+            first_name='Бат', last_name='Дорж', phone='99112233', monthly_fee=Decimal('50000')
+        )
+        self.student.class_types.add(self.class_type)
+
+    def test_split_months(self):
+        self.assertEqual(split_months(Decimal('120000'), Decimal('50000'), date(2025, 11, 1)), [
+            (date(2025, 11, 1), Decimal('50000')),
+            (date(2025, 12, 1), Decimal('50000')),
+            (date(2026, 1, 1), Decimal('20000')),
+        ])
+        self.assertEqual(split_months(Decimal('100000'), Decimal('50000'), date(2025, 3, 1)), [
+            (date(2025, 3, 1), Decimal('50000')), (date(2025, 4, 1), Decimal('50000')),
+        ])
+        # Сарын төлбөргүй, нэг сарын дүнгээс бага эсвэл 12 сараас их бол хуваахгүй
+        for amount, monthly_fee in ((Decimal('120000'), None), (Decimal('30000'), Decimal('50000')),
+                                    (Decimal('650000'), Decimal('50000'))):
+            self.assertEqual(split_months(amount, monthly_fee, date(2025, 3, 1)), [(date(2025, 3, 1), amount)])
+
+    def test_apply_matches_manual_allocation(self):
+        matched = credit_transaction(Decimal('120000'), description='Бат 99112233 сургалтын төлбөр')
+        matcher = TransactionMatcher()
+        (proposal,) = matcher.propose_all(TransactionMatcher.pending_transactions())
+        self.assertTrue(proposal.is_confident)
+        self.assertEqual(proposal.student['id'], self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(matcher.apply([proposal]), 3)
+        matched_effects = allocation_effects(matched)
+        PayrollDirtyMonth.objects.all().delete()
+
+        manual = credit_transaction(Decimal('120000'), description='Гараар холбосон')
+        with self.captureOnCommitCallbacks(execute=True):
+            for month, amount in proposal.months:
+                PaymentAllocation.objects.create(
+                    bank_transaction=manual, student=self.student, payment_month=month, amount=amount,
+                )
+            manual.update_status()
+        self.assertEqual(matched_effects, allocation_effects(manual))
+        self.assertEqual(matched_effects[:2], (Decimal('120000'), BankTransaction.STATUS_MATCHED))
+        self.assertEqual(len(matched_effects[2]), 3)
+        self.assertEqual(matched_effects[3], {
+            (self.class_type.pk, month) for month in (date(2025, 3, 1), date(2025, 4, 1), date(2025, 5, 1))
+        })
+
+    def test_apply_skips_transaction_allocated_meanwhile(self):
+        bank_transaction = credit_transaction(Decimal('50000'), description='Бат 99112233')
+        matcher = TransactionMatcher()
+        proposals = matcher.propose_all(TransactionMatcher.pending_transactions())
+        PaymentAllocation.objects.create(
+            bank_transaction=bank_transaction, student=self.student, payment_month=date(2025, 3, 1),
+            amount=Decimal('50000'),
+        )
+        self.assertEqual(matcher.apply(proposals), 0)
+        self.assertEqual(PaymentAllocation.objects.count(), 1)
+
+
+class PromoteRanksTests(TestCase):
+    """Бөөнөөр ахиулахад save()-тэй ижил RankHistory, алдаатай мөр байвал юу ч бичихгүй"""
+
+    rank_date = date(2025, 6, 1)
+    # (өмнөх kyu, өмнөх dan, шинэ зэрэг)
+    cases = [
+        (5, None, ('kyu', 4)),  # ахисан -> түүх
+        (1, None, ('dan', 1)),  # кюүгээс дан -> түүх
+        (None, None, ('kyu', 6)),  # анхны зэрэг -> түүхгүй
+        (None, 2, ('dan', 2)),  # өөрчлөгдөөгүй -> түүхгүй
+    ]
+
+    def create_students(self, prefix):
+        return [
+            Student.objects.create(
+                first_name=f'{prefix}{index}', last_name='Дорж', kyu_rank=kyu, dan_rank=dan,
+                current_rank_date=date(2024, 1, 1) if kyu or dan else None,
+            )
+            for index, (kyu, dan, _) in enumerate(self.cases)
+        ]
+
+    @staticmethod
+    def history(students):
+        return [
+            list(RankHistory.objects.filter(student=student).values_list(
+                'rank_type', 'rank_number', 'obtained_date', 'notes',
+            ))
+            for student in students
+        ]
+
+    @staticmethod
+    def ranks(students):
+        return [
+            Student.objects.filter(pk=student.pk).values_list('kyu_rank', 'dan_rank', 'current_rank_date').get()
+            for student in students
+        ]
+
+    def test_history_matches_save(self):
+        saved = self.create_students('Нэг')
+        for student, (_, _, (rank_type, number)) in zip(saved, self.cases):
+            student.kyu_rank = number if rank_type == 'kyu' else None
+            student.dan_rank = number if rank_type == 'dan' else None
+            student.current_rank_date = self.rank_date
+            student.save()
+
+        promoted = self.create_students('Багц')
+        # Мөрийн тооноос үл хамаарах: UPDATE, INSERT болон savepoint
+        with self.assertNumQueries(4):
+            result = promote_ranks(
+                [(student, *rank) for student, (_, _, rank) in zip(promoted, self.cases)], self.rank_date
+            )
+        self.assertEqual(result, (4, 2))
+        self.assertEqual(self.history(promoted), self.history(saved))
+        self.assertEqual([len(entries) for entries in self.history(promoted)], [1, 1, 0, 0])
+        self.assertEqual(self.ranks(promoted), self.ranks(saved))
+
+    def test_deferred_instance_reads_previous_rank(self):
+        student = self.create_students('Нэг')[0]
+        # only()-оор ачаалсан instance-ийн өмнөх зэргийг DB-ээс уншина
+        deferred = Student.objects.only('id').get(pk=student.pk)
+        self.assertEqual(promote_ranks([(deferred, 'kyu', 4)], self.rank_date), (1, 1))
+        self.assertEqual(self.history([student]), [[('kyu', 5, date(2024, 1, 1), 'Автоматаар хадгалагдсан: 5 кюү')]])
+
+    def test_invalid_row_rejects_batch(self):
+        students = self.create_students('Нэг')
+        before = self.ranks(students)
+        promotions = [(student, *rank) for student, (_, _, rank) in zip(students, self.cases)]
+
+        with self.assertRaises(ValidationError):
+            promote_ranks(promotions + [(students[2], 'kyu', 9)], self.rank_date)
+        # clean()-ийн дүрэм: зэрэгтэй бол огноо заавал
+        with self.assertRaises(ValidationError):
+            promote_ranks(promotions, None)
+        self.assertEqual([
+            (student.kyu_rank, student.dan_rank) for student in students
+        ], [(kyu, dan) for kyu, dan, _ in self.cases])
+        with self.assertRaises(ValidationError):
+            build_promotions([
+                {'index': 1, 'student': str(students[0].pk), 'rank': '4 kyu'},
+                {'index': 2, 'student': '999999', 'rank': '3 kyu'},
+            ])
+
+        self.assertEqual(self.ranks(students), before)
+        self.assertFalse(RankHistory.objects.exists())
+
+def statement_workbook(first, count, path=None):
+    """Банкны хуулгын толгой мөртэй Excel - мөр бүр өөр цаг, утга, данстай кредит/дебит гүйлгээ"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append([
+        'Гүйлгээний огноо', 'Эхний үлдэгдэл', 'Дебит гүйлгээ', 'Кредит гүйлгээ',
+        'Эцсийн үлдэгдэл', 'Гүйлгээний утга', 'Харьцсан данс',
+    ])
+    for index in range(first, first + count):
+        moment = datetime(2025, 1, 1) + timedelta(hours=index * 7)
+        debit, credit = (-index * 10, None) if index % 3 == 0 else (None, index * 100)
+        sheet.append([
+            moment.strftime('%Y/%m/%d %H:%M'), 0, debit, credit, 0, f'Гүйлгээ {index}', f'5000{index}',
+        ])
+    target = path or BytesIO()
+    workbook.save(target)
+    if path is None:
+        target.seek(0)
+    return target
+
+
+class BankStatementImporterTests(TestCase):
+    """Хуулгын импорт - давхардал, fingerprint-гүй хуучин мөр, бодитоор бичигдсэн тоо"""
+
+    def test_reimport_skips_every_row(self):
+        stats = BankStatementImporter().run(statement_workbook(1, 30))
+        self.assertEqual((stats.imported, stats.skipped, stats.errors), (30, 0, []))
+        stats = BankStatementImporter().run(statement_workbook(1, 30))
+        self.assertEqual((stats.imported, stats.skipped), (0, 30))
+        self.assertEqual(BankTransaction.objects.count(), 30)
+
+    def test_legacy_rows_without_fingerprint_are_duplicates(self):
+        BankStatementImporter().run(statement_workbook(1, 10))
+        BankTransaction.objects.filter(description__in=['Гүйлгээ 2', 'Гүйлгээ 5']).update(fingerprint=None)
+        stats = BankStatementImporter().run(statement_workbook(1, 12))
+        self.assertEqual((stats.imported, stats.skipped), (2, 10))
+        self.assertEqual(BankTransaction.objects.count(), 12)
+
+    def test_edited_transaction_is_still_a_duplicate(self):
+        BankStatementImporter().run(statement_workbook(1, 5))
+        bank_transaction = BankTransaction.objects.get(description='Гүйлгээ 2')
+        bank_transaction.description = 'Бат - 3 сарын төлбөр'
+        bank_transaction.transaction_date = date(2025, 2, 1)
+        bank_transaction.save()
+        stats = BankStatementImporter().run(statement_workbook(1, 5))
+        self.assertEqual((stats.imported, stats.skipped), (0, 5))
+        self.assertEqual(BankTransaction.objects.count(), 5)
+
+    def test_write_counts_only_inserted_rows(self):
+        _, rows, _, _ = read_workbook(statement_workbook(1, 8), start_row=2)
+        importer = BankStatementImporter(batch_size=3)
+        # Dedupe-ээс хойш зэрэг импорт хоёр мөрийг бичсэн
+        importer.write(rows[2:4])
+        before = BankTransaction.objects.count()
+        written = importer.write(rows)
+        self.assertEqual(len(written), 6)
+        self.assertEqual(BankTransaction.objects.count() - before, len(written))
+        self.assertEqual(written, {row['fingerprint'] for row in rows[:2] + rows[4:]})
+
+    def test_run_many_overlapping_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [
+                statement_workbook(first, 20, os.path.join(directory, f'{first}.xlsx'))
+                for first in (1, 11, 21)
+            ]
+            file_stats, total = BankStatementImporter().run_many(paths, workers=2)
+            self.assertEqual([stats.imported for stats in file_stats], [20, 10, 10])
+            self.assertEqual((total.imported, total.skipped), (40, 20))
+            self.assertEqual(BankTransaction.objects.count(), 40)
+
+            file_stats, total = BankStatementImporter().run_many(paths, workers=1)
+            self.assertEqual((total.imported, total.skipped), (0, 60))
+            self.assertEqual(BankTransaction.objects.count(), 40)
+
+
+class PaymentPivotTests(TestCase):
+    """Жилийн pivot cache-ээс уншигдаж, төлбөр/ирц/коммент/сурагч өөрчлөгдөхөд шинэчлэгдэх"""
+
+    year = 2024
+    month = date(2024, 3, 1)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.class_type = ClassType.objects.create(name=ClassType.MORNING)
+        self.session = ClassSession.objects.create(
+            class_type=self.class_type, date=date(2024, 3, 4), weekday=0, start_time=time(7), end_time=time(8, 30)
+        )
+        self.student = Student.objects.create(first_name='Бат', last_name='Дорж')
+        self.student.class_types.add(self.class_type)
+
+    def row(self, pivot):
+        (group,) = pivot['groups']
+        self.assertEqual(group['class_name'], self.class_type.name)
+        (row,) = group['rows']
+        return row
+
+    def cell(self, pivot):
+        return self.row(pivot)['months'][self.month.month - 1]
+
+    def assertInvalidatedBy(self, write):
+        """Cache-лэгдсэн pivot write()-ийн дараа хүчингүй болж, шинээр бүтээсэнтэй тэнцүү байх"""
+        pivot = get_payment_pivot(self.year)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_payment_pivot(self.year), pivot)
+        write()
+        fresh = get_payment_pivot(self.year)
+        self.assertNotEqual(fresh, pivot)
+        self.assertEqual(fresh, build_payment_pivot(self.year))
+        return fresh
+
+    def test_rows_hold_student_values(self):
+        student = self.row(get_payment_pivot(self.year))['student']
+        self.assertEqual(student, {
+            'id': self.student.id, 'first_name': 'Бат', 'last_name': 'Дорж', 'phone': self.student.phone,
+            'is_fee_exempt': False,
+        })
+
+    def test_payment_allocation_invalidates(self):
+        allocation = None
+
+        def create():
+            nonlocal allocation
+            allocation = PaymentAllocation.objects.create(
+                bank_transaction=credit_transaction(Decimal('50000'), date(2024, 3, 5)), student=self.student,
+                payment_month=self.month, amount=Decimal('50000'),
+            )
+
+        cell = self.cell(self.assertInvalidatedBy(create))
+        self.assertEqual((cell['amount'], cell['date'], cell['has_data']), (Decimal('50000'), date(2024, 3, 5), True))
+
+        cell = self.cell(self.assertInvalidatedBy(allocation.delete))
+        self.assertEqual((cell['amount'], cell['has_data']), (0, False))
+
+    def test_attendance_invalidates(self):
+        attendance = None
+
+        def create():
+            nonlocal attendance
+            attendance = Attendance.objects.create(session=self.session, student=self.student)
+
+        self.assertEqual(self.cell(self.assertInvalidatedBy(create))['actual_attendance'], 1)
+
+        def mark_absent():
+            attendance.is_present = False
+            attendance.save()
+
+        self.assertEqual(self.cell(self.assertInvalidatedBy(mark_absent))['actual_attendance'], 0)
+
+    def test_cell_comment_invalidates(self):
+        cell = self.cell(self.assertInvalidatedBy(lambda: PaymentCellComment.objects.create(
+            student=self.student, month=self.month, comment='Дараа төлнө', highlight_color='yellow',
+        )))
+        self.assertEqual((cell['comments'], cell['highlight_color']), (['Дараа төлнө'], 'yellow'))
+
+    def test_student_change_invalidates(self):
+        def rename():
+            self.student.first_name = 'Болд'
+            self.student.save()
+
+        self.assertEqual(self.row(self.assertInvalidatedBy(rename))['student']['first_name'], 'Болд')
+
+class PaymentPivotETagTests(TestCase):
+    """Pivot JSON-ийн ETag: өөрчлөлтгүй бол 304, бичилт хийсний дараа шинэ хувилбар"""
+
+    url = '/payments/pivot.json?year=2025'
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        self.student = Student.objects.create(first_name='Бат', last_name='Дорж')
+
+    def test_repeat_request_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
 
-# Create your tests here.
+    def test_write_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        PaymentAllocation.objects.create(
+            bank_transaction=credit_transaction(Decimal('50000')), student=self.student,
+            payment_month=date(2025, 3, 1), amount=Decimal('50000'),
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['summary']['total_count'], 1)
@@ -17,6 +17,7 @@ urlpatterns = [
     # Students - Class-Based Views (Даалгаврын шаардлага)
     path('students/', views.StudentListView.as_view(), name='student_list'),
     path('students/create/', views.StudentCreateView.as_view(), name='student_create'),
+    path('students/promotion/', views.student_promotion, name='student_promotion'),
     path('students/<int:pk>/edit/', views.StudentUpdateView.as_view(), name='student_edit'),
     path('students/<int:pk>/delete/', views.StudentDeleteView.as_view(), name='student_delete'),
     
@@ -34,12 +35,16 @@ urlpatterns = [
     
     # Payments
     path('payments/', views.payment_list, name='payment_list'),
+    path('payments/pivot.json', views.payment_pivot_api, name='payment_pivot_api'),
+    path('payments/pivot/rows/', views.payment_pivot_rows, name='payment_pivot_rows'),
     path('seminar-payments/', views.seminar_payment_list, name='seminar_payment_list'),
     path('membership-payments/', views.membership_payment_list, name='membership_payment_list'),
     path('income/', views.income_list, name='income_list'),
     
     # Monthly payment reports
     path('monthly-payment-report/', views.monthly_payment_report, name='monthly_payment_report'),
+    path('profit-loss/', views.profit_loss_report, name='profit_loss_report'),
+    path('profiling/', views.profiling_summary, name='profiling_summary'),
     path('instructor-payments/', views.instructor_payment_list, name='instructor_payment_list'),
     path('instructor-payments/<int:payment_id>/mark-paid/', views.mark_instructor_payment_paid, name='mark_instructor_payment_paid'),
     path('instructor-payments/calculate-from-attendance/', views.calculate_instructor_payments_from_attendance, name='calculate_instructor_payments_from_attendance'),
@@ -6,15 +6,17 @@ from django.contrib import messages
 from django.db.models import Count, Sum, F, Q
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
+from django.conf import settings
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 import calendar
-from openpyxl import load_workbook
+import logging
 from .models import (
     Student, Instructor, ClassSession, Attendance, Payment, 
     ClassType, InstructorAssignment, BankTransaction, PaymentAllocation,
@@ -23,7 +25,25 @@ from .models import (
     MonthlyInstructorPayment, MonthlyFederationPayment, InstructorPaymentAllocation,
     PaymentCellComment
 )
-from .forms import BankTransactionUploadForm, PaymentAllocationForm, StudentForm, InstructorForm, AttendanceRecordForm
+from .forms import BankTransactionUploadForm, PaymentAllocationForm, StudentForm, InstructorForm, AttendanceRecordForm, RankPromotionForm
+from .bank_import import BankStatementImporter, columns_from_letters, missing_required_columns
+from .pivot import (
+    PIVOT_PAGE_SIZE, get_payment_pivot, get_payment_years, group_rows, pivot_as_json, pivot_etag, window_groups
+)
+from .instructor_stats import attach_instructor_stats, monthly_instructor_stats, parse_date_range
+from .attendance_batch import AttendanceBatchSaver
+from .dashboard import dashboard_metrics
+from .monthly_report import collected_by_class_type
+from . import profiling
+from .profit_loss import MAX_YEARS as PROFIT_LOSS_MAX_YEARS, profit_loss_grid, rollup_years, rollups_missing
+from .ranks import RANK_OPTIONS, build_promotions, csv_rows, form_rows, promote_ranks
+from .auto_match import StudentIndex, TransactionMatcher
+from .allocation_batch import (
+    BankAllocationBatch, EXPENSE_KINDS, INCOME_KINDS, REGULAR_EXPENSE, STUDENT_PAYMENT, SUCCESS_MESSAGES
+)
+from .logs import RowSampler
+
+logger = logging.getLogger(__name__)
 
 
 def login_view(request):
@@ -100,50 +120,9 @@ def dashboard(request):
     if not request.user.is_staff:
         return redirect('class_schedule')
     
-    # Stats
-    total_students = Student.objects.filter(is_active=True).count()
-    total_instructors = Instructor.objects.filter(is_active=True).count()
-    
-    # This week's classes
+    # Stats and last week's attendance (cached, invalidated by signals)
     today = datetime.now().date()
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    classes_this_week = ClassSession.objects.filter(
-        date__gte=week_start,
-        date__lte=week_end
-    ).count()
-    
-    # This month's revenue
-    month_start = today.replace(day=1)
-    payments_this_month = Payment.objects.filter(
-        transaction_date__gte=month_start,
-        is_verified=True
-    )
-    total_revenue = payments_this_month.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # New students this month
-    new_students_this_month = Student.objects.filter(
-        enrollment_date__gte=month_start
-    ).count()
-    
-    # Attendance last week
-    last_week_start = week_start - timedelta(days=7)
-    attendance_last_week = []
-    for i in range(7):
-        day = last_week_start + timedelta(days=i)
-        day_sessions = ClassSession.objects.filter(date=day)
-        total_attendance = Attendance.objects.filter(session__date=day).count()
-        present_count = Attendance.objects.filter(session__date=day, is_present=True).count()
-        
-        percentage = (present_count / total_attendance * 100) if total_attendance > 0 else 0
-        
-        attendance_last_week.append({
-            'date': day,
-            'weekday': day.strftime('%a'),
-            'total': total_attendance,
-            'present': present_count,
-            'percentage': percentage
-        })
+    context = dashboard_metrics(today)
     
     # Upcoming sessions
     upcoming_sessions = ClassSession.objects.filter(
@@ -153,17 +132,10 @@ def dashboard(request):
     # Recent payments
     recent_payments = Payment.objects.select_related('student').order_by('-transaction_date')[:10]
     
-    context = {
-        'total_students': total_students,
-        'total_instructors': total_instructors,
-        'classes_this_week': classes_this_week,
-        'total_revenue': total_revenue,
-        'new_students_this_month': new_students_this_month,
-        'payments_this_month': payments_this_month.count(),
-        'attendance_last_week': attendance_last_week,
+    context.update({
         'upcoming_sessions': upcoming_sessions,
         'recent_payments': recent_payments,
-    }
+    })
     
     return render(request, 'aikido_app/dashboard.html', context)
 
@@ -195,6 +167,38 @@ def student_list(request):
     })
 
 
+@login_required
+def student_promotion(request):
+    """Шалгалтын дараа олон сурагчийн зэргийг нэг дор ахиулах - маягт эсвэл CSV"""
+    if not request.user.is_staff:
+        return redirect('class_schedule')
+    
+    form = RankPromotionForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            csv_file = form.cleaned_data['csv_file']
+            rows = csv_rows(csv_file) if csv_file else form_rows(request.POST)
+            # All rows are validated in memory, then written with one bulk_update and one bulk_create
+            updated, history = promote_ranks(
+                build_promotions(rows), form.cleaned_data['exam_date'], form.cleaned_data['notes']
+            )
+        except ValidationError as e:
+            for error in e.messages[:10]:
+                messages.error(request, error)
+            if len(e.messages) > 10:
+                messages.error(request, f'... болон {len(e.messages) - 10} бусад алдаа')
+        else:
+            messages.success(request, f'✅ {updated} сурагчийн зэрэг шинэчлэгдлээ ({history} түүх хадгалагдсан)')
+            return redirect('student_list')
+    
+    students = Student.objects.filter(is_active=True).prefetch_related('class_types').order_by('last_name', 'first_name')
+    return render(request, 'aikido_app/student_promotion.html', {
+        'form': form,
+        'students': students,
+        'rank_options': RANK_OPTIONS,
+    })
+
+
 @login_required
 def student_create(request):
     """Сурагч бүртгэх - Function-based view (Exception handling нэмсэн)"""
@@ -349,57 +353,16 @@ def instructor_list(request):
     
     instructors = instructors.order_by(order_by, 'last_name', 'first_name')
     
-    # Calculate statistics for each instructor
-    for instructor in instructors:
-        # Count lead and assistant roles by class type
-        lead_morning = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='LEAD',
-            session__class_type__name=ClassType.MORNING
-        ).count()
-        
-        assistant_morning = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='ASSISTANT',
-            session__class_type__name=ClassType.MORNING
-        ).count()
-        
-        lead_evening = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='LEAD',
-            session__class_type__name=ClassType.EVENING
-        ).count()
-        
-        assistant_evening = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='ASSISTANT',
-            session__class_type__name=ClassType.EVENING
-        ).count()
-        
-        lead_children = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='LEAD',
-            session__class_type__name=ClassType.CHILDREN
-        ).count()
-        
-        assistant_children = InstructorAssignment.objects.filter(
-            instructor=instructor,
-            role='ASSISTANT',
-            session__class_type__name=ClassType.CHILDREN
-        ).count()
-        
-        instructor.stats = {
-            'morning': {'lead': lead_morning, 'assistant': assistant_morning},
-            'evening': {'lead': lead_evening, 'assistant': assistant_evening},
-            'children': {'lead': lead_children, 'assistant': assistant_children},
-            'total_lead': lead_morning + lead_evening + lead_children,
-            'total_assistant': assistant_morning + assistant_evening + assistant_children,
-        }
+    # Statistics for all instructors in one query (optionally within a date range)
+    date_from, date_to = parse_date_range(request.GET)
+    instructors = attach_instructor_stats(instructors, date_from, date_to)
     
     return render(request, 'aikido_app/instructor_list.html', {
         'instructors': instructors,
         'current_sort': sort_by,
-        'show_inactive': show_inactive
+        'show_inactive': show_inactive,
+        'date_from': date_from,
+        'date_to': date_to,
     })
 
 
@@ -556,12 +519,8 @@ def income_list(request):
     # Apply filters
     if month_filter:
         try:
-            year, month = month_filter.split('-')
-            allocations = allocations.filter(
-                income_date__year=year,
-                income_date__month=month
-            )
-        except:
+            allocations = allocations.for_month(month_filter)
+        except ValueError:
             pass
     
     if category_filter:
@@ -664,9 +623,7 @@ def membership_payment_list(request):
     ).order_by('-payment_month', 'student__last_name')
     
     if selected_month:
-        from datetime import datetime
-        month_date = datetime.strptime(selected_month, '%Y-%m').date()
-        payments = payments.filter(payment_month=month_date)
+        payments = payments.for_month(selected_month)
     
     if selected_student:
         payments = payments.filter(
@@ -701,8 +658,7 @@ def membership_payment_list(request):
 @login_required
 def payment_list(request):
     """Төлбөрийн жагсаалт - Pivot хүснэгт хэлбэрээр"""
-    from collections import defaultdict
-    from datetime import datetime, date
+    from datetime import datetime
     
     # Get selected year from request, default to current year
     selected_year = int(request.GET.get('year', datetime.now().year))
@@ -738,277 +694,68 @@ def payment_list(request):
         redirect_url = reverse('payment_list') + f'?year={selected_year}'
         return redirect(redirect_url)
     
-    # Filter allocations by selected year
-    allocations = PaymentAllocation.objects.filter(
-        payment_month__year=selected_year
-    ).select_related(
-        'bank_transaction', 'student'
-    ).prefetch_related('student__class_types').order_by(
-        'student__class_types__name', 'student__first_name', 'student__last_name',  'payment_month'
-    )
-    
-    # Get all students (both with and without payments)
-    all_students = Student.objects.prefetch_related('class_types').distinct().order_by('first_name', 'last_name')
-    
-    # Get attendance data grouped by student and month for selected year
-    from django.db.models import Count, Q
-    attendance_data = defaultdict(dict)
-    
-    # Get attendance records for selected year
-    attendances = Attendance.objects.filter(
-        is_present=True,
-        session__date__year=selected_year
-    ).select_related('session', 'student').order_by('session__date')
-    
-    for attendance in attendances:
-        student_id = attendance.student.id
-        # Get year-month from session date
-        session_date = attendance.session.date
-        month_key = date(session_date.year, session_date.month, 1)
-        
-        if month_key not in attendance_data[student_id]:
-            attendance_data[student_id][month_key] = 0
-        attendance_data[student_id][month_key] += 1
-    
-    # Create fixed months for selected year (January to December)
-    months = [date(selected_year, month, 1) for month in range(1, 13)]
-    
-    # Get all cell comments for selected year
-    cell_comments = {}
-    for comment in PaymentCellComment.objects.filter(
-        month__year=selected_year
-    ).select_related('student').all():
-        key = (comment.student.id, comment.month)
-        cell_comments[key] = {
-            'comment': comment.comment,
-            'highlight_color': comment.highlight_color
-        }
-    
-    # Build pivot data structure
-    # pivot_data[student_id][month_date] = {'amount': X, 'date': Y, 'allocations': [], 'attendance': N}
-    pivot_data = defaultdict(dict)
-    
-    for allocation in allocations:
-        student_id = allocation.student.id
-        month_key = allocation.payment_month
-        
-        if month_key not in pivot_data[student_id]:
-            pivot_data[student_id][month_key] = {
-                'amount': 0,
-                'date': allocation.bank_transaction.transaction_date if allocation.bank_transaction else None,
-                'allocations': [],
-                'total_attendance': 0,
-                'actual_attendance': attendance_data.get(student_id, {}).get(month_key, 0),
-                'comments': [],
-                'highlight_color': ''
-            }
-        
-        pivot_data[student_id][month_key]['amount'] += allocation.amount
-        pivot_data[student_id][month_key]['total_attendance'] += allocation.attendance_count
-        if allocation.comment:
-            pivot_data[student_id][month_key]['comments'].append(allocation.comment)
-        if allocation.highlight_color and not pivot_data[student_id][month_key]['highlight_color']:
-            pivot_data[student_id][month_key]['highlight_color'] = allocation.highlight_color
-        
-        pivot_data[student_id][month_key]['allocations'].append({
-            'id': allocation.id,
-            'amount': float(allocation.amount),
-            'date': allocation.bank_transaction.transaction_date.strftime('%Y-%m-%d') if allocation.bank_transaction and allocation.bank_transaction.transaction_date else None,
-            'attendance_count': allocation.attendance_count,
-            'comment': allocation.comment or '',
-            'highlight_color': allocation.highlight_color or ''
-        })
-    
-    # Add attendance data for months without payments
-    for student_id, month_attendance in attendance_data.items():
-        for month_key, attendance_count in month_attendance.items():
-            if month_key not in pivot_data[student_id]:
-                pivot_data[student_id][month_key] = {
-                    'amount': 0,
-                    'date': None,
-                    'allocations': [],
-                    'total_attendance': 0,
-                    'actual_attendance': attendance_count,
-                    'comments': [],
-                    'highlight_color': ''
-                }
-            else:
-                # Update actual attendance if not set
-                if 'actual_attendance' not in pivot_data[student_id][month_key]:
-                    pivot_data[student_id][month_key]['actual_attendance'] = attendance_count
-    
-    # Group students by class type
-    class_groups = defaultdict(list)
-    for student in all_students:
-        student_classes = student.class_types.all()
-        if student_classes:
-            for class_type in student_classes:
-                class_groups[class_type.name].append(student)
-        else:
-            class_groups['Ангигүй'].append(student)
-    
-    # Prepare rows grouped by class type with row totals
-    groups = []
-    for class_name in sorted(class_groups.keys()):
-        rows = []
-        group_total = 0
-        group_column_totals = []
-        
-        # Statistics for this class group
-        total_students = len(class_groups[class_name])
-        students_with_attendance = set()
-        students_with_payment = set()
-        fee_exempt_students = set()
-        
-        for student in class_groups[class_name]:
-            # Check if student is fee exempt
-            if student.is_fee_exempt:
-                fee_exempt_students.add(student.id)
-            
-            row = {
-                'student': student,
-                'months': [],
-                'row_total': 0
-            }
-            for month in months:
-                # Get cell comment for this student-month combination
-                cell_comment_data = cell_comments.get((student.id, month), {})
-                
-                if month in pivot_data[student.id]:
-                    month_data = pivot_data[student.id][month].copy()
-                    
-                    # Track students with attendance/payment
-                    if month_data.get('actual_attendance', 0) > 0:
-                        students_with_attendance.add(student.id)
-                    if month_data.get('amount', 0) > 0:
-                        students_with_payment.add(student.id)
-                    
-                    # Apply cell comment if exists (overrides allocation-based color/comment)
-                    if cell_comment_data:
-                        if cell_comment_data.get('highlight_color'):
-                            month_data['highlight_color'] = cell_comment_data['highlight_color']
-                        if cell_comment_data.get('comment'):
-                            if month_data['comments']:
-                                month_data['comments'].append(cell_comment_data['comment'])
-                            else:
-                                month_data['comments'] = [cell_comment_data['comment']]
-                    # Convert allocations to JSON string for template
-                    month_data['allocations_json'] = json.dumps(month_data['allocations'])
-                    month_data['month_str'] = month.strftime('%Y-%m-%d')
-                    month_data['has_data'] = True
-                    row['months'].append(month_data)
-                    row['row_total'] += month_data['amount']
-                else:
-                    # No payment/attendance, but may have cell comment
-                    month_data = {
-                        'amount': 0,
-                        'date': None,
-                        'allocations': [],
-                        'allocations_json': '[]',
-                        'total_attendance': 0,
-                        'actual_attendance': 0,
-                        'comments': [cell_comment_data.get('comment')] if cell_comment_data.get('comment') else [],
-                        'highlight_color': cell_comment_data.get('highlight_color', ''),
-                        'month_str': month.strftime('%Y-%m-%d'),
-                        'has_data': bool(cell_comment_data)
-                    }
-                    row['months'].append(month_data)
-            rows.append(row)
-            group_total += row['row_total']
-        
-        # Calculate column totals and statistics for this group
-        group_month_stats = []
-        for month in months:
-            month_total = 0
-            month_students_with_attendance = 0
-            month_students_with_payment = 0
-            month_fee_exempt = 0
-            month_students_should_pay = 0
-            
-            for student in class_groups[class_name]:
-                month_data = pivot_data[student.id].get(month, {})
-                month_total += month_data.get('amount', 0)
-                
-                # Student has attendance this month
-                if month_data.get('actual_attendance', 0) > 0:
-                    month_students_with_attendance += 1
-                    
-                    # Student paid this month
-                    if month_data.get('amount', 0) > 0:
-                        month_students_with_payment += 1
-                    
-                    # Check if fee exempt
-                    if student.is_fee_exempt:
-                        month_fee_exempt += 1
-                    else:
-                        # Should pay but hasn't
-                        if month_data.get('amount', 0) == 0:
-                            month_students_should_pay += 1
-            
-            group_month_stats.append({
-                'total': month_total,
-                'with_attendance': month_students_with_attendance,
-                'with_payment': month_students_with_payment,
-                'fee_exempt': month_fee_exempt,
-                'should_pay': month_students_should_pay
-            })
-        
-        groups.append({
-            'class_name': class_name,
-            'rows': rows,
-            'group_total': group_total,
-            'group_column_totals': [stat['total'] for stat in group_month_stats],
-            'month_statistics': group_month_stats,
-            'months_with_stats': list(zip(months, group_month_stats)),
-            'statistics': {
-                'total_students': total_students,
-                'students_with_attendance': len(students_with_attendance),
-                'students_with_payment': len(students_with_payment),
-                'fee_exempt_students': len(fee_exempt_students),
-            }
-        })
-    
-    # Calculate column totals for each month
-    column_totals = []
-    for month in months:
-        month_total = sum(
-            pivot_data[student.id].get(month, {}).get('amount', 0)
-            for student in all_students
-        )
-        column_totals.append(month_total)
-    
-    # Calculate summary for selected year
-    from django.db.models import Sum, Count
-    summary = PaymentAllocation.objects.filter(
-        payment_month__year=selected_year
-    ).aggregate(
-        total_amount=Sum('amount'),
-        total_count=Count('id')
-    )
-    
-    # Get available years for dropdown
-    available_years = PaymentAllocation.objects.dates('payment_month', 'year', order='DESC')
-    years_list = sorted(set([d.year for d in available_years]), reverse=True)
-    if selected_year not in years_list and allocations.exists():
-        years_list.append(selected_year)
-        years_list.sort(reverse=True)
-    
-    # Add current year if not in list
+    # Pivot хүснэгтийг жилээр cache-лэнэ (signals.py дээр хүчингүй болгоно)
+    context = dict(get_payment_pivot(selected_year))
+    # Анги бүрийн эхний мөрүүд л render хийгдэнэ, үлдсэнийг гүйлгэх үед payment_pivot_rows ачаална
+    context['groups'] = window_groups(context)
+
+    # Get available years for dropdown, plus current year
+    years_list = list(get_payment_years())
     current_year = datetime.now().year
     if current_year not in years_list:
         years_list.insert(0, current_year)
-    
-    context = {
-        'groups': groups,
-        'months': months,
-        'column_totals': column_totals,
-        'summary': summary,
+
+    context.update({
         'selected_year': selected_year,
         'years_list': years_list,
-    }
+    })
     return render(request, 'aikido_app/payment_list.html', context)
 
 
+def _pivot_year(request):
+    try:
+        return int(request.GET.get('year', datetime.now().year))
+    except ValueError:
+        return datetime.now().year
+
+
+@login_required
+@require_GET
+@condition(etag_func=lambda request: pivot_etag(_pivot_year(request)))
+def payment_pivot_api(request):
+    """Төлбөрийн pivot JSON - If-None-Match таарвал pivot бүтээлгүй 304 буцаана"""
+    year = _pivot_year(request)
+    response = JsonResponse(pivot_as_json(year, get_payment_pivot(year)))
+    # Хөтөч хадгалсан хувилбараа ETag-ээр заавал шалгуулна
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@require_GET
+@condition(etag_func=lambda request: pivot_etag(_pivot_year(request)))
+def payment_pivot_rows(request):
+    """Pivot-ийн нэг ангийн дараагийн мөрүүд (HTML хэсэг) - payment_list хуудас гүйлгэх үед дуудна"""
+    from django.template.loader import render_to_string
+
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = int(request.GET.get('limit', PIVOT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'offset, limit бүхэл тоо байх ёстой'}, status=400)
+
+    rows, remaining = group_rows(
+        get_payment_pivot(_pivot_year(request)), request.GET.get('group', ''), offset, limit
+    )
+    response = JsonResponse({
+        'html': render_to_string('aikido_app/payment_list_rows.html', {'rows': rows}, request=request),
+        'next_offset': max(0, offset) + len(rows),
+        'remaining': remaining,
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 def attendance_record(request):
     """Ирц бүртгэх - Багшийн хуудас"""
@@ -1031,6 +778,7 @@ def attendance_record(request):
             class_type_name = data.get('class_type', '')
             
             # Save instructor assignments first
+            log_wrong_weekday = RowSampler(logger, 'attendance_record.wrong_weekday')
             for assignment_data in instructor_assignments:
                 date_str = assignment_data.get('date')
                 lead_instructor_id = assignment_data.get('lead_instructor_id')
@@ -1055,8 +803,8 @@ def attendance_record(request):
                         
                         # Clear all existing assignments - this marks it as "no class"
                         InstructorAssignment.objects.filter(session=session).delete()
-                    except Exception as e:
-                        print(f"Error saving NO_CLASS marker: {e}")
+                    except Exception:
+                        logger.exception('NO_CLASS тэмдэглэгээ хадгалахад алдаа: %s %s', date_str, class_type_name)
                     continue
                 
                 # Skip if both are empty (and not NO_CLASS)
@@ -1074,12 +822,12 @@ def attendance_record(request):
                     if class_type.name in [ClassType.MORNING, ClassType.EVENING]:
                         # MORNING/EVENING: Mon, Wed, Fri only (0, 2, 4)
                         if weekday not in [0, 2, 4]:
-                            print(f"Skipping {class_type.name} session on {date_obj} - wrong weekday {weekday}")
+                            log_wrong_weekday('%s хичээл %s (%d гараг) ордоггүй - алгасав', class_type.name, date_obj, weekday)
                             continue
                     elif class_type.name == ClassType.CHILDREN:
                         # CHILDREN: Sat, Sun only (5, 6)
                         if weekday not in [5, 6]:
-                            print(f"Skipping {class_type.name} session on {date_obj} - wrong weekday {weekday}")
+                            log_wrong_weekday('%s хичээл %s (%d гараг) ордоггүй - алгасав', class_type.name, date_obj, weekday)
                             continue
                     
                     # Get or create class session
@@ -1118,91 +866,15 @@ def attendance_record(request):
                             )
                         except (Instructor.DoesNotExist, ValueError):
                             pass
-                except Exception as e:
-                    print(f"Error saving instructor assignment: {e}")
+                except Exception:
+                    logger.exception('Багш томилгоо хадгалахад алдаа: %s %s', date_str, class_type_name)
+            log_wrong_weekday.summary(class_type=class_type_name)
             
-            # Save attendance
-            for item in attendance_data:
-                student_id = item.get('student_id')
-                date_str = item.get('date')
-                
-                try:
-                    student = Student.objects.get(id=student_id)
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    
-                    # Validate weekday for class type
-                    weekday = date_obj.weekday()
-                    if class_type_name:
-                        if class_type_name in ['MORNING', 'EVENING']:
-                            # MORNING/EVENING: Mon, Wed, Fri only (0, 2, 4)
-                            if weekday not in [0, 2, 4]:
-                                print(f"Skipping attendance for {student} on {date_obj} - {class_type_name} not scheduled on weekday {weekday}")
-                                continue
-                        elif class_type_name == 'CHILDREN':
-                            # CHILDREN: Sat, Sun only (5, 6)
-                            if weekday not in [5, 6]:
-                                print(f"Skipping attendance for {student} on {date_obj} - {class_type_name} not scheduled on weekday {weekday}")
-                                continue
-                    
-                    # Find the session that was created by instructor assignment
-                    # First try to find existing session for this date
-                    session = None
-                    existing_sessions = ClassSession.objects.filter(date=date_obj)
-                    
-                    # CRITICAL: Filter by class_type_name first if provided
-                    if class_type_name:
-                        existing_sessions = existing_sessions.filter(class_type__name=class_type_name)
-                    
-                    if existing_sessions.count() == 1:
-                        # Only one session (matching class type) - use it
-                        session = existing_sessions.first()
-                    elif existing_sessions.count() > 1:
-                        # Multiple sessions - prefer the one with instructor assignment
-                        for sess in existing_sessions:
-                            if sess.instructor_assignments.exists():
-                                session = sess
-                                break
-                        # Otherwise use first one
-                        if not session:
-                            session = existing_sessions.first()
-                    
-                    # If still no session found, create one based on class_type_name or student's class
-                    if not session:
-                        class_type = ClassType.objects.filter(name=class_type_name).first()
-                        if not class_type:
-                            class_type = student.class_types.first() or ClassType.objects.first()
-                        
-                        session = ClassSession.objects.create(
-                            date=date_obj,
-                            class_type=class_type,
-                            weekday=date_obj.weekday(),
-                            start_time='09:00',
-                            end_time='11:00',
-                        )
-                    
-                    # Get is_present from request data (defaults to True if not specified)
-                    is_present = item.get('is_present', True)
-                    
-                    if is_present:
-                        # Create or update attendance
-                        Attendance.objects.update_or_create(
-                            session=session,
-                            student=student,
-                            defaults={
-                                'is_present': True,
-                                'recorded_by': instructor
-                            }
-                        )
-                    else:
-                        # Delete attendance if unchecked
-                        Attendance.objects.filter(
-                            session=session,
-                            student=student
-                        ).delete()
-                except Student.DoesNotExist:
-                    pass
+            # Save attendance in one batch
+            saver = AttendanceBatchSaver(class_type_name=class_type_name, recorded_by=instructor)
+            results, timings = saver.run(attendance_data)
             
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'results': results, 'timings_ms': timings})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
@@ -1312,8 +984,8 @@ def attendance_record(request):
                 default_instructors[ClassType.EVENING] = inst
             elif 'галбадрах' in name_lower or 'галба' in name_lower:
                 default_instructors[ClassType.CHILDREN] = inst
-    except Exception as e:
-        print(f"Error setting default instructors: {e}")
+    except Exception:
+        logger.exception('Анхны багш тохируулахад алдаа')
     
     # Set defaults based on logged-in instructor first
     if instructor and selected_class_type:
@@ -1408,70 +1080,12 @@ def attendance_record(request):
                     date_item['lead_instructor'] = assignments.get('lead')
                     date_item['assistant_instructor'] = assignments.get('assistant')
     
-    # Calculate instructor statistics for the selected month and class type
+    # Instructor statistics for the selected month - same session set as the payroll calculation
     instructor_stats = []
-    if dates:  # Changed: removed selected_class_type requirement
-        date_list = [d['date'] for d in dates]
-        
-        for instructor in all_instructors:
-            # Calculate stats by class type
-            stats_by_class = {}
-            total_lead = 0
-            total_assistant = 0
-            
-            # Get stats for each class type
-            for class_type in class_types:
-                lead_count = InstructorAssignment.objects.filter(
-                    instructor=instructor,
-                    role='LEAD',
-                    session__date__in=date_list,
-                    session__class_type__name=class_type.name
-                ).count()
-                
-                assistant_count = InstructorAssignment.objects.filter(
-                    instructor=instructor,
-                    role='ASSISTANT',
-                    session__date__in=date_list,
-                    session__class_type__name=class_type.name
-                ).count()
-                
-                if lead_count > 0 or assistant_count > 0:
-                    stats_by_class[class_type.name] = {
-                        'class_type': class_type,
-                        'lead': lead_count,
-                        'assistant': assistant_count,
-                        'total': lead_count + assistant_count
-                    }
-                
-                total_lead += lead_count
-                total_assistant += assistant_count
-            
-            total = total_lead + total_assistant
-            
-            # Always show instructors if they have any stats (regardless of selected_class_type)
-            if total > 0:
-                # If a specific class type is selected, use that class stats for main counts
-                if selected_class_type and selected_class_type in stats_by_class:
-                    instructor_stats.append({
-                        'instructor': instructor,
-                        'stats_by_class': stats_by_class,
-                        'lead_count': stats_by_class[selected_class_type]['lead'],
-                        'assistant_count': stats_by_class[selected_class_type]['assistant'],
-                        'total': stats_by_class[selected_class_type]['total']
-                    })
-                else:
-                    # No specific class selected or instructor doesn't have stats for selected class
-                    # Show total across all classes
-                    instructor_stats.append({
-                        'instructor': instructor,
-                        'stats_by_class': stats_by_class,
-                        'lead_count': total_lead,
-                        'assistant_count': total_assistant,
-                        'total': total
-                    })
-        
-        # Sort by total descending
-        instructor_stats.sort(key=lambda x: x['total'], reverse=True)
+    if dates:
+        instructor_stats = monthly_instructor_stats(
+            year, month, all_instructors, class_types, selected_class_type
+        )
     
     context = {
         'class_types': class_types,
@@ -1595,10 +1209,7 @@ def assign_instructors(request):
                 'error': f'JSON алдаа: {str(e)}'
             }, status=400)
         except Exception as e:
-            # Log the full error for debugging
-            import traceback
-            print(f"Error in assign_instructors: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception('assign_instructors алдаа')
             return JsonResponse({
                 'success': False,
                 'error': f'Алдаа гарлаа: {str(e)}'
@@ -1623,12 +1234,8 @@ def bank_transaction_list(request):
     month_filter = request.GET.get('month')
     if month_filter:
         try:
-            year, month = month_filter.split('-')
-            transactions = transactions.filter(
-                transaction_date__year=year,
-                transaction_date__month=month
-            )
-        except:
+            transactions = transactions.for_month(month_filter)
+        except ValueError:
             pass
     
     # Filter by transaction type (income/expense)
@@ -1694,195 +1301,29 @@ def bank_transaction_upload(request):
                 bank_format = form.cleaned_data['bank_format']
                 start_row = form.cleaned_data['start_row']
                 
-                # Load Excel file
-                workbook = load_workbook(excel_file, data_only=True)
-                sheet = workbook.active
-                
-                # Determine column mapping
                 if bank_format == 'standard':
                     # Find columns by header names
-                    date_header = form.cleaned_data['date_header']
-                    amount_header = form.cleaned_data['amount_header']
-                    desc_header = form.cleaned_data['description_header']
-                    payer_header = form.cleaned_data.get('payer_header', '')
-                    
-                    # Find column indices from first row
-                    header_row = sheet[1]
-                    date_col = None
-                    opening_col = None
-                    debit_col = None
-                    credit_col = None
-                    closing_col = None
-                    desc_col = None
-                    counterparty_col = None
-                    
-                    for idx, cell in enumerate(header_row, start=1):
-                        if cell.value:
-                            cell_value = str(cell.value).strip()
-                            print(f"DEBUG: Column {cell.column_letter} = '{cell_value}'")
-                            
-                            if 'огноо' in cell_value.lower():
-                                date_col = cell.column_letter
-                            elif 'эхний' in cell_value.lower() and 'үлдэгдэл' in cell_value.lower():
-                                opening_col = cell.column_letter
-                            elif 'дебит' in cell_value.lower():
-                                debit_col = cell.column_letter
-                            elif 'кредит' in cell_value.lower():
-                                credit_col = cell.column_letter
-                            elif 'эцсийн' in cell_value.lower() and 'үлдэгдэл' in cell_value.lower():
-                                closing_col = cell.column_letter
-                            elif 'утга' in cell_value.lower():
-                                desc_col = cell.column_letter
-                            elif 'харьцсан' in cell_value.lower() or 'данс' in cell_value.lower():
-                                counterparty_col = cell.column_letter
-                    
-                    print(f"DEBUG: Found columns - Date:{date_col}, Opening:{opening_col}, Debit:{debit_col}, Credit:{credit_col}, Closing:{closing_col}, Desc:{desc_col}, Counterparty:{counterparty_col}")
-                    
-                    if not date_col or not credit_col or not desc_col:
-                        messages.error(request, f'Шаардлагатай баганууд олдсонгүй. Date:{date_col}, Credit:{credit_col}, Desc:{desc_col}')
-                        return render(request, 'aikido_app/bank_transaction_upload.html', {'form': form})
+                    columns = None
                 else:
                     # Custom format - use manual column letters
-                    date_col = form.cleaned_data['date_column'].upper()
-                    credit_col = form.cleaned_data['amount_column'].upper()
-                    desc_col = form.cleaned_data['description_column'].upper()
-                    counterparty_col = form.cleaned_data.get('payer_name_column', '').upper()
-                    opening_col = None
-                    debit_col = None
-                    closing_col = None
+                    columns = columns_from_letters(
+                        form.cleaned_data['date_column'].upper(),
+                        form.cleaned_data['amount_column'].upper(),
+                        form.cleaned_data['description_column'].upper(),
+                        form.cleaned_data.get('payer_name_column', '').upper(),
+                    )
                 
-                imported_count = 0
-                errors = []
-                skipped_count = 0
+                importer = BankStatementImporter()
+                stats = importer.run(excel_file, start_row=start_row, columns=columns)
                 
-                print(f"DEBUG: Starting import from row {start_row} to {sheet.max_row}")
-                print(f"DEBUG: Columns - Date:{date_col}, Credit:{credit_col}, Desc:{desc_col}")
+                missing = missing_required_columns(stats.columns)
+                if missing:
+                    messages.error(request, f'Шаардлагатай баганууд олдсонгүй: {", ".join(missing)}')
+                    return render(request, 'aikido_app/bank_transaction_upload.html', {'form': form})
                 
-                for row_num in range(start_row, sheet.max_row + 1):
-                    try:
-                        # Read all values
-                        date_val = sheet[f'{date_col}{row_num}'].value
-                        opening_val = sheet[f'{opening_col}{row_num}'].value if opening_col else None
-                        debit_val = sheet[f'{debit_col}{row_num}'].value if debit_col else None
-                        credit_val = sheet[f'{credit_col}{row_num}'].value if credit_col else None
-                        closing_val = sheet[f'{closing_col}{row_num}'].value if closing_col else None
-                        desc_val = sheet[f'{desc_col}{row_num}'].value
-                        counterparty_val = sheet[f'{counterparty_col}{row_num}'].value if counterparty_col else ''
-                        
-                        print(f"DEBUG Row {row_num}: date={date_val}, opening={opening_val}, debit={debit_val}, credit={credit_val}, closing={closing_val}, desc={desc_val}")
-                        
-                        # Skip empty rows (only if date is missing)
-                        if not date_val:
-                            skipped_count += 1
-                            continue
-                        
-                        # Parse all amounts
-                        opening_balance = None
-                        debit_amount = None
-                        credit_amount = None
-                        closing_balance = None
-                        
-                        if opening_val:
-                            try:
-                                opening_balance = Decimal(str(opening_val).replace(',', '').replace(' ', ''))
-                            except:
-                                pass
-                        
-                        if debit_val:
-                            try:
-                                debit_amount = Decimal(str(debit_val).replace(',', '').replace(' ', ''))
-                            except:
-                                pass
-                        
-                        if credit_val:
-                            try:
-                                credit_amount = Decimal(str(credit_val).replace(',', '').replace(' ', ''))
-                            except:
-                                pass
-                        
-                        if closing_val:
-                            try:
-                                closing_balance = Decimal(str(closing_val).replace(',', '').replace(' ', ''))
-                            except:
-                                pass
-                        
-                        # Determine main amount (use credit if available, otherwise debit)
-                        main_amount = Decimal('0.00')
-                        if credit_amount and credit_amount > 0:
-                            main_amount = credit_amount
-                        elif debit_amount and debit_amount != 0:
-                            main_amount = abs(debit_amount)  # Use absolute value since debit is negative
-                        
-                        # Parse date
-                        if isinstance(date_val, datetime):
-                            transaction_date = date_val.date()
-                        elif isinstance(date_val, str):
-                            # Try multiple date formats (including datetime formats)
-                            transaction_date = None
-                            date_formats = [
-                                '%Y-%m-%d %H:%M:%S',  # 2025-11-13 15:57:11
-                                '%Y/%m/%d %H:%M:%S',  # 2025/11/13 15:57:11
-                                '%Y/%m/%d %H:%M',     # 2025/07/30 12:15
-                                '%Y/%m/%d  %H:%M',    # 2025/07/30  12:15 (double space)
-                                '%Y-%m-%d %H:%M',     # 2025-11-13 15:57
-                                '%Y/%m/%d',
-                                '%Y-%m-%d',
-                                '%d.%m.%Y',
-                                '%d/%m/%Y'
-                            ]
-                            for date_format in date_formats:
-                                try:
-                                    transaction_date = datetime.strptime(date_val.strip(), date_format).date()
-                                    break
-                                except:
-                                    continue
-                            
-                            if not transaction_date:
-                                print(f"DEBUG: Failed to parse date '{date_val}' on row {row_num}")
-                                errors.append(f'Мөр {row_num}: Огнооны формат буруу - {date_val}')
-                                error_count += 1
-                                continue
-                        else:
-                            print(f"DEBUG: Invalid date type '{type(date_val)}' on row {row_num}")
-                            errors.append(f'Мөр {row_num}: Огнооны формат буруу')
-                            error_count += 1
-                            continue
-                        
-                        # Check for duplicates before creating
-                        # Check based on date, description, and either credit or debit amount
-                        duplicate_filter = {
-                            'transaction_date': transaction_date,
-                            'description': str(desc_val)[:500] if desc_val else ''
-                        }
-                        
-                        if credit_amount and credit_amount > 0:
-                            duplicate_filter['credit_amount'] = credit_amount
-                        elif debit_amount and debit_amount != 0:
-                            duplicate_filter['debit_amount'] = debit_amount
-                        
-                        existing = BankTransaction.objects.filter(**duplicate_filter).exists()
-                        
-                        if existing:
-                            skipped_count += 1
-                            continue
-                        
-                        # Create transaction
-                        BankTransaction.objects.create(
-                            transaction_date=transaction_date,
-                            opening_balance=opening_balance,
-                            debit_amount=debit_amount,
-                            credit_amount=credit_amount,
-                            closing_balance=closing_balance,
-                            amount=main_amount,  # Credit if available, otherwise debit
-                            description=str(desc_val)[:500] if desc_val else '',
-                            counterparty_account=str(counterparty_val)[:500] if counterparty_val else '',
-                            payer_name='',  # Will be parsed from counterparty_account later if needed
-                            status=BankTransaction.STATUS_PENDING
-                        )
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        errors.append(f'Мөр {row_num}: {str(e)}')
+                imported_count = stats.imported
+                skipped_count = stats.skipped
+                errors = stats.errors
                 
                 if imported_count > 0:
                     messages.success(request, f'✅ {imported_count} гүйлгээ амжилттай импортлогдлоо!')
@@ -1897,7 +1338,7 @@ def bank_transaction_upload(request):
                     if len(errors) > 10:
                         messages.warning(request, f'... болон {len(errors) - 10} бусад алдаа')
                 
-                print(f"DEBUG: Total imported={imported_count}, skipped={skipped_count}, errors={len(errors)}")
+                messages.info(request, f'⏱ {stats.summary()}')
                 
                 return redirect('bank_transaction_list')
                 
@@ -2030,290 +1471,30 @@ def bank_transaction_match(request, transaction_id):
     
     if request.method == 'POST':
         if is_income:
-            # Check income type from form
-            income_type = request.POST.get('income_type', 'student_payment')
-            
-            # Debug logging
-            print(f"DEBUG: income_type = {income_type}")
-            print(f"DEBUG: POST data = {dict(request.POST)}")
-            
-            if income_type == 'student_payment':
-                # Handle student payment allocations
-                student_ids = request.POST.getlist('student_id[]')
-                payment_months = request.POST.getlist('payment_month[]')
-                amounts = request.POST.getlist('amount[]')
-                notes_list = request.POST.getlist('notes[]')
-                
-                for i in range(len(student_ids)):
-                    if student_ids[i] and payment_months[i] and amounts[i]:
-                        try:
-                            student = Student.objects.get(id=student_ids[i])
-                            amount = Decimal(amounts[i])
-                            payment_month = datetime.strptime(payment_months[i], '%Y-%m').date()
-                            
-                            instructor = None
-                            if hasattr(request.user, 'instructor_profile'):
-                                instructor = request.user.instructor_profile
-                            
-                            PaymentAllocation.objects.create(
-                                bank_transaction=transaction,
-                                student=student,
-                                payment_month=payment_month,
-                                amount=amount,
-                                notes=notes_list[i] if i < len(notes_list) else '',
-                                created_by=instructor
-                            )
-                        except Exception as e:
-                            messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                            return redirect('bank_transaction_match', transaction_id=transaction_id)
-                
-                messages.success(request, f'{len([x for x in student_ids if x])} хуваарилалт амжилттай үүслээ!')
-            
-            elif income_type == 'other_income':
-                # Handle other income allocations
-                income_categories = request.POST.getlist('income_category[]')
-                new_categories = request.POST.getlist('new_income_category[]')
-                income_dates = request.POST.getlist('income_date[]')
-                amounts = request.POST.getlist('amount[]')
-                notes_list = request.POST.getlist('notes[]')
-                
-                # Use the maximum length to iterate through all rows
-                max_len = max(len(income_categories), len(new_categories), len(income_dates), len(amounts))
-                
-                for i in range(max_len):
-                    category_id = income_categories[i] if i < len(income_categories) else ''
-                    new_category_name = new_categories[i] if i < len(new_categories) else ''
-                    income_date_str = income_dates[i] if i < len(income_dates) else ''
-                    amount_str = amounts[i] if i < len(amounts) else ''
-                    
-                    # Skip if no amount provided
-                    if not amount_str:
-                        continue
-                    
-                    # Must have either category_id or new_category_name
-                    if not category_id and not new_category_name:
-                        continue
-                    
-                    # Must have income_date
-                    if not income_date_str:
-                        continue
-                        
-                    try:
-                        # Get or create category
-                        if new_category_name:
-                            category, _ = IncomeCategory.objects.get_or_create(name=new_category_name.strip())
-                        elif category_id:
-                            category = IncomeCategory.objects.get(id=category_id)
-                        else:
-                            continue
-                        
-                        amount = Decimal(amount_str)
-                        income_date = datetime.strptime(income_date_str, '%Y-%m-%d').date()
-                        
-                        instructor = None
-                        if hasattr(request.user, 'instructor_profile'):
-                            instructor = request.user.instructor_profile
-                        
-                        IncomeAllocation.objects.create(
-                            bank_transaction=transaction,
-                            income_category=category,
-                            income_date=income_date,
-                            amount=amount,
-                            notes=notes_list[i] if i < len(notes_list) else '',
-                            created_by=instructor
-                        )
-                    except Exception as e:
-                        messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                        return redirect('bank_transaction_match', transaction_id=transaction_id)
-                
-                messages.success(request, 'Орлогын хуваарилалт амжилттай үүслээ!')
-            
-            elif income_type == 'seminar_payment':
-                # Handle seminar payment allocations
-                student_ids = request.POST.getlist('seminar_student_id[]')
-                seminar_ids = request.POST.getlist('seminar_id[]')
-                amounts = request.POST.getlist('amount[]')
-                notes_list = request.POST.getlist('notes[]')
-                
-                for i in range(len(student_ids)):
-                    if student_ids[i] and seminar_ids[i] and i < len(amounts) and amounts[i]:
-                        try:
-                            student = Student.objects.get(id=student_ids[i])
-                            seminar = Seminar.objects.get(id=seminar_ids[i])
-                            amount = Decimal(amounts[i])
-                            
-                            instructor = None
-                            if hasattr(request.user, 'instructor_profile'):
-                                instructor = request.user.instructor_profile
-                            
-                            SeminarPaymentAllocation.objects.create(
-                                bank_transaction=transaction,
-                                student=student,
-                                seminar=seminar,
-                                amount=amount,
-                                notes=notes_list[i] if i < len(notes_list) else '',
-                                created_by=instructor
-                            )
-                        except Exception as e:
-                            messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                            return redirect('bank_transaction_match', transaction_id=transaction_id)
-                
-                messages.success(request, 'Семинарын төлбөр амжилттай холбогдлоо!')
-            
-            elif income_type == 'membership_payment':
-                # Handle membership payment allocations
-                student_ids = request.POST.getlist('membership_student_id[]')
-                payment_months = request.POST.getlist('membership_month[]')
-                amounts = request.POST.getlist('amount[]')
-                notes_list = request.POST.getlist('notes[]')
-                
-                for i in range(len(student_ids)):
-                    if student_ids[i] and i < len(payment_months) and payment_months[i] and i < len(amounts) and amounts[i]:
-                        try:
-                            student = Student.objects.get(id=student_ids[i])
-                            amount = Decimal(amounts[i])
-                            payment_month = datetime.strptime(payment_months[i], '%Y-%m').date()
-                            
-                            instructor = None
-                            if hasattr(request.user, 'instructor_profile'):
-                                instructor = request.user.instructor_profile
-                            
-                            MembershipPaymentAllocation.objects.create(
-                                bank_transaction=transaction,
-                                student=student,
-                                payment_month=payment_month,
-                                amount=amount,
-                                notes=notes_list[i] if i < len(notes_list) else '',
-                                created_by=instructor
-                            )
-                        except Exception as e:
-                            messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                            return redirect('bank_transaction_match', transaction_id=transaction_id)
-                
-                messages.success(request, 'Гишүүнчлэлийн төлбөр амжилттай холбогдлоо!')
-            
-            # Update transaction status
-            transaction.update_status()
-            
-            # Check if there's still remaining amount
-            remaining = transaction.get_remaining_amount()
-            if remaining > 0:
-                messages.info(request, f'Үлдсэн дүн: {remaining:,.0f}₮')
-                return redirect('bank_transaction_match', transaction_id=transaction_id)
-            else:
-                messages.success(request, 'Гүйлгээ бүрэн хуваарилагдлаа!')
-                return redirect('bank_transaction_list')
-        
+            kind = request.POST.get('income_type', STUDENT_PAYMENT)
+            if kind not in INCOME_KINDS:
+                kind = STUDENT_PAYMENT
         elif is_expense:
-            # Check if this is instructor/federation payment
-            expense_type = request.POST.get('expense_type', 'regular')
-            
-            if expense_type == 'instructor_payment':
-                # Handle instructor payment allocation (partial payments allowed)
-                payment_ids = request.POST.getlist('instructor_payment_id[]')
-                amounts = request.POST.getlist('instructor_payment_amount[]')
-                notes_list = request.POST.getlist('instructor_payment_notes[]')
-                
-                instructor = None
-                if hasattr(request.user, 'instructor_profile'):
-                    instructor = request.user.instructor_profile
-                
-                for i, payment_id in enumerate(payment_ids):
-                    if payment_id and i < len(amounts) and amounts[i]:
-                        try:
-                            payment = MonthlyInstructorPayment.objects.get(id=payment_id)
-                            amount = Decimal(amounts[i])
-                            
-                            # Validate amount doesn't exceed remaining
-                            remaining = payment.get_remaining_amount()
-                            if amount > remaining:
-                                messages.error(request, f'{payment.instructor}-ийн төлбөр: {amount}₮ нь үлдэгдэл {remaining}₮-с их байна!')
-                                continue
-                            
-                            # Create allocation
-                            InstructorPaymentAllocation.objects.create(
-                                bank_transaction=transaction,
-                                instructor_payment=payment,
-                                amount=amount,
-                                notes=notes_list[i] if i < len(notes_list) else '',
-                                created_by=instructor
-                            )
-                            
-                            # Update payment's paid_amount
-                            payment.update_paid_amount()
-                            
-                        except MonthlyInstructorPayment.DoesNotExist:
-                            messages.error(request, f'Төлбөр #{payment_id} олдсонгүй!')
-                        except Exception as e:
-                            messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                
-                messages.success(request, 'Багшийн төлбөр амжилттай холбогдлоо!')
-                
-            elif expense_type == 'federation_payment':
-                # Handle federation payment linking
-                payment_ids = request.POST.getlist('federation_payment_id[]')
-                
-                for payment_id in payment_ids:
-                    if payment_id:
-                        try:
-                            payment = MonthlyFederationPayment.objects.get(id=payment_id)
-                            payment.bank_transaction = transaction
-                            payment.is_paid = True
-                            payment.paid_date = datetime.now().date()
-                            payment.save()
-                        except MonthlyFederationPayment.DoesNotExist:
-                            messages.error(request, f'Төлбөр #{payment_id} олдсонгүй!')
-                
-                messages.success(request, 'Холбооны төлбөр амжилттай холбогдлоо!')
-                
-            else:
-                # Handle regular expense allocations
-                expense_categories = request.POST.getlist('expense_category[]')
-                new_categories = request.POST.getlist('new_category[]')
-                expense_dates = request.POST.getlist('expense_date[]')
-                amounts = request.POST.getlist('amount[]')
-                notes_list = request.POST.getlist('notes[]')
-                
-                for i in range(len(expense_categories)):
-                    category_id = expense_categories[i] if i < len(expense_categories) else ''
-                    new_category_name = new_categories[i] if i < len(new_categories) else ''
-                    
-                    if (category_id or new_category_name) and i < len(expense_dates) and i < len(amounts):
-                        if not amounts[i]:
-                            continue
-                            
-                        try:
-                            # Get or create category
-                            if new_category_name:
-                                category, _ = ExpenseCategory.objects.get_or_create(name=new_category_name.strip())
-                            elif category_id:
-                                category = ExpenseCategory.objects.get(id=category_id)
-                            else:
-                                continue
-                            
-                            amount = Decimal(amounts[i])
-                            expense_date = datetime.strptime(expense_dates[i], '%Y-%m-%d').date()
-                            
-                            instructor = None
-                            if hasattr(request.user, 'instructor_profile'):
-                                instructor = request.user.instructor_profile
-                            
-                            ExpenseAllocation.objects.create(
-                                bank_transaction=transaction,
-                                expense_category=category,
-                                expense_date=expense_date,
-                                amount=amount,
-                                notes=notes_list[i] if i < len(notes_list) else '',
-                                created_by=instructor
-                            )
-                        except Exception as e:
-                            messages.error(request, f'Алдаа гарлаа: {str(e)}')
-                            return redirect('bank_transaction_match', transaction_id=transaction_id)
-                
-                messages.success(request, 'Зардлын хуваарилалт амжилттай үүслээ!')
+            kind = request.POST.get('expense_type', REGULAR_EXPENSE)
+            if kind not in EXPENSE_KINDS:
+                kind = REGULAR_EXPENSE
+        else:
+            messages.error(request, 'Гүйлгээний дүн тодорхойгүй байна')
+            return redirect('bank_transaction_match', transaction_id=transaction_id)
         
-        # Update transaction status
-        transaction.update_status()
+        instructor = None
+        if hasattr(request.user, 'instructor_profile'):
+            instructor = request.user.instructor_profile
+        
+        # All rows are validated and written together (one in_bulk per model, one bulk_create)
+        try:
+            count = BankAllocationBatch(transaction, kind, created_by=instructor).save(request.POST)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, f'Алдаа гарлаа: {error}')
+            return redirect('bank_transaction_match', transaction_id=transaction_id)
+        
+        messages.success(request, SUCCESS_MESSAGES[kind].format(count=count))
         
         # Check if there's still remaining amount
         remaining = transaction.get_remaining_amount()
@@ -2340,7 +1521,20 @@ def bank_transaction_match(request, transaction_id):
         income_allocations = transaction.income_allocations.all()
         seminar_allocations = transaction.seminar_allocations.all()
         membership_allocations = transaction.membership_allocations.all()
+        
+        # Auto-match suggestion (name / phone / past counterparty account)
+        match_proposal = None
+        if context['remaining_amount'] > 0 and not transaction.allocated_amount:
+            match_proposal = TransactionMatcher(index=StudentIndex.cached()).propose(transaction)
         context.update({
+            'match_proposal': match_proposal,
+            'match_suggestion': {
+                'student_id': match_proposal.student['id'],
+                'months': [
+                    {'month': month.strftime('%Y-%m'), 'amount': str(amount)}
+                    for month, amount in match_proposal.months
+                ],
+            } if match_proposal else None,
             'students': students,
             'allocations': allocations,
             'seminars': seminars,
@@ -2420,23 +1614,15 @@ def monthly_payment_report(request):
     else:
         class_types = ClassType.objects.all()
     
+    # Collected totals for all class types in one grouped query (cached, invalidated by signals)
+    collected = collected_by_class_type(month_date, year_filter)
+    
     # Build report data for each class type
     report_data = []
     for class_type in class_types:
-        # Build query based on view mode
-        payment_filter = {'student__class_types': class_type}
-        
-        if view_mode == 'month' and month_date:
-            payment_filter['payment_month__year'] = month_date.year
-            payment_filter['payment_month__month'] = month_date.month
-        elif view_mode == 'year' and year_filter:
-            payment_filter['payment_month__year'] = year_filter
-        # else: view_mode == 'all' - no date filters
-        
-        # Get total payments collected for this class type
-        payments = PaymentAllocation.objects.filter(**payment_filter)
-        total_collected = payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        student_count = payments.values('student').distinct().count()
+        class_collected = collected.get(class_type.pk, {})
+        total_collected = class_collected.get('total') or Decimal('0.00')
+        student_count = class_collected.get('student_count', 0)
         
         # Calculate splits
         federation_share = total_collected * Decimal('0.50')  # 50% for federation
@@ -2446,17 +1632,15 @@ def monthly_payment_report(request):
         federation_payment = None
         if view_mode == 'month' and month_date:
             federation_payment = MonthlyFederationPayment.objects.filter(
-                class_type=class_type,
-                month=month_date
-            ).first()
+                class_type=class_type
+            ).for_month(month_date).first()
         
         # Get instructor payments - only for month view
         instructor_payments = MonthlyInstructorPayment.objects.none()
         if view_mode == 'month' and month_date:
             instructor_payments = MonthlyInstructorPayment.objects.filter(
-                class_type=class_type,
-                month=month_date
-            ).select_related('instructor').order_by('role', 'instructor__last_name')
+                class_type=class_type
+            ).for_month(month_date).select_related('instructor').order_by('role', 'instructor__last_name')
         
         # Calculate instructor totals
         instructor_total = instructor_payments.aggregate(total=Sum('instructor_share_amount'))['total'] or Decimal('0.00')
@@ -2501,6 +1685,61 @@ def monthly_payment_report(request):
     return render(request, 'aikido_app/monthly_payment_report.html', context)
 
 
+@login_required
+def profit_loss_report(request):
+    """Ашиг, алдагдлын тайлан - олон жилийн сар × ангиллын хүснэгт (MonthlyRollup-ээс)"""
+    if not request.user.is_staff:
+        return redirect('class_schedule')
+
+    current_year = datetime.now().year
+    try:
+        end_year = int(request.GET.get('to_year', current_year))
+        start_year = int(request.GET.get('from_year', end_year - 2))
+    except (ValueError, TypeError):
+        start_year, end_year = current_year - 2, current_year
+    if start_year > end_year:
+        start_year, end_year = end_year, start_year
+
+    context = profit_loss_grid(start_year, end_year)
+    years = rollup_years()
+    if not years and rollups_missing():
+        messages.warning(request, 'Сарын нэгтгэл хоосон байна - "python manage.py rebuild_ledger" командыг ажиллуулна уу')
+    context.update({
+        'from_year': start_year,
+        'to_year': min(end_year, start_year + PROFIT_LOSS_MAX_YEARS - 1),
+        'available_years': sorted(set(years) | {current_year}, reverse=True),
+    })
+    return render(request, 'aikido_app/profit_loss_report.html', context)
+
+
+PROFILING_SORTS = {
+    'p95': 'p95_ms',
+    'p50': 'p50_ms',
+    'queries': 'avg_queries',
+    'db': 'avg_db_ms',
+    'count': 'count',
+}
+
+
+@login_required
+def profiling_summary(request):
+    """View бүрийн хугацаа, query-ний хураангуй (ProfilingMiddleware-ийн лог) - зөвхөн админ"""
+    if not request.user.is_staff:
+        return redirect('class_schedule')
+    
+    sort = request.GET.get('sort', 'p95')
+    summary = profiling.summarize(profiling.read_records())
+    summary.sort(key=lambda row: row[PROFILING_SORTS.get(sort, 'p95_ms')], reverse=True)
+    
+    return render(request, 'aikido_app/profiling_summary.html', {
+        'summary': summary,
+        'sort': sort if sort in PROFILING_SORTS else 'p95',
+        'total_requests': sum(row['count'] for row in summary),
+        'profiling_enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'log_file': profiling.log_path(),
+    })
+
+
 @login_required
 def instructor_payment_list(request):
     """Багшийн төлбөрийн жагсаалт"""
@@ -2541,10 +1780,8 @@ def instructor_payment_list(request):
     # Apply filters
     if month_str:
         try:
-            year, month = map(int, month_str.split('-'))
-            month_date = datetime(year, month, 1).date()
-            payments = payments.filter(month=month_date)
-        except (ValueError, AttributeError):
+            payments = payments.for_month(month_str)
+        except ValueError:
             pass
     
     if instructor_id:
@@ -2573,9 +1810,8 @@ def instructor_payment_list(request):
             for class_type in ClassType.objects.all():
                 # Get payments for this class type in this month
                 class_payments = PaymentAllocation.objects.filter(
-                    payment_month=month_date,
                     student__class_types=class_type
-                )
+                ).for_month(month_date)
                 total_collected = class_payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
                 
                 if total_collected > 0:
@@ -2584,19 +1820,11 @@ def instructor_payment_list(request):
                     assistant_pool = instructor_pool * Decimal('0.40')  # 40% for assistants
                     
                     # Count total classes in this month
-                    lead_classes = InstructorAssignment.objects.filter(
-                        session__date__year=year,
-                        session__date__month=month,
-                        session__class_type=class_type,
-                        role='LEAD'
-                    ).count()
-                    
-                    assistant_classes = InstructorAssignment.objects.filter(
-                        session__date__year=year,
-                        session__date__month=month,
-                        session__class_type=class_type,
-                        role='ASSISTANT'
-                    ).count()
+                    class_assignments = InstructorAssignment.objects.filter(
+                        session__class_type=class_type
+                    ).for_month(month_date)
+                    lead_classes = class_assignments.filter(role='LEAD').count()
+                    assistant_classes = class_assignments.filter(role='ASSISTANT').count()
                     
                     per_lead_class = (lead_pool / lead_classes) if lead_classes > 0 else Decimal('0.00')
                     per_assistant_class = (assistant_pool / assistant_classes) if assistant_classes > 0 else Decimal('0.00')
@@ -2689,10 +1917,8 @@ def federation_payment_list(request):
     # Apply filters
     if month_str:
         try:
-            year, month = map(int, month_str.split('-'))
-            month_date = datetime(year, month, 1).date()
-            payments = payments.filter(month=month_date)
-        except (ValueError, AttributeError):
+            payments = payments.for_month(month_str)
+        except ValueError:
             pass
     
     if class_type_id:
@@ -2777,8 +2003,8 @@ def calculate_instructor_payments_from_attendance(request):
             # Check if payments already exist and are paid or linked to bank transactions
             from config.aikido_app.models import MonthlyInstructorPayment, MonthlyFederationPayment
             
-            existing_payments = MonthlyInstructorPayment.objects.filter(month=month_date)
-            existing_federation = MonthlyFederationPayment.objects.filter(month=month_date)
+            existing_payments = MonthlyInstructorPayment.objects.for_month(month_date)
+            existing_federation = MonthlyFederationPayment.objects.for_month(month_date)
             
             has_paid_payments = existing_payments.filter(is_paid=True).exists()
             has_linked_payments = existing_payments.filter(bank_transaction__isnull=False).exists()
@@ -2914,6 +2140,12 @@ class InstructorListView(LoginRequiredMixin, ListView):
         context['total_instructors'] = Instructor.objects.count()
         context['active_instructors'] = Instructor.objects.filter(is_active=True).count()
         context['class_types'] = ClassType.objects.all()
+        
+        # Statistics for the current page in one query
+        date_from, date_to = parse_date_range(self.request.GET)
+        context['instructors'] = attach_instructor_stats(context['instructors'], date_from, date_to)
+        context['date_from'] = date_from
+        context['date_to'] = date_to
         return context
 
 
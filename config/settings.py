@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.aikido_app.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -144,6 +145,75 @@ DATABASES = {
 }
 
 
+# Cache (config/aikido_app/caching.py)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Signal-ууд cache-ийг хувилбарын түлхүүрээр хүчингүй болгодог тул бүх worker нэг cache хуваалцах ёстой:
+# file-based cache нэг сервер дээрх бүх process-д нийтлэг, warm_caches командын дүүргэсэн утга
+# сайтад харагдана, төлбөрийн pivot-ийн ETag (304 хариу) ажиллана.
+# Олон сервертэй бол Redis/Memcached/DatabaseCache ашиглана.
+#
+# Local-memory cache нь process бүрт тусдаа - зөвхөн нэг process-той (runserver) үед зөв:
+# өөр worker дээрх өөрчлөлт бусад worker-ийн cache-ийг хүчингүй болгохгүй (өнгөрсөн жилийн
+# pivot PAST_YEAR_TIMEOUT буюу 24 цаг хүртэл хуучин харагдана), pivot ETag идэвхгүй болно:
+#
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+#         'LOCATION': 'aikido-app',
+#         'TIMEOUT': 60 * 10,
+#         'OPTIONS': {'MAX_ENTRIES': 1000},
+#     }
+# }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 60 * 10,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+
+
+# Хүсэлтийн профайл (config/aikido_app/profiling.py)
+# True бол aikido_app-ийн view бүрийн query тоо, DB хугацаа, давхардсан query, нийт хугацааг
+# PROFILING_LOG_FILE-д JSON мөрөөр бичнэ; /profiling/ хуудас (staff) p50/p95-аар эрэмбэлж харуулна
+
+PROFILING_ENABLED = False
+PROFILING_LOG_FILE = BASE_DIR / 'logs' / 'profiling.log'
+PROFILING_LOG_MAX_BYTES = 5 * 1024 * 1024
+PROFILING_LOG_BACKUP_COUNT = 3
+
+
+# Хурдны benchmark (config/aikido_app/benchmarks.py, `manage.py benchmark`)
+# Хиймэл өгөгдөлтэй түр тест баазад хэмжиж, --save үед энд хадгална; --compare нь энэ файлтай харьцуулна
+
+BENCHMARK_BASELINE_FILE = BASE_DIR / 'benchmarks' / 'baseline.json'
+
+
+# Лог (config/aikido_app/logs.py)
+# aikido_app-ийн модуль бүр өөрийн нэртэй logger-оор (config.aikido_app.<модуль>) console руу JSON мөр бичнэ
+# LOG_ROW_SAMPLE_EVERY - мөр бүрийн DEBUG үйл явдлаас (алгассан мөр гэх мэт) N тутамд нэгийг бичнэ, 0 бол огт бичихгүй
+
+LOG_LEVEL = 'INFO'
+LOG_ROW_SAMPLE_EVERY = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'config.aikido_app.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'config.aikido_app': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 